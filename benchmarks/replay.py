@@ -0,0 +1,346 @@
+"""Keystroke-replay benchmarks for the editor hot paths.
+
+Builds NanoEditor on a headless screen, replays scripted key streams against
+the tests/ fixtures and generated documents, and reports p50/p99 latency per
+operation plus peak memory. Results are compared with benchmarks/baseline.json.
+
+    python benchmarks/replay.py                  # run and compare with the baseline
+    python benchmarks/replay.py --save-baseline  # run and store a new baseline
+    python benchmarks/replay.py --sizes 1K 1M    # only some generated sizes
+"""
+import argparse
+import glob
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import urwid  # noqa: E402
+
+from modules.editor import NanoEditor  # noqa: E402
+
+BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+SIZES = {"1K": 1024, "64K": 64 * 1024, "1M": 1024 * 1024, "20M": 20 * 1024 * 1024}
+HOT_PATHS = ["on_text_change", "update_status", "update_stats", "update_line_numbers",
+             "perform_search", "save_file"]
+# A result is a regression when it is this much slower and the difference is noticeable;
+# p99 gets more room since it rests on the few slowest samples, which scheduler jitter
+# alone moves by most of a millisecond
+REGRESSION_RATIO = {"p50": 1.25, "p99": 1.5}
+REGRESSION_MIN_MS = {"p50": 0.25, "p99": 1.0}
+
+WORDS = ("the quick brown fox jumps over lazy dog parvum editor buffer search replace "
+         "line number history undo redo status window terminal").split()
+
+
+class HeadlessScreen(urwid.display.BaseScreen):
+    """Screen that renders canvases without a terminal"""
+
+    def __init__(self, size=(100, 40)):
+        super().__init__()
+        self.size = size
+
+    def get_cols_rows(self):
+        return self.size
+
+    def draw_screen(self, size, canvas):
+        # Materialise the rows like a real screen would
+        for _ in canvas.content():
+            pass
+
+    def get_input_descriptors(self):
+        return []
+
+    def get_available_raw_input(self):
+        return []
+
+    def hook_event_loop(self, event_loop, callback):
+        pass
+
+    def unhook_event_loop(self, event_loop):
+        pass
+
+    def set_terminal_properties(self, *args, **kwargs):
+        pass
+
+    def set_mouse_tracking(self, enable=True):
+        pass
+
+    def set_input_timeouts(self, *args):
+        pass
+
+
+class Recorder:
+    """Latency samples per operation name"""
+
+    def __init__(self):
+        self.samples = {}
+
+    def add(self, name, seconds):
+        self.samples.setdefault(name, []).append(seconds * 1000)
+
+    def summary(self):
+        """Return {name: {"p50": ms, "p99": ms, "n": count}}"""
+        result = {}
+        for name, values in sorted(self.samples.items()):
+            values = sorted(values)
+            result[name] = {"p50": round(_percentile(values, 50), 4),
+                            "p99": round(_percentile(values, 99), 4),
+                            "n": len(values)}
+        return result
+
+
+def _percentile(values, percent):
+    """Nearest-rank percentile of sorted values"""
+    index = max(0, min(len(values) - 1, round(percent / 100 * len(values) + 0.5) - 1))
+    return values[index]
+
+
+def instrument(recorder):
+    """Time every call of the hot-path methods, return the original methods"""
+    originals = {}
+    for name in HOT_PATHS:
+        original = originals[name] = getattr(NanoEditor, name)
+
+        def timed(self, *args, _original=original, _name=name, **kwargs):
+            start = time.perf_counter()
+            try:
+                return _original(self, *args, **kwargs)
+            finally:
+                recorder.add(_name, time.perf_counter() - start)
+
+        setattr(NanoEditor, name, timed)
+    return originals
+
+
+def generate_document(size, seed=1):
+    """Deterministic prose with lines of varying length"""
+    rng = random.Random(seed)
+    lines = []
+    total = 0
+    while total < size:
+        line = " ".join(rng.choice(WORDS) for _ in range(rng.randint(0, 16)))
+        lines.append(line)
+        total += len(line) + 1
+    return "\n".join(lines)[:size]
+
+
+def documents(sizes):
+    """Yield (name, text, file extension) for the fixtures and the generated sizes"""
+    paths = glob.glob(os.path.join(ROOT, "tests", "*.txt")) + glob.glob(os.path.join(ROOT, "tests", "*.py"))
+    for path in sorted(paths):
+        # The test modules live there too, but they are not sample documents
+        if os.path.basename(path).startswith("test_"):
+            continue
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            yield "fixture:" + os.path.basename(path), f.read(), os.path.splitext(path)[1]
+    for name in sizes:
+        yield "generated:" + name, generate_document(SIZES[name]), ".txt"
+
+
+def make_editor(text, directory, extension=".txt"):
+    """Editor with a headless main loop, saving into directory; the extension picks the highlighter"""
+    editor = NanoEditor(os.path.join(directory, "bench" + extension))
+    editor.build_loop(HeadlessScreen())
+    editor.set_initial_text(text)
+    editor.loop.draw_screen()
+    return editor
+
+
+def settle(editor):
+    """Wait for background work and deliver its results"""
+    for worker in (editor.search_worker, editor.sync_worker, editor.indexer):
+        if worker is not None:
+            worker.join()
+    editor.dispatcher.run_pending()
+
+
+def press(editor, recorder, name, keys):
+    """Feed keys as one input burst, redraw, and record the time"""
+    start = time.perf_counter()
+    editor.loop.process_input(keys)
+    editor.loop.draw_screen()
+    recorder.add(name, time.perf_counter() - start)
+
+
+def middle(editor):
+    """Put the cursor in the middle of the document"""
+    editor.edit_widget.set_edit_pos(len(editor.buffer) // 2)
+    editor.loop.draw_screen()
+
+
+def scenario_typing(editor, recorder):
+    middle(editor)
+    for char in "the quick brown fox jumps over the lazy dog\n" * 8:
+        press(editor, recorder, "type", ["enter" if char == "\n" else char])
+    for i in range(100):
+        press(editor, recorder, "cursor", ["up" if i % 2 else "down"])
+    for _ in range(50):
+        press(editor, recorder, "backspace", ["backspace"])
+
+
+def scenario_paste(editor, recorder):
+    middle(editor)
+    burst = list(("pasted words on a line\n" * 40).replace("\n", "\r"))
+    burst = ["enter" if key == "\r" else key for key in burst]
+    for _ in range(5):
+        press(editor, recorder, "paste", burst)
+
+
+def scenario_undo(editor, recorder):
+    middle(editor)
+    for word in WORDS * 2:
+        # The newline closes each undo step
+        editor.loop.process_input(list(word) + ["enter"])
+    for _ in range(len(WORDS)):
+        press(editor, recorder, "undo", ["ctrl z"])
+    for _ in range(len(WORDS)):
+        press(editor, recorder, "redo", ["ctrl y"])
+
+
+def scenario_search(editor, recorder):
+    editor.edit_widget.set_edit_pos(0)
+    editor.loop.process_input(["ctrl s"] + list("fox"))
+    start = time.perf_counter()
+    editor.loop.process_input(["enter"])
+    settle(editor)
+    editor.loop.draw_screen()
+    recorder.add("search_first", time.perf_counter() - start)
+    for _ in range(200):
+        press(editor, recorder, "f3", ["f3"])
+        settle(editor)
+
+
+def scenario_replace(editor, recorder):
+    editor.edit_widget.set_edit_pos(0)
+    editor.loop.process_input(["ctrl r"] + list("dog") + ["down"] + list("cat"))
+    editor.loop.process_input(["enter"])
+    settle(editor)
+    for _ in range(100):
+        press(editor, recorder, "replace", ["enter"])
+        settle(editor)
+    editor.loop.process_input(["esc"])
+
+
+def scenario_save(editor, recorder):
+    editor.loop.process_input(["x"])
+    for _ in range(3):
+        press(editor, recorder, "save", ["ctrl o"])
+
+
+SCENARIOS = [scenario_typing, scenario_paste, scenario_undo, scenario_search, scenario_replace,
+             scenario_save]
+
+
+def run_document(text, extension, directory, measure_memory):
+    """Run every scenario on a fresh editor, return (latencies, peak memory in bytes)"""
+    recorder = Recorder()
+    originals = instrument(recorder)
+    try:
+        for scenario in SCENARIOS:
+            editor = make_editor(text, directory, extension)
+            scenario(editor, recorder)
+            settle(editor)
+    finally:
+        for name, method in originals.items():
+            setattr(NanoEditor, name, method)
+
+    peak = 0
+    if measure_memory:
+        # A separate pass, tracing slows the latency numbers down
+        tracemalloc.start()
+        try:
+            editor = make_editor(text, directory, extension)
+            for scenario in SCENARIOS:
+                scenario(editor, Recorder())
+                settle(editor)
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return recorder.summary(), peak
+
+
+def best_of(first, second):
+    """Keep the lower percentiles of two runs, noise only ever adds time"""
+    merged = {}
+    for name, stats in first.items():
+        other = second.get(name, stats)
+        merged[name] = {"p50": min(stats["p50"], other["p50"]),
+                        "p99": min(stats["p99"], other["p99"]),
+                        "n": stats["n"]}
+    return merged
+
+
+def compare(results, baseline):
+    """Print the results next to the baseline, return the number of regressions"""
+    regressions = 0
+    for document, result in results.items():
+        print(f"\n{document}  peak {result['peak_mb']:.1f} MB", end="")
+        base = baseline.get(document)
+        if base and base.get("peak_mb"):
+            print(f"  (baseline {base['peak_mb']:.1f} MB)", end="")
+        print()
+        print(f"  {'operation':<22}{'p50 ms':>10}{'p99 ms':>10}{'n':>7}   vs baseline p50/p99")
+        for name, stats in result["ops"].items():
+            line = f"  {name:<22}{stats['p50']:>10.3f}{stats['p99']:>10.3f}{stats['n']:>7}"
+            old = base and base["ops"].get(name)
+            if old:
+                marks = []
+                for key in ("p50", "p99"):
+                    ratio = stats[key] / old[key] if old[key] else 1.0
+                    slower = (stats[key] > old[key] * REGRESSION_RATIO[key]
+                              and stats[key] - old[key] > REGRESSION_MIN_MS[key])
+                    regressions += slower
+                    marks.append(f"{ratio:.2f}x" + ("!" if slower else ""))
+                line += "   " + " / ".join(marks)
+            print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", nargs="*", default=list(SIZES), choices=list(SIZES),
+                        help="generated document sizes to run")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--repeat", type=int, default=3,
+                        help="runs per document, the best percentile of each is kept")
+    parser.add_argument("--no-memory", action="store_true", help="skip the peak memory pass")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        for name, text, extension in documents(args.sizes):
+            print(f"running {name} ({len(text)} chars)...", file=sys.stderr)
+            ops, peak = run_document(text, extension, directory, not args.no_memory)
+            for _ in range(args.repeat - 1):
+                ops = best_of(ops, run_document(text, extension, directory, False)[0])
+            results[name] = {"chars": len(text), "peak_mb": round(peak / 2 ** 20, 2), "ops": ops}
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, {} if args.save_baseline else baseline)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1)
+    if args.save_baseline:
+        baseline.update(results)
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(baseline, f, indent=1, sort_keys=True)
+        print(f"\nBaseline written to {BASELINE}")
+    elif regressions:
+        print(f"\n{regressions} regressions (marked with !)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
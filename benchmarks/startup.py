@@ -0,0 +1,126 @@
+"""Startup-time benchmarks for each command-line mode.
+
+Starts a fresh interpreter per run for -r, -i, --batch, -d and the editor import,
+and reports the best and median wall time next to a bare `python -c pass`.
+Results are compared with benchmarks/startup_baseline.json.
+
+    python benchmarks/startup.py                  # run and compare with the baseline
+    python benchmarks/startup.py --save-baseline  # run and store a new baseline
+    python benchmarks/startup.py --imports info   # slowest imports of one mode
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PARVUM = os.path.join(ROOT, "parvum.py")
+BASELINE = os.path.join(ROOT, "benchmarks", "startup_baseline.json")
+# Startup is noisier than keystrokes: flag only clear slowdowns of several milliseconds
+REGRESSION_RATIO = 1.25
+REGRESSION_MIN_MS = 5.0
+
+
+def commands(directory):
+    """Map each mode to the command line that starts it"""
+    script = os.path.join(directory, "script.txt")
+    target = os.path.join(directory, "target.txt")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write("s/fox/cat/\n")
+    with open(target, "w", encoding="utf-8") as f:
+        f.write("the quick brown fox\n" * 100)
+    sample = os.path.join(ROOT, "tests", "new_script.py")
+    return {
+        "python": [sys.executable, "-c", "pass"],
+        "read": [sys.executable, PARVUM, "-r", sample],
+        "info": [sys.executable, PARVUM, "-i", sample],
+        "batch": [sys.executable, PARVUM, "--batch", script, "--files", target],
+        "diff": [sys.executable, PARVUM, "-d", script, target],
+        # What a cold editor start pays before the first screen
+        "editor": [sys.executable, "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import modules.editor"],
+    }
+
+
+def time_command(command, repeat):
+    """Return the wall times in ms of repeat runs"""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, cwd=ROOT)
+        # -d exits with 1 when the files differ
+        if result.returncode > 1:
+            raise subprocess.CalledProcessError(result.returncode, command)
+        times.append((time.perf_counter() - start) * 1000)
+    return times
+
+
+def show_imports(command, count):
+    """Print the slowest imports of one mode, by cumulative time"""
+    result = subprocess.run([command[0], "-X", "importtime"] + command[1:], stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, text=True, cwd=ROOT)
+    rows = []
+    for line in result.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                rows.append((int(cumulative), name.rstrip()))
+    for cumulative, name in sorted(rows, reverse=True)[:count]:
+        print(f"{cumulative / 1000:>9.1f} ms  {name}")
+
+
+def compare(results, baseline):
+    """Print the results next to the baseline, return the number of regressions"""
+    regressions = 0
+    print(f"{'mode':<10}{'min ms':>10}{'median ms':>12}   vs baseline min")
+    for mode, stats in results.items():
+        line = f"{mode:<10}{stats['min']:>10.1f}{stats['median']:>12.1f}"
+        old = baseline.get(mode)
+        if old:
+            slower = (stats["min"] > old["min"] * REGRESSION_RATIO
+                      and stats["min"] - old["min"] > REGRESSION_MIN_MS)
+            regressions += slower
+            line += f"   {stats['min'] / old['min']:.2f}x" + ("!" if slower else "")
+        print(line)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10, help="runs per mode")
+    parser.add_argument("--save-baseline", action="store_true", help="store the results as the new baseline")
+    parser.add_argument("--imports", metavar="MODE", help="list the slowest imports of one mode instead")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        modes = commands(directory)
+        if args.imports:
+            if args.imports not in modes:
+                parser.error(f"unknown mode {args.imports}, expected one of {', '.join(modes)}")
+            show_imports(modes[args.imports], 15)
+            return
+        results = {}
+        for mode, command in modes.items():
+            times = time_command(command, args.repeat)
+            results[mode] = {"min": round(min(times), 2), "median": round(statistics.median(times), 2)}
+
+    baseline = {}
+    if os.path.exists(BASELINE):
+        with open(BASELINE, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    regressions = compare(results, {} if args.save_baseline else baseline)
+
+    if args.save_baseline:
+        with open(BASELINE, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=1, sort_keys=True)
+        print(f"\nBaseline written to {BASELINE}")
+    elif regressions:
+        print(f"\n{regressions} regressions (marked with !)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
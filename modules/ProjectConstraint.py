@@ -1,7 +1,36 @@
-MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB
-MAX_HISTORY_SIZE = 200
-HISTORY_DIFF_THRESHOLD = 5000
-AUTOSAVE_INTERVAL = 300  # 5 minutes in seconds
+MAX_FILE_SIZE = 20 * 1024 * 1024  # 20MB, larger files open memory-mapped
+MAPPED_CHUNK_SIZE = 8 * 1024 * 1024  # bytes read per step when indexing or saving a mapped file
+PARTIAL_SAVE_MIN_SIZE = 1024 * 1024  # smaller files are always saved whole through a temp file
+PARTIAL_SAVE_TAIL = 0.25  # a save rewrites at most this part of the file from its first change on
+LOAD_CHUNK_SIZE = 256 * 1024  # characters decoded per step when loading a file in the background
+BUFFER_MEMORY_LIMIT = 256 * 1024 * 1024  # open files above this unload the least recently used clean ones
+DAEMON_CACHE_LIMIT = 128 * 1024 * 1024  # text of recently opened files the --daemon keeps loaded
+HISTORY_BYTE_BUDGET = 32 * 1024 * 1024  # undo log size before the oldest steps are dropped
+HISTORY_OP_OVERHEAD = 64  # bytes charged per recorded operation
+HISTORY_COALESCE_TIME = 1.0  # typing pauses longer than this start a new undo step
+PASTE_BURST_KEYS = 4  # input batches with this many keys are pasted as single edits
+JOURNAL_SYNC_DELAY = 0.5  # seconds from an edit until the journal is fsynced
+WATCH_DELAY = 0.1  # seconds from a change on disk until the file is checked
+WATCH_POLL_INTERVAL = 1.0  # seconds between file checks where inotify is unavailable
+MAX_PIECES = 4096  # piece table is flattened above this
+PIECE_MERGE_LIMIT = 256  # typed text is merged into one piece up to this length
+LINE_INDEX_BLOCK = 512  # line lengths per line index block
+LINE_CHECKPOINT_SIZE = 64 * 1024  # bytes between the line checkpoints of a memory-mapped file
+LINE_CHECKPOINT_CACHE = 64  # spans of a memory-mapped file kept split into lines
+LAYOUT_CACHE_SIZE = 4096  # wrapped line layouts kept by the edit view
+PATTERN_CACHE_SIZE = 20  # compiled search patterns kept
+DIFF_CONTEXT = 3  # unchanged lines shown around each change in a diff
+DIFF_MAX_COST = 64  # diff search steps before a very different block is split at the best point found
+DIFF_CHUNK_SIZE = 1024 * 1024  # bytes hashed per step when -d reads a file
+SEARCH_CHUNK_SIZE = 256 * 1024  # characters scanned per step by the background search
+SEARCH_OVERLAP = 4096  # longest match guaranteed to be found across a chunk boundary
+READ_CHUNK_SIZE = 1024 * 1024  # bytes copied per step by -r
+OFFSET_INDEX_STRIDE = 1000  # lines between entries of the -r --lines offset index
+OFFSET_INDEX_SAMPLES = 32  # indexed lines whose bytes are checked before a cached offset index is reused
+INFO_CHUNK_SIZE = 1024 * 1024  # bytes read per step by -i
+PROFILE_WINDOW = 100  # input events in the --profile status bar readout
+BATCH_CHUNK_SIZE = 1024 * 1024  # characters edited per step by --batch in files over MAX_FILE_SIZE
+ENCODING_SNIFF_SIZE = 100000  # bytes given to chardet when a file is not UTF-8
 
 # Interface styles
 PALETTE = [('header', 'black', 'light gray'),
@@ -12,4 +41,16 @@ PALETTE = [('header', 'black', 'light gray'),
            ('replace_bar', 'white', 'dark blue'),
            ('warning', 'yellow', 'dark red'),
            ('line_numbers', 'dark gray', 'light gray'),
+           ('line_changed', 'yellow', 'default'),
+           ('syntax_keyword', 'light magenta', 'default'),
+           ('syntax_builtin', 'light cyan', 'default'),
+           ('syntax_def', 'yellow', 'default'),
+           ('syntax_decorator', 'light blue', 'default'),
+           ('syntax_string', 'light green', 'default'),
+           ('syntax_number', 'light red', 'default'),
+           ('syntax_comment', 'dark gray', 'default'),
+           ('diff_header', 'white', 'default'),
+           ('diff_hunk', 'light cyan', 'default'),
+           ('diff_add', 'light green', 'default'),
+           ('diff_remove', 'light red', 'default'),
            ]
@@ -0,0 +1,145 @@
+import os
+
+from modules.ProjectConstraint import BATCH_CHUNK_SIZE, MAX_FILE_SIZE
+from modules.search import compile_query, replace_all
+from modules.utils import commit_temp, expand_paths, is_safe_path, write_temp
+
+
+def parse_script(text):
+    """Parse s/pattern/replacement/flags lines into (pattern, replacement, regex) commands.
+
+    Any character after 's' can be the separator, a backslash escapes it. Flag 'r'
+    makes the pattern a regex; like the editor's search, matching ignores case.
+    """
+    commands = []
+    for number, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+            continue
+        if len(line) < 2 or line[0] != "s":
+            raise ValueError(f"Line {number}: expected s/pattern/replacement/flags")
+        parts = _split(line[2:], line[1])
+        if len(parts) != 3 or not parts[0] or set(parts[2]) - {"r"}:
+            raise ValueError(f"Line {number}: expected s/pattern/replacement/flags")
+        query, replacement, flags = parts
+        regex = "r" in flags
+        commands.append((compile_query(query, regex), replacement, regex))
+    return commands
+
+
+def _split(text, separator):
+    """Split on separator, turning an escaped separator into a literal one"""
+    parts = [""]
+    i = 0
+    while i < len(text):
+        if text[i] == "\\" and text[i + 1:i + 2] == separator:
+            parts[-1] += separator
+            i += 2
+            continue
+        if text[i] == separator:
+            parts.append("")
+        else:
+            parts[-1] += text[i]
+        i += 1
+    return parts
+
+
+def apply_commands(commands, text, start=0, end=None):
+    """Run every command over text[start:end], return (new_text, replacements)"""
+    total = 0
+    end = len(text) if end is None else end
+    for pattern, replacement, regex in commands:
+        result = replace_all(text, pattern, replacement, regex, start, end)
+        if result is not None:
+            first, last, new_text, count = result
+            text = text[:first] + new_text + text[last:]
+            end += len(new_text) - (last - first)
+            total += count
+    return text, total
+
+
+def line_blocks(f, size):
+    """Yield the text of f in blocks of about size characters that end at a line end"""
+    rest = ""
+    while True:
+        block = f.read(size)
+        if not block:
+            break
+        block = rest + block
+        cut = block.rfind("\n") + 1
+        if cut == 0:
+            # A line longer than a block is cut anyway
+            cut = len(block)
+        rest = block[cut:]
+        yield block[:cut]
+    if rest:
+        yield rest
+
+
+def edit_file(path, commands):
+    """Apply commands to one file through the editor's temp/backup save, return (path, count, error)"""
+    if not os.path.isfile(path):
+        return path, 0, "not a file"
+    if not is_safe_path(path):
+        return path, 0, "unsafe path"
+    counts = [0]
+
+    def edited_blocks(f):
+        # Small files are edited as one block
+        if os.path.getsize(path) <= MAX_FILE_SIZE:
+            blocks = iter([f.read()])
+        else:
+            blocks = line_blocks(f, BATCH_CHUNK_SIZE)
+        # Each block is edited between the characters around it, so ^, $ and \b see its real neighbours
+        before = ""
+        # An empty file is one empty block, so s/^/x/ still applies to it
+        block = next(blocks, "")
+        while block is not None:
+            following = next(blocks, None)
+            after = following[:1] if following else ""
+            text, count = apply_commands(commands, before + block + after, len(before), len(before) + len(block))
+            counts[0] += count
+            yield text[len(before):len(text) - len(after)]
+            before = block[-1:]
+            block = following
+
+    try:
+        # Line endings and bytes that are not UTF-8 are written back exactly as they were read
+        with open(path, "r", encoding="utf-8", errors="surrogateescape", newline="") as f:
+            temp_name = write_temp(path, (text.encode("utf-8", "surrogateescape") for text in edited_blocks(f)),
+                                   binary=True)
+        if counts[0]:
+            commit_temp(path)
+        else:
+            os.remove(temp_name)
+    except Exception as e:
+        return path, 0, str(e)
+    return path, counts[0], None
+
+
+def run_batch(script_path, patterns):
+    """Apply a script to every matched file in a process pool and print a line per file"""
+    with open(script_path, "r", encoding="utf-8") as f:
+        commands = parse_script(f.read())
+    paths = expand_paths(patterns)
+    total = failed = 0
+    if len(paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor()
+        results = pool.map(edit_file, paths, [commands] * len(paths))
+    else:
+        pool = None
+        results = map(edit_file, paths, [commands] * len(paths))
+    try:
+        for path, count, error in results:
+            if error:
+                failed += 1
+                print(f"{path}: ERROR {error}")
+            else:
+                total += count
+                print(f"{path}: {count} replacements")
+    finally:
+        if pool is not None:
+            pool.shutdown()
+    print(f"{total} replacements in {len(paths)} files, {failed} failed")
+    return failed == 0
@@ -0,0 +1,248 @@
+import bisect
+
+from modules.ProjectConstraint import MAX_PIECES, PIECE_MERGE_LIMIT
+from modules.changes import ChangedRanges
+from modules.line_index import CheckpointIndex, LineIndex
+
+
+class PieceTable:
+    """Piece table text buffer"""
+
+    def __init__(self, text=""):
+        self.changes = ChangedRanges()
+        self.set_text(text)
+
+    def __len__(self):
+        return self._length
+
+    @property
+    def source(self):
+        """The text or mapped file the buffer was loaded from"""
+        return self._original
+
+    @property
+    def mapped(self):
+        """Whether the buffer reads from a memory-mapped file"""
+        return not isinstance(self._original, str)
+
+    def set_source(self, source):
+        """Reset the buffer to a mapped file; its line checkpoints are added later through lines.append"""
+        self._original = source
+        self._pieces = [(source, 0, len(source))] if len(source) else []
+        self._starts = [0] if len(source) else []
+        self._length = len(source)
+        self._text_cache = None
+        self.lines = CheckpointIndex(self.get_slice)
+        self.changes.clear()
+
+    def encode_input(self, text):
+        """Convert typed text to buffer characters, UTF-8 bytes one per character when mapped"""
+        if self.mapped:
+            return text.encode("utf-8").decode("latin-1")
+        return text
+
+    def set_text(self, text):
+        """Reset the buffer to text"""
+        self._original = text
+        self._pieces = [(text, 0, len(text))] if text else []
+        self._starts = [0] if text else []
+        self._length = len(text)
+        self._text_cache = text
+        self.lines = LineIndex(text)
+        self.changes.clear()
+
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        return self.lines.line_count
+
+    def position(self, offset):
+        """Return the one-based (line, column) of an offset"""
+        line, col = self.lines.position(offset)
+        return line + 1, col + 1
+
+    def line_range(self, line):
+        """Return the start and end offsets of a zero-based line, without its newline"""
+        start = self.lines.line_start(line)
+        end = start + self.lines.line_length(line)
+        if line < self.lines.line_count - 1:
+            end -= 1
+        return start, end
+
+    def get_line(self, line):
+        """Return the text of a zero-based line without its newline"""
+        return self.get_slice(*self.line_range(line))
+
+    def get_text(self):
+        """Return the whole document as one string"""
+        if self._text_cache is None:
+            self._text_cache = "".join(self.iter_chunks())
+        return self._text_cache
+
+    def iter_chunks(self):
+        """Yield the document piece by piece without joining it"""
+        return _iter_text(self._pieces)
+
+    def iter_bytes(self):
+        """Yield a mapped document as bytes, streaming the unchanged regions"""
+        return _iter_bytes(self._pieces)
+
+    def get_slice(self, start, end):
+        """Return the text between two offsets"""
+        start = max(start, 0)
+        end = min(end, self._length)
+        if start >= end:
+            return ""
+        if self._text_cache is not None:
+            return self._text_cache[start:end]
+        return _join_range(self._pieces, self._starts, start, end)
+
+    def snapshot(self):
+        """Return a read-only copy of the current text that later edits do not affect"""
+        if self._text_cache is not None:
+            return Snapshot([(self._text_cache, 0, self._length)] if self._length else [], [0], self._length)
+        return Snapshot(list(self._pieces), list(self._starts), self._length, self.mapped)
+
+    def insert(self, offset, text):
+        """Insert text at offset"""
+        self.replace(offset, 0, text)
+
+    def delete(self, offset, length):
+        """Delete length characters at offset and return them"""
+        return self.replace(offset, length, "")
+
+    def replace(self, offset, length, text):
+        """Replace length characters at offset with text and return the removed text"""
+        end = offset + length
+        if offset < 0 or length < 0 or end > self._length:
+            raise IndexError(f"Range {offset}:{end} outside buffer of length {self._length}")
+        if not length and not text:
+            return ""
+
+        removed = self.get_slice(offset, end)
+        pieces = self._pieces
+        starts = self._starts
+
+        # Pieces [first, last) overlap the replaced range
+        first = max(bisect.bisect_right(starts, offset) - 1, 0)
+        last = first
+        while last < len(pieces) and starts[last] < end:
+            last += 1
+
+        new_pieces = []
+        if last > first:
+            source, piece_start, _ = pieces[first]
+            local = offset - starts[first]
+            if local:
+                new_pieces.append((source, piece_start, local))
+        if text:
+            # Typing right after our own insert grows that piece instead of adding one
+            if new_pieces and self._is_appendable(new_pieces[-1], text):
+                source, _, prev_len = new_pieces.pop()
+                new_pieces.append((source + text, 0, prev_len + len(text)))
+            elif not new_pieces and first > 0 and self._is_appendable(pieces[first - 1], text):
+                first -= 1
+                source, _, prev_len = pieces[first]
+                new_pieces.append((source + text, 0, prev_len + len(text)))
+            else:
+                new_pieces.append((text, 0, len(text)))
+        if last > first:
+            source, piece_start, piece_len = pieces[last - 1]
+            local_end = end - starts[last - 1]
+            if local_end < piece_len:
+                new_pieces.append((source, piece_start + local_end, piece_len - local_end))
+
+        base = starts[first] if first < len(starts) else self._length
+        new_starts = []
+        for piece in new_pieces:
+            new_starts.append(base)
+            base += piece[2]
+
+        delta = len(text) - length
+        pieces[first:last] = new_pieces
+        starts[first:last] = new_starts
+        tail = first + len(new_starts)
+        if delta:
+            starts[tail:] = [start + delta for start in starts[tail:]]
+
+        self._length += delta
+        self._text_cache = None
+        self.lines.apply_edit(offset, removed, text)
+        self.changes.apply_edit(offset, length, len(text))
+        if len(pieces) > MAX_PIECES and not self.mapped:
+            self._flatten()
+        return removed
+
+    def _flatten(self):
+        """Collapse all pieces into one, keeping the line index"""
+        text = self.get_text()
+        self._original = text
+        self._pieces = [(text, 0, len(text))] if text else []
+        self._starts = [0] if text else []
+
+    def _is_appendable(self, piece, text):
+        """Check whether an inserted piece can absorb text typed right after it"""
+        source, start, length = piece
+        return (source is not self._original and start == 0 and length == len(source)
+                and length + len(text) <= PIECE_MERGE_LIMIT)
+
+
+class Snapshot:
+    """Read-only view of a piece table at one point in time"""
+
+    def __init__(self, pieces, starts, length, mapped=False):
+        self._pieces = pieces
+        self._starts = starts
+        self._length = length
+        self.mapped = mapped
+
+    def __len__(self):
+        return self._length
+
+    def iter_chunks(self):
+        """Yield the text piece by piece"""
+        return _iter_text(self._pieces)
+
+    def iter_bytes(self):
+        """Yield a mapped snapshot as bytes"""
+        return _iter_bytes(self._pieces)
+
+    def get_slice(self, start, end):
+        """Return the text between two offsets"""
+        start = max(start, 0)
+        end = min(end, self._length)
+        if start >= end:
+            return ""
+        return _join_range(self._pieces, self._starts, start, end)
+
+
+def _iter_text(pieces):
+    """Yield the text of pieces, in blocks for mapped sources"""
+    for source, start, length in pieces:
+        if isinstance(source, str):
+            yield source[start:start + length]
+        else:
+            yield from source.iter_text(start, start + length)
+
+
+def _iter_bytes(pieces):
+    """Yield the bytes of pieces from a mapped file, typed text encoded back one byte per character"""
+    for source, start, length in pieces:
+        if isinstance(source, str):
+            yield source[start:start + length].encode("latin-1", errors="replace")
+        else:
+            yield from source.iter_raw(start, start + length)
+
+
+def _join_range(pieces, starts, start, end):
+    """Join the parts of pieces covering start..end"""
+    index = bisect.bisect_right(starts, start) - 1
+    parts = []
+    while start < end:
+        source, piece_start, piece_len = pieces[index]
+        local = start - starts[index]
+        take = min(piece_len - local, end - start)
+        parts.append(source[piece_start + local:piece_start + local + take])
+        start += take
+        index += 1
+    return "".join(parts)
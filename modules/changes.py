@@ -0,0 +1,67 @@
+import bisect
+
+
+class ChangedRanges:
+    """Offsets of the text changed since the file was last read or saved, as sorted disjoint ranges.
+
+    Each range also keeps its delta, new length minus the length it replaced, so
+    every offset outside the ranges maps back to the file by subtracting the
+    deltas before it. Ranges only grow until clear(): undoing an edit leaves its
+    range, which is safe since writing unchanged text again is harmless.
+    """
+
+    def __init__(self):
+        self.clear()
+
+    def __len__(self):
+        return len(self.starts)
+
+    def clear(self):
+        """Forget every change, after the buffer was read or saved"""
+        self.starts = []
+        self.ends = []
+        self.deltas = []
+
+    def apply_edit(self, offset, removed, inserted):
+        """Record that removed characters at offset were replaced by inserted ones"""
+        end = offset + removed
+        delta = inserted - removed
+        # Ranges touching the edited span merge with it
+        first = bisect.bisect_left(self.ends, offset)
+        last = bisect.bisect_right(self.starts, end)
+        start = offset
+        if first < last:
+            start = min(start, self.starts[first])
+            end = max(end, self.ends[last - 1])
+            delta += sum(self.deltas[first:last])
+        shift = inserted - removed
+        self.starts[first:last] = [start]
+        self.ends[first:last] = [end + shift]
+        self.deltas[first:last] = [delta]
+        if shift:
+            ends = self.ends
+            starts = self.starts
+            for i in range(first + 1, len(starts)):
+                starts[i] += shift
+                ends[i] += shift
+
+    def ranges(self):
+        """Return the (start, end, delta) of every change"""
+        return list(zip(self.starts, self.ends, self.deltas))
+
+    def saved_length(self, length):
+        """Length the file had, given the current length"""
+        return length - sum(self.deltas)
+
+    def line_mark(self, start, end):
+        """'~' if text between start and end changed, '_' if text was only deleted there, else None"""
+        mark = None
+        i = bisect.bisect_left(self.ends, start)
+        while i < len(self.starts) and self.starts[i] < end:
+            if self.starts[i] < self.ends[i]:
+                if self.ends[i] > start:
+                    return "~"
+            elif self.starts[i] >= start:
+                mark = "_"
+            i += 1
+        return mark
@@ -0,0 +1,243 @@
+import json
+import os
+import signal
+import socket
+import sys
+import threading
+from collections import OrderedDict
+
+from modules.ProjectConstraint import DAEMON_CACHE_LIMIT, MAX_FILE_SIZE
+
+
+def supported():
+    """Check for Unix sockets that can pass file descriptors, and fork"""
+    return hasattr(socket, "send_fds") and hasattr(os, "fork")
+
+
+def socket_path():
+    """Socket of this user's daemon, in a directory only they can enter"""
+    base = os.environ.get("XDG_RUNTIME_DIR") or os.environ.get("TMPDIR") or "/tmp"
+    return os.path.join(base, f"parvum-{os.getuid()}", "daemon.sock")
+
+
+def _private(directory):
+    """Check that the socket directory belongs to this user and nobody else can use it"""
+    try:
+        stat = os.stat(directory)
+    except OSError:
+        return False
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o077
+
+
+def attach(argv):
+    """Run the editor in the daemon on this terminal and return its exit status, None if no daemon runs"""
+    if not supported() or not (os.isatty(0) and os.isatty(1)):
+        return None
+    path = socket_path()
+    if not _private(os.path.dirname(path)):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+
+    import termios
+    saved = termios.tcgetattr(0)
+    # The terminal signals resizes to this process, pass them on to the editor
+    previous = signal.signal(signal.SIGWINCH, lambda signum, frame: sock.send(b"W"))
+    reply = b""
+    try:
+        request = {"argv": argv, "cwd": os.getcwd(), "env": dict(os.environ)}
+        socket.send_fds(sock, [json.dumps(request).encode("utf-8", "surrogateescape") + b"\n"], [0, 1, 2])
+        while True:
+            data = sock.recv(64)
+            if not data:
+                break
+            reply += data
+    finally:
+        signal.signal(signal.SIGWINCH, previous)
+        # Put the terminal back even if the editor died in raw mode
+        termios.tcsetattr(0, termios.TCSADRAIN, saved)
+        sock.close()
+    try:
+        return int(reply)
+    except ValueError:
+        return 1
+
+
+class DocumentCache:
+    """Recently opened files kept loaded in the daemon, dropping the least recently used first"""
+
+    def __init__(self, limit=DAEMON_CACHE_LIMIT):
+        self.limit = limit
+        self.entries = OrderedDict()
+
+    def get(self, path):
+        """Return a loaded document for path, reading it again if the file changed; None for big files"""
+        from modules.journal import file_stamp
+        stamp = file_stamp(path)
+        if stamp is None or stamp[0] > MAX_FILE_SIZE:
+            self.entries.pop(path, None)
+            return None
+        entry = self.entries.pop(path, None)
+        if entry is None or entry[0] != stamp:
+            try:
+                entry = (stamp, _load_document(path, stamp))
+            except (OSError, ValueError):
+                return None
+        self.entries[path] = entry
+        total = sum(document.memory() for _, document in self.entries.values())
+        while total > self.limit and len(self.entries) > 1:
+            _, (_, document) = self.entries.popitem(last=False)
+            total -= document.memory()
+        return entry[1]
+
+    def warm(self, cwd, argv):
+        """Loaded documents for the files named in argv, by absolute path"""
+        warm = {}
+        for arg in argv:
+            if not arg.startswith("--"):
+                path = os.path.abspath(os.path.join(cwd, arg))
+                document = self.get(path)
+                if document is not None:
+                    warm[path] = document
+        return warm
+
+
+def _load_document(path, stamp):
+    """Read a file into a Document the way the editor would"""
+    from modules.document import Document
+    from modules.highlight import highlighter_for
+    document = Document(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        document.buffer.set_text(f.read())
+    document.stats.reset()
+    document.highlighter = highlighter_for(path)
+    document.loaded = True
+    document.mark_disk(stamp)
+    return document
+
+
+def serve():
+    """Keep the editor imported and recent files loaded, forking one editor per attaching terminal"""
+    if not supported():
+        print("The daemon needs Unix sockets and fork, which this platform lacks")
+        return 1
+    # Everything the forked editors use is imported once, here
+    import modules.editor  # noqa: F401
+
+    path = socket_path()
+    directory = os.path.dirname(path)
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    if not _private(directory):
+        print(f"Refusing to use {directory}: it must belong to you and be private (mode 700)")
+        return 1
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+        print(f"A daemon is already listening on {path}")
+        return 1
+    except OSError:
+        if os.path.exists(path):
+            os.remove(path)
+    finally:
+        probe.close()
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(path)
+    server.listen(8)
+    # Finished editors are reaped by the kernel; a plain kill still removes the socket
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    cache = DocumentCache()
+    print(f"Parvum daemon listening on {path}")
+    try:
+        while True:
+            conn, _ = server.accept()
+            try:
+                request, fds = _receive(conn)
+            except (OSError, ValueError, KeyError):
+                conn.close()
+                continue
+            warm = cache.warm(request["cwd"], request["argv"])
+            if os.fork() == 0:
+                server.close()
+                _session(conn, fds, request, warm)
+            conn.close()
+            for fd in fds:
+                os.close(fd)
+    except KeyboardInterrupt:
+        return 0
+    finally:
+        server.close()
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def _receive(conn):
+    """Read one attach request and the terminal descriptors sent with it"""
+    data, fds, _, _ = socket.recv_fds(conn, 65536, 3)
+    try:
+        if len(fds) != 3:
+            raise ValueError("expected stdin, stdout and stderr")
+        while not data.endswith(b"\n"):
+            more = conn.recv(65536)
+            if not more:
+                raise ValueError("request cut short")
+            data += more
+        request = json.loads(data.decode("utf-8", "surrogateescape"))
+        if not all(key in request for key in ("argv", "cwd", "env")):
+            raise ValueError("incomplete request")
+    except (ValueError, KeyError):
+        for fd in fds:
+            os.close(fd)
+        raise
+    return request, fds
+
+
+def _session(conn, fds, request, warm):
+    """Run one editor on the client's terminal in the forked child; never returns"""
+    status = 1
+    try:
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        for target, fd in enumerate(fds):
+            os.dup2(fd, target)
+            os.close(fd)
+        sys.stdin = open(0, "r", closefd=False)
+        sys.stdout = open(1, "w", closefd=False)
+        sys.stderr = open(2, "w", closefd=False)
+        threading.Thread(target=_relay, args=(conn,), daemon=True).start()
+
+        from modules.editor import run_editor
+        status = run_editor(request["argv"], warm)
+    except SystemExit as e:
+        status = e.code if isinstance(e.code, int) else 1
+    except BaseException:
+        status = 1
+    finally:
+        try:
+            sys.stdout.flush()
+            conn.sendall(str(status).encode())
+        except OSError:
+            pass
+        os._exit(status)
+
+
+def _relay(conn):
+    """Turn resize notes from the client into SIGWINCH; end the editor if the client goes away"""
+    while True:
+        try:
+            data = conn.recv(64)
+        except OSError:
+            data = b""
+        if not data:
+            os.kill(os.getpid(), signal.SIGHUP)
+            return
+        if b"W" in data:
+            os.kill(os.getpid(), signal.SIGWINCH)
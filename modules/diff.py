@@ -0,0 +1,323 @@
+import sys
+from array import array
+
+from modules.ProjectConstraint import DIFF_CHUNK_SIZE, DIFF_CONTEXT, DIFF_MAX_COST
+
+# Larger than any line number, marks an unreached diagonal in the backward search
+_FAR = sys.maxsize
+
+
+def hash_lines(a_lines, b_lines):
+    """Number the distinct lines so the diff compares small ints instead of strings"""
+    ids = {}
+    a = [ids.setdefault(line, len(ids)) for line in a_lines]
+    b = [ids.setdefault(line, len(ids)) for line in b_lines]
+    return a, b
+
+
+def diff_lines(a_lines, b_lines):
+    """Return difflib-style opcodes (tag, i1, i2, j1, j2) that turn a_lines into b_lines"""
+    return diff_numbers(*hash_lines(a_lines, b_lines))
+
+
+def diff_numbers(a, b):
+    """Opcodes between two lists of line numbers from hash_lines or read_lines"""
+    # A line missing from the other side is always changed; search only among the rest.
+    # Numbers are dense from 0, so one flag byte per number says where it occurs
+    count = max(max(a, default=-1), max(b, default=-1)) + 1
+    in_a = bytearray(count)
+    in_b = bytearray(count)
+    for line in a:
+        in_a[line] = 1
+    for line in b:
+        in_b[line] = 1
+    kept_a = array('q', [i for i, line in enumerate(a) if in_b[line]])
+    kept_b = array('q', [j for j, line in enumerate(b) if in_a[line]])
+    in_a = in_b = None
+    changed_kept_a = bytearray(len(kept_a))
+    changed_kept_b = bytearray(len(kept_b))
+    _compare([a[i] for i in kept_a], [b[j] for j in kept_b], changed_kept_a, changed_kept_b)
+    return _opcodes(_spread(changed_kept_a, kept_a, len(a)), _spread(changed_kept_b, kept_b, len(b)))
+
+
+def _spread(changed_kept, kept, length):
+    """Marks for every line from the marks of the kept ones; the others are changed"""
+    changed = bytearray(b"\1") * length
+    for mark, index in zip(changed_kept, kept):
+        changed[index] = mark
+    return changed
+
+
+def _compare(a, b, changed_a, changed_b):
+    """Mark the lines outside a shortest edit script, splitting at middle snakes (linear-space Myers)"""
+    offset = len(b) + 1
+    kvdf = [0] * (len(a) + len(b) + 3)
+    kvdb = [0] * (len(a) + len(b) + 3)
+    stack = [(0, len(a), 0, len(b))]
+    while stack:
+        off1, lim1, off2, lim2 = stack.pop()
+        # Equal heads and tails need no search
+        while off1 < lim1 and off2 < lim2 and a[off1] == b[off2]:
+            off1 += 1
+            off2 += 1
+        while off1 < lim1 and off2 < lim2 and a[lim1 - 1] == b[lim2 - 1]:
+            lim1 -= 1
+            lim2 -= 1
+        if off1 == lim1 or off2 == lim2:
+            changed_a[off1:lim1] = b"\1" * (lim1 - off1)
+            changed_b[off2:lim2] = b"\1" * (lim2 - off2)
+            continue
+        i1, i2 = _split(a, b, off1, lim1, off2, lim2, kvdf, kvdb, offset)
+        if (i1, i2) == (off1, off2) or (i1, i2) == (lim1, lim2):
+            # A capped search made no progress: treat the whole block as replaced
+            changed_a[off1:lim1] = b"\1" * (lim1 - off1)
+            changed_b[off2:lim2] = b"\1" * (lim2 - off2)
+            continue
+        stack.append((i1, lim1, i2, lim2))
+        stack.append((off1, i1, off2, i2))
+
+
+def _split(a, b, off1, lim1, off2, lim2, kvdf, kvdb, offset):
+    """Return a point (i1, i2) on a shortest edit path, searching from both ends at once.
+
+    Diagonals are d = i1 - i2; kvdf holds the furthest i1 reached forward on each,
+    kvdb the smallest i1 reached backward. After DIFF_MAX_COST steps the furthest point
+    found so far is taken instead, which keeps huge, very different inputs fast.
+    """
+    dmin, dmax = off1 - lim2, lim1 - off2
+    fmid, bmid = off1 - off2, lim1 - lim2
+    odd = (fmid - bmid) & 1
+    fmin = fmax = fmid
+    bmin = bmax = bmid
+    kvdf[fmid + offset] = off1
+    kvdb[bmid + offset] = lim1
+    cost = 0
+    while True:
+        cost += 1
+        if fmin > dmin:
+            fmin -= 1
+            kvdf[fmin - 1 + offset] = -1
+        else:
+            fmin += 1
+        if fmax < dmax:
+            fmax += 1
+            kvdf[fmax + 1 + offset] = -1
+        else:
+            fmax -= 1
+        for d in range(fmax, fmin - 1, -2):
+            if kvdf[d - 1 + offset] >= kvdf[d + 1 + offset]:
+                i1 = kvdf[d - 1 + offset] + 1
+            else:
+                i1 = kvdf[d + 1 + offset]
+            i2 = i1 - d
+            while i1 < lim1 and i2 < lim2 and a[i1] == b[i2]:
+                i1 += 1
+                i2 += 1
+            kvdf[d + offset] = i1
+            if odd and bmin <= d <= bmax and kvdb[d + offset] <= i1:
+                return i1, i2
+
+        if bmin > dmin:
+            bmin -= 1
+            kvdb[bmin - 1 + offset] = _FAR
+        else:
+            bmin += 1
+        if bmax < dmax:
+            bmax += 1
+            kvdb[bmax + 1 + offset] = _FAR
+        else:
+            bmax -= 1
+        for d in range(bmax, bmin - 1, -2):
+            if kvdb[d - 1 + offset] < kvdb[d + 1 + offset]:
+                i1 = kvdb[d - 1 + offset]
+            else:
+                i1 = kvdb[d + 1 + offset] - 1
+            i2 = i1 - d
+            while i1 > off1 and i2 > off2 and a[i1 - 1] == b[i2 - 1]:
+                i1 -= 1
+                i2 -= 1
+            kvdb[d + offset] = i1
+            if not odd and fmin <= d <= fmax and i1 <= kvdf[d + offset]:
+                return i1, i2
+
+        if cost >= DIFF_MAX_COST:
+            return _furthest(off1, lim1, off2, lim2, kvdf, kvdb, offset, fmin, fmax, bmin, bmax)
+
+
+def _furthest(off1, lim1, off2, lim2, kvdf, kvdb, offset, fmin, fmax, bmin, bmax):
+    """The forward or backward frontier point that got furthest from its corner"""
+    forward_best, forward = -1, (off1, off2)
+    for d in range(fmax, fmin - 1, -2):
+        i1 = min(kvdf[d + offset], lim1)
+        i2 = i1 - d
+        if i2 > lim2:
+            i1, i2 = lim2 + d, lim2
+        if i1 + i2 > forward_best:
+            forward_best, forward = i1 + i2, (i1, i2)
+    backward_best, backward = _FAR, (lim1, lim2)
+    for d in range(bmax, bmin - 1, -2):
+        i1 = max(off1, kvdb[d + offset])
+        i2 = i1 - d
+        if i2 < off2:
+            i1, i2 = off2 + d, off2
+        if i1 + i2 < backward_best:
+            backward_best, backward = i1 + i2, (i1, i2)
+    if (lim1 + lim2) - backward_best < forward_best - (off1 + off2):
+        return forward
+    return backward
+
+
+def _opcodes(changed_a, changed_b):
+    """Turn the changed-line marks of both sides into opcodes"""
+    opcodes = []
+    i = j = 0
+    n, m = len(changed_a), len(changed_b)
+    while i < n or j < m:
+        next_a = changed_a.find(1, i)
+        next_b = changed_b.find(1, j)
+        run = min(n - i if next_a < 0 else next_a - i, m - j if next_b < 0 else next_b - j)
+        if run:
+            opcodes.append(("equal", i, i + run, j, j + run))
+            i += run
+            j += run
+            continue
+        end_a = changed_a.find(0, i)
+        end_b = changed_b.find(0, j)
+        end_a = n if end_a < 0 else end_a
+        end_b = m if end_b < 0 else end_b
+        tag = "replace" if end_a > i and end_b > j else "delete" if end_a > i else "insert"
+        opcodes.append((tag, i, end_a, j, end_b))
+        i, j = end_a, end_b
+    return opcodes
+
+
+def group_opcodes(opcodes, context=DIFF_CONTEXT):
+    """Split opcodes into hunks with context lines of unchanged text around each change"""
+    codes = list(opcodes) or [("equal", 0, 1, 0, 1)]
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group and not (len(group) == 1 and group[0][0] == "equal"):
+        yield group
+
+
+def _range(start, stop):
+    """Hunk header range in unified format"""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def unified_diff(a_lines, b_lines, a_name, b_name, context=DIFF_CONTEXT, opcodes=None):
+    """Yield (attr, text) display lines of a unified diff; lines keep their line endings"""
+    if opcodes is None:
+        opcodes = diff_lines(a_lines, b_lines)
+    if all(op[0] == "equal" for op in opcodes):
+        return
+    yield "diff_header", f"--- {a_name}"
+    yield "diff_header", f"+++ {b_name}"
+    for group in group_opcodes(opcodes, context):
+        first, last = group[0], group[-1]
+        yield "diff_hunk", f"@@ -{_range(first[1], last[2])} +{_range(first[3], last[4])} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a_lines[i1:i2]:
+                    yield from _marked(None, " ", line)
+                continue
+            for line in a_lines[i1:i2]:
+                yield from _marked("diff_remove", "-", line)
+            for line in b_lines[j1:j2]:
+                yield from _marked("diff_add", "+", line)
+
+
+def _marked(attr, mark, line):
+    """One diff line without its line ending, flagging a missing final newline like diff does"""
+    yield attr, mark + (line[:-1] if line.endswith("\n") else line)
+    if not line.endswith("\n"):
+        yield attr, "\\ No newline at end of file"
+
+
+def split_lines(text):
+    """Split text into lines that keep their newline, the way iterating over a file does"""
+    lines = [line + "\n" for line in text.split("\n")]
+    lines[-1] = lines[-1][:-1]
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+
+class FileLines:
+    """Lines of an open binary file, found by their start offsets and read back only when sliced"""
+
+    def __init__(self, f, offsets):
+        self.f = f
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        """Decode the lines of a slice, with their line endings"""
+        start, stop, _ = index.indices(len(self))
+        if start >= stop:
+            return []
+        self.f.seek(self.offsets[start])
+        data = self.f.read(self.offsets[stop] - self.offsets[start])
+        return split_lines(data.decode("utf-8", errors="replace"))
+
+
+def read_lines(f, ids):
+    """Number the lines of a binary file in chunks like hash_lines, sharing ids; return (numbers, FileLines).
+
+    Only a 16-byte digest per distinct line and an offset per line are kept,
+    not the text.
+    """
+    import hashlib
+
+    digest = hashlib.blake2b
+    numbers = array('q')
+    offsets = array('q', [0])
+    pos = 0
+    rest = b""
+    while True:
+        block = f.read(DIFF_CHUNK_SIZE)
+        if not block:
+            break
+        lines = (rest + block).split(b"\n")
+        rest = lines.pop()
+        for line in lines:
+            numbers.append(ids.setdefault(digest(line, digest_size=16).digest(), len(ids)))
+            pos += len(line) + 1
+            offsets.append(pos)
+    if rest:
+        # A last line without a newline differs from the same text with one
+        numbers.append(ids.setdefault(digest(rest, digest_size=16, person=b"no newline").digest(), len(ids)))
+        offsets.append(pos + len(rest))
+    return numbers, FileLines(f, offsets)
+
+
+def run_diff(path_a, path_b):
+    """Print the unified diff of two files; return 0 if they are the same, 1 if they differ"""
+    ids = {}
+    with open(path_a, "rb") as file_a, open(path_b, "rb") as file_b:
+        a, a_lines = read_lines(file_a, ids)
+        b, b_lines = read_lines(file_b, ids)
+        ids = None
+        out = sys.stdout
+        same = True
+        for _, text in unified_diff(a_lines, b_lines, path_a, path_b, opcodes=diff_numbers(a, b)):
+            same = False
+            out.write(text + "\n")
+    return 0 if same else 1
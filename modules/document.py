@@ -0,0 +1,61 @@
+import os
+
+from modules.buffer import PieceTable
+from modules.history import EditHistory
+from modules.stats import DocumentStats
+
+
+class Document:
+    """One open file: its buffer, undo history, journal, search index and cursor"""
+
+    def __init__(self, filename):
+        self.filename = os.path.abspath(filename)
+        self.last_used = 0
+        self.edit_pos = 0
+        self.top_line = 0
+        self.top_row = 0
+        self.unload()
+
+    def unload(self):
+        """Drop the contents, keeping the file name and cursor so the file can be reloaded"""
+        self.buffer = PieceTable()
+        self.history = EditHistory()
+        self.stats = DocumentStats(self.buffer)
+        self.modified = False
+        self.loaded = False
+        self.search_index = None
+        self.current_find_pos = -1
+        self.journal = None
+        self.indexer = None
+        self.loader = None
+        self.highlighter = None
+        # Size and mtime of the file when it was read or saved, and the text it held then
+        self.disk_stamp = None
+        self.base = None
+        self.warned_stamp = None
+
+    def mark_disk(self, stamp):
+        """Remember the buffer as matching the file version with this stamp"""
+        self.disk_stamp = stamp
+        self.warned_stamp = None
+        self.base = None if self.buffer.mapped else self.buffer.snapshot()
+        self.buffer.changes.clear()
+
+    def saved_as_bytes(self):
+        """Whether offsets outside the changed ranges are byte offsets of the file version last read or saved"""
+        if self.disk_stamp is None:
+            return False
+        if self.buffer.mapped:
+            return True
+        # Equal only if every character was one byte: no CRLF or multi-byte text
+        return self.base is not None and len(self.base) == self.disk_stamp[0]
+
+    def memory(self):
+        """Rough bytes held by the text and the undo log; mapped text belongs to the page cache"""
+        if not self.loaded:
+            return 0
+        return (0 if self.buffer.mapped else len(self.buffer)) + self.history.size
+
+    def evictable(self):
+        """Check whether the contents can be dropped and read back from disk later"""
+        return self.loaded and not self.modified and self.indexer is None and self.loader is None
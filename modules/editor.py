@@ -0,0 +1,1200 @@
+import os
+import re
+import threading
+from functools import partial
+
+import urwid
+
+from modules.ProjectConstraint import *
+from modules.utils import is_safe_path, read_appended, save_changes, write_buffer
+from modules.buffer import Snapshot
+from modules.diff import split_lines, unified_diff
+from modules.document import Document
+from modules.journal import Journal, file_stamp
+from modules.loader import TextLoader
+from modules.mapped import LineIndexer, MappedText
+from modules.merge import changed_region, merge3
+from modules.search import SearchIndex, SearchWorker, replace_all
+from modules.highlight import highlighter_for
+from modules.watcher import FileWatcher
+from modules.widgets import EditorView, EditorPane, TextLines, is_text_key
+from modules.workers import Dispatcher
+
+
+class EditorLoop(urwid.MainLoop):
+    """Main loop that pastes text bursts as one edit and refreshes the editor once per frame"""
+
+    def __init__(self, editor, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.editor = editor
+
+    def process_input(self, keys):
+        """Insert each run of text keys in a burst as one edit, pass the other keys on in order"""
+        if len(keys) < PASTE_BURST_KEYS:
+            return super().process_input(keys)
+        handled = False
+        run = []
+        for key in list(keys) + [None]:
+            if key is not None and is_text_key(key):
+                run.append(key)
+                continue
+            # An earlier key may have opened a prompt, so check before every run
+            if len(run) > 1 and self.editor.accepts_paste():
+                self.editor.paste(run)
+                handled = True
+            elif run:
+                handled = super().process_input(run) or handled
+            run = []
+            if key is not None:
+                handled = super().process_input([key]) or handled
+        return handled
+
+    def draw_screen(self):
+        """Bring the stale parts of the editor up to date, then draw"""
+        self.editor.refresh()
+        super().draw_screen()
+
+
+def _document_attr(name):
+    """Editor attribute that belongs to the current document"""
+    return property(lambda self: getattr(self.document, name),
+                    lambda self, value: setattr(self.document, name, value))
+
+
+class NanoEditor:
+    # Handlers timed per input event in --profile mode
+    PROFILED = ["handle_keys", "on_text_change", "update_status", "update_stats", "update_title",
+                "update_line_numbers", "perform_search", "replace_current", "replace_all", "save_file",
+                "apply_history_ops", "on_search_batch", "on_index_batch", "on_load_chunk", "sync_journals",
+                "show_document", "check_disk"]
+
+    filename = _document_attr("filename")
+    buffer = _document_attr("buffer")
+    history = _document_attr("history")
+    stats = _document_attr("stats")
+    modified = _document_attr("modified")
+    search_index = _document_attr("search_index")
+    current_find_pos = _document_attr("current_find_pos")
+    indexer = _document_attr("indexer")
+    loader = _document_attr("loader")
+
+    def __init__(self, filename, profiler=None):
+        self.documents = [Document(filename)]
+        self.document = self.documents[0]
+        self.use_count = 0
+        self.profiler = profiler
+        self.replaying_history = False
+        self.reloading = False
+        self.mode = "edit"
+        self.search_query = ""
+        self.search_direction = 1
+        self.search_regex = False
+        self.search_worker = None
+        self.pending_search = None
+        self.dispatcher = None
+        self.loop = None
+        self.dirty = set()
+        self.replace_query = ""
+        self.sync_alarm = None
+        self.sync_worker = None
+        self.watcher = None
+        self.diff_worker = None
+        # Disk version the user agreed to overwrite with a second Ctrl+O
+        self.overwrite_stamp = None
+        self.show_line_numbers = True
+
+        # Widgets
+        self.top_bar = urwid.Text("", align='center')
+        self.status_bar = urwid.Text("", align='center')
+        self.edit_widget = EditorView(self.buffer, wrap='space')
+        self.bottom_bar = urwid.Text("^G Help   ^O Save   ^X Exit   ^S Search   ^R Replace   F6 Line Numbers   F7/F8 Files   F9 Diff",
+                                     align='left')
+        self.message_widget = urwid.Text("")
+        self.message_style = None
+        self.message_alarm = None
+        self.search_widget = urwid.Edit(caption="Search: ")
+        self.replace_widget = urwid.Edit(caption="Replace with: ")
+        self.stats_widget = urwid.Text("", align='right')
+        self.diff_lines = TextLines([])
+        self.diff_view = urwid.ListBox(self.diff_lines)
+        self.editor_container = self.build_editor_container()
+
+        # Create status bar container
+        status_container = urwid.Columns([
+            ('weight', 3, urwid.AttrMap(self.status_bar, 'status')),
+            ('weight', 1, urwid.AttrMap(self.stats_widget, 'status'))
+        ])
+
+        # Frame
+        self.frame = urwid.Frame(
+            body=self.editor_container,
+            header=urwid.AttrMap(
+                urwid.Pile([urwid.AttrMap(self.top_bar, 'header'),
+                            status_container
+                            ]), 'header'
+            ),
+            footer=urwid.AttrMap(self.bottom_bar, 'footer'),
+        )
+
+        if self.profiler is not None:
+            self.profiler.wrap(self, self.PROFILED)
+            self.profiler.wrap(self.edit_widget, ["keypress", "render"], "view.")
+        urwid.connect_signal(self.edit_widget, 'edit', self.on_text_change)
+        urwid.connect_signal(self.search_widget, 'postchange', self.on_query_change)
+        self.mark_dirty("title", "stats", "line_numbers")
+        self.refresh()
+
+    @property
+    def text(self):
+        """Current document text"""
+        return self.buffer.get_text()
+
+    def build_editor_container(self):
+        """Build editor container with current line numbers state"""
+        return EditorPane(self.edit_widget, show_line_numbers=self.show_line_numbers)
+
+    def update_line_numbers(self):
+        """Redraw the line number gutter"""
+        if self.show_line_numbers:
+            self.editor_container.gutter._invalidate()
+
+    def toggle_line_numbers(self):
+        """Toggle line numbers visibility"""
+        self.show_line_numbers = not self.show_line_numbers
+        self.editor_container.set_show_line_numbers(self.show_line_numbers)
+        action = "ON" if self.show_line_numbers else "OFF"
+        self.show_message(f"Line numbers: {action}")
+
+    def mark_dirty(self, *parts):
+        """Note that 'title', 'stats' or 'line_numbers' need refreshing before the next frame"""
+        self.dirty.update(parts)
+
+    def refresh(self):
+        """Refresh the parts marked dirty and the status bar, once per frame"""
+        dirty = self.dirty
+        self.dirty = set()
+        if "title" in dirty:
+            self.update_title()
+        if "stats" in dirty:
+            self.update_stats()
+        if "line_numbers" in dirty:
+            self.update_line_numbers()
+        # Cursor moves never emit a signal, so the position is always redrawn
+        self.update_status()
+
+    def update_status(self):
+        """Update status bar"""
+        line, col = self.buffer.position(self.edit_widget.edit_pos)
+        mod_status = "*" if self.modified else ""
+        index_status = ""
+        if self.loader is not None:
+            done = self.loader.done * 100 // max(self.loader.size, 1)
+            index_status = f" [Loading {done}%]"
+        elif self.indexer is not None:
+            done = self.buffer.lines.length * 100 // max(len(self.buffer), 1)
+            index_status = f" [Indexing {done}%]"
+        match_status = ""
+        if self.search_index is not None:
+            more = "+" if self.search_index.scanning else ""
+            match_status = f" [{len(self.search_index)}{more} matches]"
+        if self.profiler is not None and self.profiler.totals:
+            match_status += f" [{self.profiler.readout()}]"
+        self.status_bar.set_text(f"Line {line}, Col {col} {mod_status}{index_status}{match_status}")
+
+    def update_stats(self):
+        """Update document statistics"""
+        stats = self.stats
+        words = "-" if stats.words is None else stats.words
+        self.stats_widget.set_text(f"Lines: {stats.lines}  Words: {words}  Chars: {stats.chars}")
+
+    def update_title(self):
+        """Update title"""
+        status = " [Modified]" if self.modified else ""
+        filename_display = os.path.basename(self.filename)
+        if len(filename_display) > 35:
+            filename_display = "..." + filename_display[-32:]
+        if len(self.documents) > 1:
+            status += f" [{self.documents.index(self.document) + 1}/{len(self.documents)}]"
+        title = f"  Parvum         {filename_display}{status}"
+        self.top_bar.set_text(title)
+
+    def on_text_change(self, widget, offset, removed, inserted):
+        """Apply an edit operation to the buffer"""
+        if removed == inserted:
+            return
+
+        self.buffer.replace(offset, len(removed), inserted)
+        self.stats.apply_edit(offset, removed, inserted)
+        if self.search_index is not None:
+            if self.search_index.scanning or not self.search_index.local:
+                self.start_background_search()
+            else:
+                self.search_index.apply_edit(self.buffer, offset, removed, inserted)
+        if not self.replaying_history:
+            self.history.record(offset, removed, inserted)
+        self.modified = self.history.is_modified()
+        # Text from disk is not an unsaved edit; reload_from_disk restarts the journal itself
+        if not self.reloading:
+            self.journal_edit(offset, removed, inserted)
+        self.mark_dirty("title", "stats", "line_numbers")
+
+    def journal_edit(self, offset, removed, inserted):
+        """Append an edit to the journal of the current file and arm the batched fsync"""
+        document = self.document
+        if document.journal is None:
+            if not is_safe_path(self.filename):
+                return
+            document.journal = Journal(self.filename)
+        try:
+            document.journal.record(offset, removed, inserted)
+        except OSError as e:
+            self.show_message(f"Journal write failed, unsaved edits are not protected: {e}", style='warning')
+            return
+        self.schedule_sync()
+
+    def schedule_sync(self):
+        """Arm the journal fsync alarm unless it is already pending"""
+        if self.dispatcher is None or self.sync_alarm is not None:
+            return
+        self.sync_alarm = self.loop.set_alarm_in(JOURNAL_SYNC_DELAY, self.sync_journals)
+
+    def sync_journals(self, loop=None, user_data=None):
+        """fsync the journals with new edits in a worker thread"""
+        self.sync_alarm = None
+        if self.sync_worker is not None:
+            self.schedule_sync()
+            return
+        journals = [document.journal for document in self.documents
+                    if document.journal is not None and document.journal.unsynced]
+        if not journals:
+            return
+
+        def sync():
+            error = None
+            for journal in journals:
+                try:
+                    journal.sync()
+                except OSError as e:
+                    error = e
+            self.dispatcher.post(self.on_sync_done, error)
+
+        self.sync_worker = threading.Thread(target=sync, daemon=True)
+        self.sync_worker.start()
+
+    def on_sync_done(self, error):
+        """Report a failed journal sync"""
+        self.sync_worker = None
+        if error is not None:
+            self.show_message(f"Journal sync failed: {error}", style='warning')
+
+    def wait_for_sync(self):
+        """Block until a running journal sync has finished"""
+        if self.sync_worker is not None:
+            self.sync_worker.join()
+            self.dispatcher.run_pending()
+
+    def recover_journal(self, document):
+        """Replay the edits journaled since the file was last saved"""
+        if not is_safe_path(document.filename):
+            return
+        journal = document.journal = Journal(document.filename)
+        name = os.path.basename(document.filename)
+        try:
+            ops = journal.recover()
+        except OSError as e:
+            self.show_message(f"Journal of {name} unreadable: {e}", style='warning')
+            return
+        if ops is None:
+            self.show_message(f"{name} changed since its journal was written, kept as {journal.path}.old",
+                              style='warning')
+            return
+        if not ops:
+            return
+
+        buffer = document.buffer
+        applied = 0
+        document.history.begin_group()
+        try:
+            for offset, length, text in ops:
+                if offset + length > len(buffer):
+                    break
+                removed = buffer.get_slice(offset, offset + length)
+                buffer.replace(offset, length, text)
+                document.history.record(offset, removed, text)
+                applied += 1
+        finally:
+            document.history.end_group()
+        document.stats.reset()
+        document.search_index = None
+        document.modified = True
+        if document is self.document:
+            self.edit_widget.highlighter = None if buffer.mapped else highlighter_for(document.filename)
+            self.edit_widget.set_edit_pos(self.edit_widget.edit_pos)
+            self.edit_widget._invalidate()
+            self.mark_dirty("title", "stats", "line_numbers")
+        if applied < len(ops):
+            self.show_message(f"Recovered {applied} of {len(ops)} unsaved edits of {name}, the rest do not fit",
+                              style='warning')
+        else:
+            self.show_message(f"Recovered {applied} unsaved edits of {name}")
+
+    def close_journals(self):
+        """Keep the journals of unsaved files for the next start, delete the others"""
+        for document in self.documents:
+            if document.journal is None:
+                continue
+            try:
+                if document.modified:
+                    document.journal.close()
+                else:
+                    document.journal.discard()
+            except OSError:
+                pass
+
+    def save_file(self):
+        """Save file"""
+        if not is_safe_path(self.filename):
+            self.show_message(f"ERROR: Unsafe path '{self.filename}'", style='warning')
+            return False
+        if self.loader is not None:
+            # Saving now would cut the file short
+            self.show_message("Cannot save until the file is loaded", style='warning')
+            return False
+        stamp = file_stamp(self.filename)
+        if stamp is not None and stamp != self.document.disk_stamp and stamp != self.overwrite_stamp:
+            self.overwrite_stamp = stamp
+            self.show_message(f"{os.path.basename(self.filename)} changed on disk since it was read, "
+                              f"Ctrl+O again to overwrite it", style='warning')
+            return False
+
+        try:
+            self.wait_for_sync()
+            # A file unchanged since it was read only needs the changed ranges written
+            if not (stamp is not None and stamp == self.document.disk_stamp and self.document.saved_as_bytes()
+                    and save_changes(self.filename, self.buffer, stamp[0])):
+                write_buffer(self.filename, self.buffer)
+            self.document.mark_disk(file_stamp(self.filename))
+            self.overwrite_stamp = None
+            self.history.mark_saved()
+            self.modified = False
+            self.mark_dirty("title", "line_numbers")
+            # The file now holds every journaled edit
+            if self.document.journal is not None:
+                self.document.journal.discard()
+            self.show_message(f"Saved: {os.path.basename(self.filename)}")
+            return True
+        except Exception as e:
+            self.show_message(f"ERROR saving: {str(e)}", style='warning')
+            return False
+
+    def show_message(self, msg, timeout=2.0, style='message'):
+        """Show temporary message"""
+        self.message_widget.set_text(str(msg)[:200])
+        self.message_style = style
+        self.build_footer()
+        if self.message_alarm is not None:
+            self.loop.remove_alarm(self.message_alarm)
+        self.message_alarm = self.loop.set_alarm_in(timeout, self.hide_message)
+
+    def hide_message(self, loop=None, user_data=None):
+        """Hide message"""
+        self.message_alarm = None
+        self.message_style = None
+        self.build_footer()
+
+    def build_footer(self):
+        """Rebuild the footer from the current message and prompt"""
+        old_focus = getattr(self.frame.footer.original_widget, 'focus', None)
+        replace_focused = getattr(old_focus, 'original_widget', None) is self.replace_widget
+        rows = []
+        if self.message_style:
+            rows.append(urwid.AttrMap(self.message_widget, self.message_style))
+            rows.append(urwid.Divider(" "))
+        if self.mode == "search":
+            rows.append(urwid.AttrMap(self.search_widget, 'search_bar'))
+            rows.append(urwid.Text("Enter: Search  Esc: Cancel  F3: Next  ^E: Regex"))
+        elif self.mode == "replace":
+            rows.append(urwid.AttrMap(self.search_widget, 'search_bar'))
+            rows.append(urwid.AttrMap(self.replace_widget, 'replace_bar'))
+            rows.append(urwid.Text("Enter: Find/Replace  ^A: Replace All  F3: Next  ^E: Regex  Esc: Cancel"))
+        elif self.mode == "diff":
+            rows.append(urwid.Text("Up/Down/PgUp/PgDn: Scroll  F9/Esc: Back to the text"))
+        if rows:
+            rows.append(self.bottom_bar)
+            pile = urwid.Pile(rows)
+            if self.mode == "replace" and replace_focused:
+                pile.focus_position = len(rows) - 3
+            self.frame.footer = urwid.AttrMap(pile, 'footer')
+        else:
+            self.frame.footer = urwid.AttrMap(self.bottom_bar, 'footer')
+        self.frame.focus_position = 'footer' if self.mode in ("search", "replace") else 'body'
+
+    def close_prompt(self):
+        """Leave search or replace mode"""
+        self.mode = "edit"
+        self.build_footer()
+
+    def show_help(self):
+        """Show help"""
+        help_text = [
+            "Codix Help",
+            "",
+            "Basic commands:",
+            "Ctrl+O - Save file",
+            "Ctrl+X - Exit",
+            "Ctrl+Z - Undo",
+            "Ctrl+Y - Redo",
+            "Ctrl+S - Search",
+            "Ctrl+R - Replace",
+            "F3     - Next search result",
+            "Ctrl+E - Regex search (in search/replace)",
+            "Ctrl+A - Replace all (in replace)",
+            "F6     - Toggle line numbers",  # Updated
+            "F7/F8  - Previous/next open file",
+            "F9     - Diff of the unsaved changes",
+            "",
+            "Unsaved edits are journaled and recovered on the next start"
+        ]
+        self.show_message("\n".join(help_text), timeout=6.0)
+
+    def show_diff(self):
+        """Show the unsaved changes as a diff against the file on disk, computed in a worker thread"""
+        if self.buffer.mapped:
+            self.show_message("Diff is not available for memory-mapped files", style='warning')
+            return
+        if self.loader is not None:
+            self.show_read_only()
+            return
+        if self.dispatcher is None:
+            self.build_loop()
+        filename = self.filename
+        name = os.path.basename(filename)
+        text = self.buffer.get_text()
+
+        def compute():
+            try:
+                saved = []
+                if os.path.exists(filename):
+                    with open(filename, "r", encoding="utf-8", errors="replace") as f:
+                        saved = list(f)
+                lines = list(unified_diff(saved, split_lines(text), f"{name} (saved)", f"{name} (unsaved)"))
+                error = None
+            except OSError as e:
+                lines, error = [], e
+            self.dispatcher.post(self.on_diff_done, worker, lines, error)
+
+        self.mode = "diff"
+        self.diff_lines.set_lines([('diff_header', f"Comparing {name} with the saved file...")])
+        self.frame.body = self.diff_view
+        self.build_footer()
+        worker = self.diff_worker = threading.Thread(target=compute, daemon=True)
+        worker.start()
+
+    def on_diff_done(self, worker, lines, error):
+        """Fill the diff view"""
+        if worker is not self.diff_worker:
+            return
+        self.diff_worker = None
+        if error is not None:
+            lines = [('warning', f"Cannot read the saved file: {error}")]
+        elif not lines:
+            lines = [(None, "No unsaved changes")]
+        self.diff_lines.set_lines(lines)
+
+    def close_diff(self):
+        """Go back from the diff view to the text"""
+        self.diff_worker = None
+        self.mode = "edit"
+        self.frame.body = self.editor_container
+        self.build_footer()
+
+    def start_search(self):
+        """Start search"""
+        self.mode = "search"
+        self.search_query = ""
+        self.search_widget.set_edit_text("")
+        self.update_search_captions()
+        self.build_footer()
+
+    def start_replace(self):
+        """Start replace"""
+        self.mode = "replace"
+        self.search_query = ""
+        self.replace_query = ""
+        self.search_widget.set_edit_text("")
+        self.replace_widget.set_edit_text("")
+        self.current_find_pos = -1
+        self.update_search_captions()
+        self.build_footer()
+
+    def toggle_search_regex(self):
+        """Switch between literal and regex search"""
+        self.search_regex = not self.search_regex
+        self.update_search_captions()
+        self.start_background_search()
+
+    def update_search_captions(self):
+        """Show the search mode in the prompt captions"""
+        if self.search_regex:
+            self.search_widget.set_caption("Search (regex): ")
+            self.replace_widget.set_caption("Replace with (\\1 groups): ")
+        else:
+            self.search_widget.set_caption("Search: ")
+            self.replace_widget.set_caption("Replace with: ")
+
+    def on_query_change(self, widget, old_text):
+        """Rescan as the search query is typed"""
+        self.search_query = widget.get_edit_text()
+        self.pending_search = None
+        self.start_background_search()
+
+    def start_background_search(self):
+        """Cancel any running scan and start one for the current query"""
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.search_worker = None
+        self.search_index = None
+        if self.search_query:
+            try:
+                self.search_index = SearchIndex(self.search_query, self.search_regex, self.buffer.mapped)
+            except re.error:
+                pass
+        if self.search_index is None:
+            return
+
+        if self.dispatcher is None:
+            self.search_index.build(self.buffer)
+        else:
+            # Begin at the cursor line so the next match is usually found first
+            line = self.buffer.lines.position(self.edit_widget.edit_pos)[0]
+            start = self.buffer.line_range(line)[0]
+            self.search_index.scanning = True
+            self.search_worker = SearchWorker(self.search_index.pattern, self.buffer.snapshot(), start,
+                                              self.dispatcher, self.on_search_batch, self.on_search_done)
+            self.search_worker.start()
+
+    def on_search_batch(self, worker, starts, ends):
+        """Merge matches streamed from the search worker"""
+        if worker is not self.search_worker:
+            return
+        self.search_index.add_matches(starts, ends)
+        if self.pending_search is not None and self.jump_to_match(*self.pending_search):
+            self.pending_search = None
+            self.show_message(f"Found: '{self.search_query}'")
+
+    def on_search_done(self, worker):
+        """Finish the scan and resolve a search still waiting for a match"""
+        if worker is not self.search_worker:
+            return
+        self.search_worker = None
+        self.search_index.scanning = False
+        if self.pending_search is not None:
+            if self.jump_to_match(*self.pending_search):
+                self.show_message(f"Found: '{self.search_query}'")
+            else:
+                self.show_message(f"Not found: '{self.search_query}'")
+            self.pending_search = None
+
+    def jump_to_match(self, forward, pos):
+        """Move to the match after (or before) pos, return False if none is known yet"""
+        if forward:
+            match = self.search_index.next_match(pos)
+        else:
+            match = self.search_index.prev_match(pos)
+        if match is None:
+            return False
+        # While scanning, a wrapped match may not be the nearest one
+        if self.search_index.scanning and (match[0] <= pos if forward else match[0] >= pos):
+            return False
+
+        self.current_find_pos = match[0]
+        self.edit_widget.set_edit_pos(match[0])
+        self.mark_dirty("line_numbers")
+        return True
+
+    def perform_search(self, forward=True):
+        """Jump to the next match, return None if it is left to the running scan"""
+        if not self.search_query:
+            self.show_message("Enter search text")
+            return False
+
+        if self.search_index is None or not self.search_index.matches(self.search_query, self.search_regex):
+            try:
+                SearchIndex(self.search_query, self.search_regex, self.buffer.mapped)
+            except re.error as e:
+                self.show_message(f"Invalid regex: {e}", style='warning')
+                return False
+            self.start_background_search()
+
+        current_pos = self.edit_widget.edit_pos
+        if self.jump_to_match(forward, current_pos):
+            return True
+        if self.search_index.scanning:
+            self.pending_search = (forward, current_pos)
+            return None
+        self.show_message(f"Not found: '{self.search_query}'")
+        return False
+
+    def replace_current(self):
+        """Replace found text"""
+        if self.current_find_pos == -1 or self.search_index is None:
+            return False
+        if self.edit_widget.read_only:
+            self.show_read_only()
+            return False
+
+        end = self.search_index.match_at(self.current_find_pos)
+        if end is None:
+            return False
+
+        replacement = self.buffer.encode_input(self.replace_query)
+        self.edit_widget.replace_range(self.current_find_pos, end - self.current_find_pos, replacement)
+        self.edit_widget.set_edit_pos(self.current_find_pos + len(replacement))
+        self.modified = True
+        return True
+
+    def replace_all(self):
+        """Replace every match as one edit and one undo step"""
+        if not self.search_query:
+            self.show_message("Enter search text")
+            return 0
+        if self.buffer.mapped:
+            self.show_message("Replace All is not available for memory-mapped files", style='warning')
+            return 0
+        if self.edit_widget.read_only:
+            self.show_read_only()
+            return 0
+        try:
+            pattern = SearchIndex(self.search_query, self.search_regex).pattern
+            result = replace_all(self.buffer.get_text(), pattern, self.replace_query, self.search_regex)
+        except re.error as e:
+            self.show_message(f"Invalid regex: {e}", style='warning')
+            return 0
+        if result is None:
+            self.show_message(f"Not found: '{self.search_query}'")
+            return 0
+
+        start, end, new_text, count = result
+        self.history.begin_group()
+        try:
+            self.edit_widget.replace_range(start, end - start, new_text)
+        finally:
+            self.history.end_group()
+        self.edit_widget.set_edit_pos(start + len(new_text))
+        self.current_find_pos = -1
+        self.show_message(f"Replaced {count} occurrence{'s' if count != 1 else ''}")
+        return count
+
+    def handle_search(self, key):
+        """Handle search"""
+        if key == 'enter':
+            self.search_query = self.search_widget.get_edit_text()
+            self.close_prompt()
+            if self.search_query and self.perform_search():
+                self.show_message(f"Found: '{self.search_query}'")
+        elif key == 'f3':
+            self.search_query = self.search_widget.get_edit_text()
+            self.perform_search()
+        elif key == 'ctrl e':
+            self.toggle_search_regex()
+        elif key == 'esc':
+            self.close_prompt()
+        else:
+            return key
+
+    def handle_replace(self, key):
+        """Handle replace"""
+        if key == 'enter':
+            self.search_query = self.search_widget.get_edit_text()
+            self.replace_query = self.replace_widget.get_edit_text()
+            if self.current_find_pos != -1 and self.replace_current():
+                self.show_message(f"Replaced: '{self.search_query}' -> '{self.replace_query}'")
+            if self.perform_search():
+                self.show_message(f"Found: '{self.search_query}'")
+        elif key == 'ctrl a':
+            self.search_query = self.search_widget.get_edit_text()
+            self.replace_query = self.replace_widget.get_edit_text()
+            if self.replace_all():
+                self.close_prompt()
+        elif key == 'f3':
+            self.search_query = self.search_widget.get_edit_text()
+            self.perform_search()
+        elif key == 'ctrl e':
+            self.toggle_search_regex()
+        elif key == 'esc':
+            self.close_prompt()
+        else:
+            return key
+
+    def handle_keys(self, key):
+        """Main key handler"""
+        if self.mode == "search":
+            return self.handle_search(key)
+        elif self.mode == "replace":
+            return self.handle_replace(key)
+        elif self.mode == "diff":
+            # Scrolling is handled by the list; everything else but leaving is ignored
+            if key in ('f9', 'esc'):
+                self.close_diff()
+            return True
+
+        # Edit mode
+        if key == 'ctrl x':
+            raise urwid.ExitMainLoop()
+        elif key == 'ctrl o':
+            self.save_file()
+        elif key == 'ctrl g' or key == 'f1':
+            self.show_help()
+        elif key == 'f3':
+            if self.search_query:
+                self.perform_search()
+            else:
+                self.start_search()
+        elif key == 'ctrl s':
+            self.start_search()
+        elif key == 'ctrl r':
+            self.start_replace()
+        elif key == 'ctrl z':
+            self.apply_history_ops(self.history.undo())
+        elif key == 'ctrl y':
+            self.apply_history_ops(self.history.redo())
+        elif key == 'f6':  # Changed to F6
+            self.toggle_line_numbers()
+        elif key in ('f7', 'f8'):
+            self.switch_document(-1 if key == 'f7' else 1)
+        elif key == 'f9':
+            self.show_diff()
+        elif self.edit_widget.read_only and (len(key) == 1 or key in ('enter', 'backspace', 'delete')):
+            self.show_read_only()
+        else:
+            return key
+        return True
+
+    def show_read_only(self):
+        """Tell why the text cannot be edited yet"""
+        self.show_message("Read-only until the file is " + ("loaded" if self.loader is not None else "indexed"))
+
+    def accepts_paste(self):
+        """Check whether typed text would go straight into the buffer"""
+        return self.mode == "edit" and self.frame.focus_position == 'body' and not self.edit_widget.read_only
+
+    def paste(self, keys):
+        """Insert a burst of text keys as one edit and one undo step"""
+        text = "".join("\n" if key == 'enter' else key for key in keys)
+        self.history.begin_group()
+        try:
+            self.edit_widget.insert_text(self.buffer.encode_input(text))
+        finally:
+            self.history.end_group()
+
+    def apply_history_ops(self, ops):
+        """Replay undo or redo operations without recording them"""
+        if not ops:
+            return
+        self.replaying_history = True
+        try:
+            for offset, length, text in ops:
+                self.edit_widget.replace_range(offset, length, text)
+                self.edit_widget.set_edit_pos(offset + len(text))
+        finally:
+            self.replaying_history = False
+        self.modified = self.history.is_modified()
+        self.mark_dirty("title", "stats", "line_numbers")
+
+    def load_text(self, content):
+        """Replace the buffer and the widget text without recording an edit"""
+        self.buffer.set_text(content)
+        self.reset_document_state()
+
+    def reset_document_state(self):
+        """Drop everything derived from the previous buffer contents"""
+        self.stats.reset()
+        for worker in (self.search_worker, self.indexer, self.loader):
+            if worker is not None:
+                worker.cancel()
+        self.search_worker = None
+        self.indexer = None
+        self.loader = None
+        self.search_index = None
+        self.edit_widget.read_only = False
+        self.edit_widget.highlighter = None if self.buffer.mapped else highlighter_for(self.filename)
+        self.edit_widget.set_edit_pos(self.edit_widget.edit_pos)
+        self.document.loaded = True
+
+    def set_initial_text(self, content):
+        """Initialize text"""
+        self.load_text(content)
+        self.history.clear()
+        self.modified = False
+        self.mark_dirty("title", "stats", "line_numbers")
+
+    def load_mapped(self, path):
+        """Open a large file memory-mapped and index its lines in the background"""
+        if self.dispatcher is None:
+            self.build_loop()
+        self.buffer.set_source(MappedText(path))
+        self.reset_document_state()
+        # Edits need line offsets, so wait until every line is known
+        self.edit_widget.read_only = True
+        self.indexer = LineIndexer(self.buffer.source, self.dispatcher, partial(self.on_index_batch, self.document),
+                                   partial(self.on_index_done, self.document))
+        self.indexer.start()
+        self.history.clear()
+        self.modified = False
+        self.mark_dirty("title", "stats", "line_numbers")
+
+    def on_index_batch(self, document, indexer, chars, newlines):
+        """Add line checkpoints found by the indexer"""
+        if indexer is not document.indexer:
+            return
+        document.buffer.lines.append(chars, newlines)
+        if document is self.document:
+            self.edit_widget._invalidate()
+            self.mark_dirty("stats", "line_numbers")
+
+    def on_index_done(self, document, indexer):
+        """Allow editing once every line is indexed"""
+        if indexer is not document.indexer:
+            return
+        document.indexer = None
+        if document is self.document:
+            self.edit_widget.read_only = False
+        # Journaled edits need the line offsets too
+        self.recover_journal(document)
+
+    def load_streamed(self, path):
+        """Show the file while a worker thread reads it; edits wait until it is complete"""
+        if self.dispatcher is None:
+            self.build_loop()
+        self.buffer.set_text("")
+        self.reset_document_state()
+        self.edit_widget.read_only = True
+        self.loader = TextLoader(path, self.dispatcher, partial(self.on_load_chunk, self.document),
+                                 partial(self.on_load_done, self.document))
+        self.loader.start()
+        self.history.clear()
+        self.modified = False
+        self.mark_dirty("title", "stats", "line_numbers")
+
+    def on_load_chunk(self, document, loader, text, done):
+        """Append a chunk read by the loader"""
+        if loader is not document.loader:
+            return
+        loader.done = done
+        buffer = document.buffer
+        highlighter = self.edit_widget.highlighter if document is self.document else document.highlighter
+        if highlighter is not None:
+            # The last line so far may go on in this chunk
+            highlighter.apply_edit(buffer.line_count - 1, 0, 0)
+        offset = len(buffer)
+        buffer.replace(offset, 0, text)
+        # Text read from the file is not a change to it
+        buffer.changes.clear()
+        document.stats.apply_edit(offset, "", text)
+        if document is self.document:
+            self.edit_widget._invalidate()
+            self.mark_dirty("stats", "line_numbers")
+
+    def on_load_done(self, document, loader, error):
+        """Allow editing once the whole file is read"""
+        if loader is not document.loader:
+            return
+        document.loader = None
+        name = os.path.basename(document.filename)
+        if error is not None:
+            # Editing a partial file could cut it short on save
+            document.buffer.set_text("")
+            document.stats.reset()
+            document.highlighter = highlighter_for(document.filename)
+            self.show_message(f"ERROR reading {name}: {error}", style='warning')
+        if document is self.document:
+            view = self.edit_widget
+            view.read_only = False
+            if error is not None:
+                view.highlighter = document.highlighter
+                view.set_edit_pos(0)
+            elif view.edit_pos == 0:
+                # A file read back after being unloaded gets its cursor back
+                view.set_edit_pos(document.edit_pos)
+            view._invalidate()
+            if document.search_index is not None:
+                self.start_background_search()
+            self.mark_dirty("stats", "line_numbers")
+        if error is None:
+            document.mark_disk(document.disk_stamp)
+            self.recover_journal(document)
+            # The file may have changed while it was read
+            self.check_disk(document)
+
+    def load_file(self):
+        """Read the current document from disk: in one go if it is small, memory-mapped if it is large"""
+        document = self.document
+        try:
+            # Taken before reading, so a change made during the read is noticed later
+            stamp = file_stamp(self.filename)
+            if stamp is None:
+                self.set_initial_text("")
+                self.modified = True
+                document.mark_disk(None)
+            elif stamp[0] > MAX_FILE_SIZE:
+                self.load_mapped(self.filename)
+                document.mark_disk(stamp)
+                return
+            elif stamp[0] > LOAD_CHUNK_SIZE:
+                self.load_streamed(self.filename)
+                document.disk_stamp = stamp
+                return
+            else:
+                with open(self.filename, "r", encoding="utf-8", errors="replace") as f:
+                    self.set_initial_text(f.read())
+                document.mark_disk(stamp)
+        except Exception as e:
+            self.set_initial_text("")
+            self.show_message(f"ERROR reading: {str(e)}", style='warning')
+            return
+        self.recover_journal(self.document)
+
+    def open_document(self, filename):
+        """Add a file to the session; it is read when first shown"""
+        self.documents.append(Document(filename))
+        self.mark_dirty("title")
+
+    def switch_document(self, step):
+        """Show the next (step 1) or previous (step -1) open file"""
+        if len(self.documents) < 2:
+            self.show_message("Only one file is open")
+            return
+        index = (self.documents.index(self.document) + step) % len(self.documents)
+        self.show_document(self.documents[index])
+        self.show_message(f"File {index + 1}/{len(self.documents)}: {os.path.basename(self.filename)}")
+
+    def show_document(self, document):
+        """Make document current, reading it from disk if it is not in memory"""
+        view = self.edit_widget
+        current = self.document
+        current.edit_pos, current.top_line, current.top_row = view.edit_pos, view.top_line, view.top_row
+        current.highlighter = view.highlighter
+        # A search still scanning the old buffer is of no use to the new one
+        if self.search_worker is not None:
+            self.search_worker.cancel()
+            self.search_worker = None
+            current.search_index = None
+        self.pending_search = None
+
+        self.document = document
+        self.use_count += 1
+        document.last_used = self.use_count
+        view.buffer = document.buffer
+        view.highlighter = document.highlighter
+        view.read_only = document.indexer is not None or document.loader is not None
+        view.edit_pos = document.edit_pos
+        view.pref_col = None
+        view.top_line, view.top_row = document.top_line, document.top_row
+        if not document.loaded:
+            self.load_file()
+        elif document.journal is None and document.indexer is None and document.loader is None:
+            # Loaded elsewhere, e.g. kept warm by the daemon
+            self.recover_journal(document)
+        view.set_edit_pos(document.edit_pos)
+        self.evict_documents()
+        self.mark_dirty("title", "stats", "line_numbers")
+        if self.watcher is not None:
+            self.watcher.watch(document.filename)
+        self.check_disk(document)
+
+    def on_disk_change(self, path):
+        """The watcher saw the current file change on disk"""
+        if path == self.filename:
+            self.check_disk(self.document)
+
+    def check_disk(self, document):
+        """Pick up the changes another program made to the file of the current document"""
+        if (document is not self.document or not document.loaded
+                or document.loader is not None or document.indexer is not None):
+            return
+        stamp = file_stamp(document.filename)
+        if stamp == document.disk_stamp or (stamp is not None and stamp == document.warned_stamp):
+            return
+        name = os.path.basename(document.filename)
+        if stamp is None:
+            document.disk_stamp = None
+            self.show_message(f"{name} was deleted on disk, Ctrl+O writes it again", style='warning')
+        elif document.base is None or stamp[0] > MAX_FILE_SIZE:
+            document.warned_stamp = stamp
+            self.show_message(f"{name} changed on disk, reopen it to see the changes", style='warning')
+        else:
+            try:
+                self.reload_from_disk(document, stamp)
+            except OSError as e:
+                document.warned_stamp = stamp
+                self.show_message(f"{name} changed on disk but cannot be read: {e}", style='warning')
+
+    def reload_from_disk(self, document, stamp):
+        """Bring in the file's new contents: only the new tail if it grew, else merged with unsaved edits"""
+        name = os.path.basename(document.filename)
+        buffer = document.buffer
+        appended = None
+        old_stamp = document.disk_stamp
+        if not document.modified and old_stamp is not None and stamp[0] > old_stamp[0]:
+            known_tail = buffer.get_slice(len(buffer) - 256, len(buffer)).encode("utf-8")
+            appended = read_appended(document.filename, old_stamp[0], known_tail)
+        if appended is not None:
+            text, end = appended
+            self.apply_disk_edit(len(buffer), 0, text)
+            self.history.mark_saved()
+            self.modified = False
+            # A torn last line leaves the stamp behind the file, so the rest is read next time
+            document.mark_disk(stamp if end == stamp[0] else [end, stamp[1]])
+            self.discard_journal(document)
+            return
+
+        with open(document.filename, "r", encoding="utf-8", errors="replace") as f:
+            theirs = f.read()
+        ours = buffer.get_text()
+        conflicts = 0
+        if document.modified:
+            merged, conflicts = merge3("".join(document.base.iter_chunks()), ours, theirs)
+        else:
+            merged = theirs
+        start, ours_end, merged_end = changed_region(ours, merged)
+        if start < ours_end or start < merged_end:
+            self.apply_disk_edit(start, ours_end - start, merged[start:merged_end])
+
+        if merged == theirs:
+            self.history.mark_saved()
+            self.modified = False
+            document.mark_disk(stamp)
+            self.discard_journal(document)
+        else:
+            self.modified = True
+            document.disk_stamp = stamp
+            document.warned_stamp = None
+            document.base = Snapshot([(theirs, 0, len(theirs))] if theirs else [], [0], len(theirs))
+            # The journal must replay onto the new file: start it over with the one edit that gets there
+            self.discard_journal(document)
+            start, theirs_end, merged_end = changed_region(theirs, merged)
+            self.journal_edit(start, theirs[start:theirs_end], merged[start:merged_end])
+            buffer.changes.clear()
+            buffer.changes.apply_edit(start, theirs_end - start, merged_end - start)
+
+        if conflicts:
+            self.show_message(f"{name} changed on disk: {conflicts} conflicting change{'s' if conflicts != 1 else ''} "
+                              f"marked with <<<<<<< and >>>>>>>", style='warning')
+        elif document.modified:
+            self.show_message(f"Merged the changes made to {name} on disk")
+        else:
+            self.show_message(f"Reloaded {name}, it changed on disk")
+
+    def apply_disk_edit(self, offset, length, text):
+        """Replace a range with text from disk as one undo step, keeping the cursor on its text"""
+        view = self.edit_widget
+        pos = view.edit_pos
+        self.reloading = True
+        self.history.begin_group()
+        try:
+            view.replace_range(offset, length, text)
+        finally:
+            self.history.end_group()
+            self.reloading = False
+        if pos >= offset + length:
+            pos += len(text) - length
+        elif pos > offset:
+            pos = offset
+        view.set_edit_pos(pos)
+
+    def discard_journal(self, document):
+        """Drop the journal once its edits are relative to a file version that is gone"""
+        if document.journal is not None:
+            self.wait_for_sync()
+            try:
+                document.journal.discard()
+            except OSError:
+                pass
+
+    def evict_documents(self):
+        """Unload the least recently used clean files while the session is over BUFFER_MEMORY_LIMIT"""
+        total = sum(document.memory() for document in self.documents)
+        for document in sorted(self.documents, key=lambda document: document.last_used):
+            if total <= BUFFER_MEMORY_LIMIT:
+                break
+            if document is not self.document and document.evictable():
+                total -= document.memory()
+                if document.journal is not None:
+                    self.wait_for_sync()
+                    document.journal.discard()
+                document.unload()
+
+    def build_loop(self, screen=None):
+        """Create the main loop and the dispatcher for worker results"""
+        self.loop = EditorLoop(
+            self,
+            self.frame,
+            palette=PALETTE,
+            screen=screen,
+            unhandled_input=self.handle_keys,
+            handle_mouse=False
+        )
+        self.dispatcher = Dispatcher(self.loop)
+        self.watcher = FileWatcher(self.loop, self.on_disk_change)
+        if self.profiler is not None:
+            self.profiler.attach(self.loop)
+        return self.loop
+
+    def run(self):
+        """Run editor"""
+        if self.dispatcher is None:
+            self.build_loop()
+        try:
+            self.loop.screen.set_terminal_properties(colors=256)
+        except Exception:
+            pass
+        try:
+            self.loop.run()
+        finally:
+            self.wait_for_sync()
+            self.close_journals()
+            if self.profiler is not None:
+                self.profiler.close()
+
+
+def run_editor(argv, warm=None):
+    """Open the files named in argv in one editor and run it, return the exit status.
+
+    warm maps absolute paths to documents the daemon already holds loaded.
+    """
+    # --profile[=TRACE] times every handler per key into a JSONL trace, --cprofile=FILE adds a cProfile dump,
+    # --profile-keys also writes the keys themselves
+    profiler = None
+    for arg in argv:
+        if arg == "--profile" or arg.startswith("--profile="):
+            from modules.profiler import Profiler
+            cprofile_path = None
+            for other in argv:
+                if other.startswith("--cprofile="):
+                    cprofile_path = other.split("=", 1)[1]
+            profiler = Profiler(arg.partition("=")[2] or "parvum_trace.jsonl", cprofile_path,
+                                raw_keys="--profile-keys" in argv)
+
+    filenames = [arg for arg in argv if not arg.startswith("--")]
+    if not filenames or "-r" in argv or "-i" in argv:
+        base = "new_document"
+        counter = 1
+        while os.path.exists(f"{base}{counter}.txt"):
+            counter += 1
+        filenames = [f"{base}{counter}.txt"]
+
+    # All files share one editor; F7/F8 switch between them and each is read when first shown
+    editor = NanoEditor(filenames[0], profiler)
+    for filename in filenames[1:]:
+        editor.open_document(filename)
+    if warm:
+        editor.documents = [warm.get(document.filename, document) for document in editor.documents]
+    editor.build_loop()
+    editor.show_document(editor.documents[0])
+
+    try:
+        editor.run()
+    except Exception as e:
+        print(f"ERROR: {str(e)}")
+        return 1
+    return 0
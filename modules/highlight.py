@@ -0,0 +1,121 @@
+import builtins
+import keyword
+import os
+import re
+
+
+class PythonLexer:
+    """Python tokens one line at a time; the state is the open triple quote, if any"""
+
+    KEYWORDS = frozenset(keyword.kwlist)
+    BUILTINS = frozenset(name for name in dir(builtins) if not name.startswith("_"))
+    TOKEN = re.compile(r"""
+        (?P<comment>\#.*)
+      | (?P<triple>[rRbBuUfF]{0,2}(?:\"\"\"|'''))
+      | (?P<string>[rRbBuUfF]{0,2}(?:"(?:[^"\\]|\\.)*"?|'(?:[^'\\]|\\.)*'?))
+      | (?P<decorator>^\s*@[\w.]+)
+      | (?P<number>\b(?:0[xXoObB][\da-fA-F_]+|\d[\d_]*\.?[\d_]*(?:[eE][+-]?\d+)?[jJ]?)|\.\d[\d_]*)
+      | (?P<name>[^\W\d]\w*)
+    """, re.VERBOSE)
+    # Text up to and including the closing quote of a triple-quoted string
+    CLOSE = {'"""': re.compile(r'(?:[^\\]|\\.)*?"""'), "'''": re.compile(r"(?:[^\\]|\\.)*?'''")}
+
+    def lex(self, text, state):
+        """Return the (attr, length) runs covering text and the state the next line starts in"""
+        spans = []
+        pos = 0
+        if state is not None:
+            pos = self._close(text, 0, state)
+            if pos is None:
+                return [('syntax_string', len(text))] if text else [], state
+            spans.append(('syntax_string', pos))
+            state = None
+        previous = None
+        while True:
+            match = self.TOKEN.search(text, pos)
+            if match is None:
+                break
+            start, end = match.span()
+            kind = match.lastgroup
+            attr = None
+            if kind == 'triple':
+                quote = match.group()[-3:]
+                end = self._close(text, end, quote)
+                if end is None:
+                    end = len(text)
+                    state = quote
+                attr = 'syntax_string'
+            elif kind == 'name':
+                word = match.group()
+                if previous in ('def', 'class'):
+                    attr = 'syntax_def'
+                elif word in self.KEYWORDS:
+                    attr = 'syntax_keyword'
+                elif word in self.BUILTINS:
+                    attr = 'syntax_builtin'
+                previous = word
+            else:
+                attr = 'syntax_' + kind
+            if start > pos:
+                _add_span(spans, None, start - pos)
+            _add_span(spans, attr, end - start)
+            pos = end
+        if pos < len(text):
+            _add_span(spans, None, len(text) - pos)
+        return spans, state
+
+    def _close(self, text, pos, quote):
+        """Offset just after the closing quote, or None if the string goes on"""
+        match = self.CLOSE[quote].match(text, pos)
+        return match.end() if match else None
+
+
+def _add_span(spans, attr, length):
+    """Append a run, merging it into the previous one with the same attribute"""
+    if spans and spans[-1][0] == attr:
+        spans[-1] = (attr, spans[-1][1] + length)
+    else:
+        spans.append((attr, length))
+
+
+# File extensions with a lexer; add an entry here to highlight another language
+LEXERS = {".py": PythonLexer, ".pyw": PythonLexer}
+
+
+def highlighter_for(filename):
+    """Return a Highlighter for the file type, or None for plain text"""
+    lexer = LEXERS.get(os.path.splitext(filename)[1].lower())
+    return Highlighter(lexer()) if lexer else None
+
+
+class Highlighter:
+    """Token spans per line, cached with the lexer state each line starts in"""
+
+    def __init__(self, lexer):
+        self.lexer = lexer
+        # Per line: (start state, spans, end state), or None once the line is edited
+        self.entries = []
+        # Lines before this one are known to be up to date
+        self.valid = 0
+
+    def apply_edit(self, line, removed_lines, inserted_lines):
+        """Drop the entries of the edited lines, keeping the ones after them for reuse"""
+        if line < len(self.entries):
+            self.entries[line:line + removed_lines + 1] = [None] * (inserted_lines + 1)
+        self.valid = min(self.valid, line)
+
+    def spans(self, buffer, line):
+        """Return the (attr, length) runs of a line, lexing from the first stale line"""
+        entries = self.entries
+        if len(entries) < buffer.line_count:
+            entries.extend([None] * (buffer.line_count - len(entries)))
+        state = entries[self.valid - 1][2] if self.valid else None
+        for current in range(self.valid, line + 1):
+            entry = entries[current]
+            # Past the edit, lexing stops as soon as a cached line starts in the same state
+            if entry is None or entry[0] != state:
+                spans, end_state = self.lexer.lex(buffer.get_line(current), state)
+                entry = entries[current] = (state, spans, end_state)
+            state = entry[2]
+        self.valid = max(self.valid, line + 1)
+        return entries[line][1]
@@ -0,0 +1,120 @@
+import time
+
+from modules.ProjectConstraint import HISTORY_BYTE_BUDGET, HISTORY_COALESCE_TIME, HISTORY_OP_OVERHEAD
+
+
+class EditHistory:
+    """Undo/redo log of edit operations with a memory budget"""
+
+    def __init__(self, budget=HISTORY_BYTE_BUDGET):
+        self.budget = budget
+        self.clear()
+
+    def clear(self):
+        """Forget all steps and treat the current text as saved"""
+        self.steps = []
+        self.index = 0
+        self.size = 0
+        self.saved_index = 0
+        self.group_depth = 0
+        self._last_time = 0.0
+        self._can_merge = False
+
+    def is_modified(self):
+        """Check whether the text differs from the last saved state"""
+        return self.index != self.saved_index
+
+    def mark_saved(self):
+        """Remember the current step as the saved state"""
+        self.saved_index = self.index
+        self._can_merge = False
+
+    def begin_group(self):
+        """Start collecting the following operations into one undo step"""
+        if self.group_depth == 0:
+            self._can_merge = False
+            self._new_step()
+        self.group_depth += 1
+
+    def end_group(self):
+        """Close the step opened by begin_group"""
+        self.group_depth = max(self.group_depth - 1, 0)
+        if self.group_depth == 0:
+            if self.steps and not self.steps[-1]:
+                self.steps.pop()
+                self.index -= 1
+            self._can_merge = False
+
+    def record(self, offset, removed, inserted):
+        """Record that removed was replaced by inserted at offset"""
+        now = time.monotonic()
+        if self.group_depth:
+            self.steps[-1].append([offset, removed, inserted])
+        elif not (self._can_merge and now - self._last_time < HISTORY_COALESCE_TIME
+                  and self._merge(offset, removed, inserted)):
+            self._new_step()
+            self.steps[-1].append([offset, removed, inserted])
+        self.size += len(removed) + len(inserted) + HISTORY_OP_OVERHEAD
+        self._last_time = now
+        self._can_merge = '\n' not in inserted
+        self._trim()
+
+    def undo(self):
+        """Step back and return the (offset, length, text) operations that restore the text"""
+        if self.index == 0 or self.group_depth:
+            return None
+        self.index -= 1
+        self._can_merge = False
+        return [(offset, len(inserted), removed)
+                for offset, removed, inserted in reversed(self.steps[self.index])]
+
+    def redo(self):
+        """Step forward and return the (offset, length, text) operations that reapply it"""
+        if self.index >= len(self.steps) or self.group_depth:
+            return None
+        self.index += 1
+        self._can_merge = False
+        return [(offset, len(removed), inserted)
+                for offset, removed, inserted in self.steps[self.index - 1]]
+
+    def _new_step(self):
+        """Drop the redo tail and open a new step"""
+        if self.index < len(self.steps):
+            for step in self.steps[self.index:]:
+                self.size -= self._step_size(step)
+            del self.steps[self.index:]
+            if self.saved_index > self.index:
+                self.saved_index = -1
+        self.steps.append([])
+        self.index += 1
+
+    def _merge(self, offset, removed, inserted):
+        """Fold consecutive typing or deleting into the last operation"""
+        if self.index != len(self.steps) or len(self.steps[-1]) != 1:
+            return False
+        op = self.steps[-1][0]
+        last_offset, last_removed, last_inserted = op
+        if not removed and not last_removed and offset == last_offset + len(last_inserted):
+            op[2] = last_inserted + inserted
+            return True
+        if not inserted and not last_inserted:
+            if offset + len(removed) == last_offset:
+                op[0] = offset
+                op[1] = removed + last_removed
+                return True
+            if offset == last_offset:
+                op[1] = last_removed + removed
+                return True
+        return False
+
+    def _trim(self):
+        """Evict the oldest steps while the log is over budget"""
+        while self.size > self.budget and self.index > 1 and len(self.steps) > 1:
+            self.size -= self._step_size(self.steps.pop(0))
+            self.index -= 1
+            self.saved_index -= 1
+
+    @staticmethod
+    def _step_size(step):
+        """Memory charged for one step"""
+        return sum(len(removed) + len(inserted) + HISTORY_OP_OVERHEAD for _, removed, inserted in step)
@@ -0,0 +1,104 @@
+import json
+import os
+
+
+def file_stamp(filename):
+    """Size and modification time identifying the saved version of a file, None if it is missing"""
+    try:
+        stat = os.stat(filename)
+    except FileNotFoundError:
+        return None
+    return [stat.st_size, stat.st_mtime_ns]
+
+
+class Journal:
+    """Append-only log of the edits made to a file since it was last saved"""
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.path = filename + ".parvum_journal"
+        self.base = file_stamp(filename)
+        self.fd = None
+        self.unsynced = False
+        self.error = None
+
+    def recover(self):
+        """Return the journaled (offset, length, text) edits, or None if the file changed since.
+
+        A journal that no longer matches the file is moved aside to .old rather
+        than replayed. A line torn by a crash ends the edits and is cut off.
+        """
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return []
+        ops = []
+        with f:
+            header = f.readline()
+            try:
+                matches = header.endswith(b"\n") and json.loads(header)["base"] == self.base
+            except (ValueError, KeyError, TypeError):
+                matches = False
+            end = len(header)
+            if matches:
+                for line in f:
+                    try:
+                        offset, length, text = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    ops.append((offset, length, text))
+                    end += len(line)
+        if not matches:
+            os.replace(self.path, self.path + ".old")
+            return None
+        os.truncate(self.path, end)
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND)
+        return ops
+
+    def record(self, offset, removed, inserted):
+        """Append one edit; it reaches the disk at the next sync"""
+        if self.error is not None:
+            return
+        try:
+            if self.fd is None:
+                self.fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC | os.O_APPEND, 0o644)
+                self._write({"base": self.base})
+            self._write([offset, len(removed), inserted])
+        except OSError as e:
+            self.error = e
+            raise
+        self.unsynced = True
+
+    def _write(self, record):
+        """Write one JSON line"""
+        data = (json.dumps(record) + "\n").encode("ascii")
+        while data:
+            data = data[os.write(self.fd, data):]
+
+    def sync(self):
+        """fsync the edits written so far; safe to call from a worker thread"""
+        self.unsynced = False
+        if self.fd is not None:
+            os.fsync(self.fd)
+
+    def close(self):
+        """Sync and close the journal, keeping it for the next start"""
+        if self.fd is not None:
+            self.sync()
+            os.close(self.fd)
+            self.fd = None
+
+    def discard(self):
+        """Close and delete the journal once the file on disk holds every edit"""
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+        self.base = file_stamp(self.filename)
+        self.unsynced = False
+        self.error = None
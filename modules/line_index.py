@@ -0,0 +1,297 @@
+import bisect
+from array import array
+from collections import OrderedDict
+from itertools import accumulate
+
+from modules.ProjectConstraint import LINE_CHECKPOINT_CACHE, LINE_CHECKPOINT_SIZE, LINE_INDEX_BLOCK
+
+
+class Fenwick:
+    """Fenwick tree of integer sums"""
+
+    def __init__(self, values=()):
+        self.build(values)
+
+    def build(self, values):
+        """Rebuild the tree from a list of values"""
+        size = len(values)
+        tree = [0] * (size + 1)
+        for i, value in enumerate(values, 1):
+            tree[i] += value
+            parent = i + (i & -i)
+            if parent <= size:
+                tree[parent] += tree[i]
+        self._tree = tree
+        self._size = size
+        self._top = 1 << (size.bit_length() - 1) if size else 0
+
+    def add(self, index, delta):
+        """Add delta to the value at index"""
+        i = index + 1
+        tree = self._tree
+        while i <= self._size:
+            tree[i] += delta
+            i += i & -i
+
+    def append(self, value):
+        """Add a value after the last one"""
+        i = self._size + 1
+        self._tree.append(value + self.prefix(i - 1) - self.prefix(i - (i & -i)))
+        self._size = i
+        self._top = 1 << (i.bit_length() - 1)
+
+    def prefix(self, index):
+        """Return the sum of values before index"""
+        total = 0
+        tree = self._tree
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+        return total
+
+    def find(self, target):
+        """Return (index, remainder) of the value that contains the target sum"""
+        pos = 0
+        bit = self._top
+        tree = self._tree
+        while bit:
+            nxt = pos + bit
+            if nxt <= self._size and tree[nxt] <= target:
+                pos = nxt
+                target -= tree[nxt]
+            bit >>= 1
+        return pos, target
+
+
+class LineIndex:
+    """Line lengths kept in blocks, summed by Fenwick trees for O(log n) lookups"""
+
+    def __init__(self, text=""):
+        self.reset(text)
+
+    def reset(self, text):
+        """Rebuild the index from text"""
+        lengths = array('q', (len(line) for line in text.split('\n')))
+        for i in range(len(lengths) - 1):
+            lengths[i] += 1
+        self._blocks = [lengths[i:i + LINE_INDEX_BLOCK]
+                        for i in range(0, len(lengths), LINE_INDEX_BLOCK)]
+        self._length = len(text)
+        self._rebuild()
+
+    @property
+    def length(self):
+        """Number of characters covered by the index"""
+        return self._length
+
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        return self._line_count
+
+    def position(self, offset):
+        """Return the zero-based (line, column) of an offset"""
+        offset = min(max(offset, 0), self._length)
+        block_index, rel = self._chars.find(offset)
+        if block_index >= len(self._blocks):
+            block_index = len(self._blocks) - 1
+            rel = offset - self._chars.prefix(block_index)
+        block = self._blocks[block_index]
+        sums = list(accumulate(block))
+        i = min(bisect.bisect_right(sums, rel), len(block) - 1)
+        col = rel - (sums[i - 1] if i else 0)
+        return self._lines.prefix(block_index) + i, col
+
+    def line_start(self, line):
+        """Return the offset of the first character of a zero-based line"""
+        line = min(max(line, 0), self._line_count - 1)
+        block_index, i = self._lines.find(line)
+        return self._chars.prefix(block_index) + sum(self._blocks[block_index][:i])
+
+    def line_length(self, line):
+        """Return the length of a zero-based line including its newline"""
+        line = min(max(line, 0), self._line_count - 1)
+        block_index, i = self._lines.find(line)
+        return self._blocks[block_index][i]
+
+    def apply_edit(self, offset, removed, inserted):
+        """Patch the index for removed text replaced by inserted text at offset"""
+        first, start_col = self.position(offset)
+        if '\n' in removed:
+            last, end_col = self.position(offset + len(removed))
+        else:
+            last, end_col = first, start_col + len(removed)
+        suffix = self.line_length(last) - end_col
+
+        if '\n' in inserted:
+            parts = [len(part) + 1 for part in inserted.split('\n')]
+            parts[0] += start_col
+            parts[-1] += suffix - 1
+        else:
+            parts = [start_col + len(inserted) + suffix]
+
+        self._length += len(inserted) - len(removed)
+        self._replace_lines(first, last, parts)
+
+    def _replace_lines(self, first, last, lengths):
+        """Replace the lengths of lines first..last (inclusive)"""
+        first_block, first_i = self._lines.find(first)
+        last_block, last_i = self._lines.find(last)
+        if first_block == last_block:
+            block = self._blocks[first_block]
+            removed = block[first_i:last_i + 1]
+            block[first_i:last_i + 1] = array('q', lengths)
+            if len(block) <= 2 * LINE_INDEX_BLOCK:
+                self._chars.add(first_block, sum(lengths) - sum(removed))
+                self._lines.add(first_block, len(lengths) - len(removed))
+                self._line_count += len(lengths) - len(removed)
+                return
+            merged = block
+        else:
+            merged = (self._blocks[first_block][:first_i] + array('q', lengths) +
+                      self._blocks[last_block][last_i + 1:])
+        self._blocks[first_block:last_block + 1] = [
+            merged[i:i + LINE_INDEX_BLOCK] for i in range(0, len(merged), LINE_INDEX_BLOCK)]
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recompute the block sums after blocks were split or merged"""
+        self._chars = Fenwick([sum(block) for block in self._blocks])
+        self._lines = Fenwick([len(block) for block in self._blocks])
+        self._line_count = sum(len(block) for block in self._blocks)
+
+
+class CheckpointIndex:
+    """Line index of a mapped file: newline counts of the spans between checkpoints, scanned locally.
+
+    A checkpoint follows the first newline after every LINE_CHECKPOINT_SIZE
+    characters, so the index keeps a few integers per span instead of one per
+    line. Every span but the last ends in a newline. Lines inside a span are
+    found by reading its text through read(start, end); the spans read last
+    are kept expanded.
+    """
+
+    def __init__(self, read):
+        self._read = read
+        self._spans = array('q', [0])
+        self._newlines = array('q', [0])
+        self._cache = OrderedDict()
+        self._rebuild()
+
+    @property
+    def length(self):
+        """Number of characters covered by the index"""
+        return self._length
+
+    @property
+    def line_count(self):
+        """Number of lines in the document"""
+        return self._line_count
+
+    def position(self, offset):
+        """Return the zero-based (line, column) of an offset"""
+        span, rel = self._find(self._chars, min(max(offset, 0), self._length))
+        starts = self._starts(span)
+        i = bisect.bisect_right(starts, rel) - 1
+        return self._lines.prefix(span) + i, rel - starts[i]
+
+    def line_start(self, line):
+        """Return the offset of the first character of a zero-based line"""
+        span, i = self._find(self._lines, min(max(line, 0), self._line_count - 1))
+        return self._chars.prefix(span) + self._starts(span)[i]
+
+    def line_length(self, line):
+        """Return the length of a zero-based line including its newline"""
+        span, i = self._find(self._lines, min(max(line, 0), self._line_count - 1))
+        starts = self._starts(span)
+        end = starts[i + 1] if i + 1 < len(starts) else self._spans[span]
+        return end - starts[i]
+
+    def append(self, chars, newlines):
+        """Grow the last span by chars[0] characters holding newlines[0] newlines, then add the other spans"""
+        last = len(self._spans) - 1
+        self._spans[last] += chars[0]
+        self._newlines[last] += newlines[0]
+        self._chars.add(last, chars[0])
+        self._lines.add(last, newlines[0])
+        self._cache.pop(last, None)
+        for span_chars, span_newlines in zip(chars[1:], newlines[1:]):
+            self._spans.append(span_chars)
+            self._newlines.append(span_newlines)
+            self._chars.append(span_chars)
+            self._lines.append(span_newlines)
+        self._length += sum(chars)
+        self._line_count += sum(newlines)
+
+    def apply_edit(self, offset, removed, inserted):
+        """Patch the index for removed text replaced by inserted text at offset"""
+        first, _ = self._find(self._chars, offset)
+        last = first
+        if removed:
+            last, rel = self._find(self._chars, offset + len(removed) - 1)
+            if rel == self._spans[last] - 1 and last + 1 < len(self._spans):
+                # The newline closing that span goes, so it runs on into the next one
+                last += 1
+        chars = len(inserted) - len(removed)
+        newlines = inserted.count("\n") - removed.count("\n")
+        self._length += chars
+        if last == first and self._spans[first] + chars <= 4 * LINE_CHECKPOINT_SIZE:
+            self._spans[first] += chars
+            self._newlines[first] += newlines
+            self._chars.add(first, chars)
+            self._lines.add(first, newlines)
+            self._line_count += newlines
+            self._cache.pop(first, None)
+            return
+        start = self._chars.prefix(first)
+        end = start + sum(self._spans[first:last + 1]) + chars
+        self._spans[first:last + 1], self._newlines[first:last + 1] = self._split(self._read(start, end),
+                                                                            last + 1 == len(self._spans))
+        self._rebuild()
+
+    def _split(self, text, final):
+        """Cut text at checkpoints into (span lengths, newline counts); a final text keeps its empty end"""
+        spans = array('q')
+        newlines = array('q')
+        start = 0
+        while True:
+            end = text.find("\n", start + LINE_CHECKPOINT_SIZE - 1) + 1
+            if not end or end == len(text):
+                break
+            spans.append(end - start)
+            newlines.append(text.count("\n", start, end))
+            start = end
+        if start < len(text) or final or not spans:
+            spans.append(len(text) - start)
+            newlines.append(text.count("\n", start))
+        return spans, newlines
+
+    def _find(self, tree, target):
+        """Return (span, remainder) of a character offset or line number, the last span past the end"""
+        span, rel = tree.find(target)
+        if span >= len(self._spans):
+            span = len(self._spans) - 1
+            rel = target - tree.prefix(span)
+        return span, rel
+
+    def _starts(self, span):
+        """Offsets within a span of the lines starting in it, then its end for a span closed by a newline"""
+        starts = self._cache.get(span)
+        if starts is None:
+            start = self._chars.prefix(span)
+            parts = self._read(start, start + self._spans[span]).split("\n")
+            starts = array('q', accumulate((len(part) + 1 for part in parts[:-1]), initial=0))
+            self._cache[span] = starts
+            if len(self._cache) > LINE_CHECKPOINT_CACHE:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.move_to_end(span)
+        return starts
+
+    def _rebuild(self):
+        """Recompute the span sums after spans were split or merged"""
+        self._chars = Fenwick(self._spans)
+        self._lines = Fenwick(self._newlines)
+        self._length = sum(self._spans)
+        self._line_count = sum(self._newlines) + 1
+        self._cache.clear()
@@ -0,0 +1,40 @@
+import os
+import threading
+
+from modules.ProjectConstraint import LOAD_CHUNK_SIZE
+
+
+class TextLoader(threading.Thread):
+    """Reads and decodes a file in a worker thread, posting the text in chunks"""
+
+    def __init__(self, path, dispatcher, on_chunk, on_done):
+        super().__init__(daemon=True)
+        self.path = path
+        self.dispatcher = dispatcher
+        self.on_chunk = on_chunk
+        self.on_done = on_done
+        # File size and bytes shown so far, for the progress readout
+        self.size = 0
+        self.done = 0
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop at the next chunk; nothing more is posted"""
+        self._cancelled.set()
+
+    def run(self):
+        """Post each decoded chunk and the bytes read up to its end, then on_done with the error, if any"""
+        try:
+            with open(self.path, "r", encoding="utf-8", errors="replace") as f:
+                self.size = os.fstat(f.fileno()).st_size
+                while True:
+                    text = f.read(LOAD_CHUNK_SIZE)
+                    if self._cancelled.is_set():
+                        return
+                    if not text:
+                        break
+                    self.dispatcher.post(self.on_chunk, self, text, f.buffer.tell())
+        except (OSError, ValueError) as e:
+            self.dispatcher.post(self.on_done, self, e)
+            return
+        self.dispatcher.post(self.on_done, self, None)
@@ -0,0 +1,94 @@
+import mmap
+import re
+import threading
+from array import array
+
+from modules.ProjectConstraint import LINE_CHECKPOINT_SIZE, MAPPED_CHUNK_SIZE
+
+# Bytes that are not UTF-8, as surrogateescape decodes them
+_ESCAPED = re.compile("[\udc80-\udcff]")
+
+
+def decode_line(raw):
+    """Decode a line of mapped text (one character per byte) as UTF-8 for display.
+
+    Returns the text and the byte column each of its characters starts at, plus
+    the line length, or None for the columns when every byte is a character.
+    Bytes that are not UTF-8 show as U+FFFD, one per byte.
+    """
+    if raw.isascii():
+        return raw, None
+    text = raw.encode("latin-1").decode("utf-8", errors="surrogateescape")
+    starts = array('q')
+    col = 0
+    for char in text:
+        starts.append(col)
+        col += 1 if "\udc80" <= char <= "\udcff" else len(char.encode("utf-8"))
+    starts.append(col)
+    return _ESCAPED.sub("\ufffd", text), starts
+
+
+class MappedText:
+    """Memory-mapped file read as text, one character per byte"""
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def __len__(self):
+        return len(self._map)
+
+    def __getitem__(self, key):
+        """Decode a slice of the file"""
+        return self._map[key].decode("latin-1")
+
+    def iter_raw(self, start, end):
+        """Yield the bytes between two offsets in blocks"""
+        for pos in range(start, end, MAPPED_CHUNK_SIZE):
+            yield self._map[pos:min(pos + MAPPED_CHUNK_SIZE, end)]
+
+    def iter_text(self, start, end):
+        """Yield the text between two offsets in blocks"""
+        for block in self.iter_raw(start, end):
+            yield block.decode("latin-1")
+
+
+class LineIndexer(threading.Thread):
+    """Finds the line checkpoints of a mapped file in a worker thread, posting them per block"""
+
+    def __init__(self, source, dispatcher, on_batch, on_done):
+        super().__init__(daemon=True)
+        self.source = source
+        self.dispatcher = dispatcher
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop at the next block; nothing more is posted"""
+        self._cancelled.set()
+
+    def run(self):
+        """Post (chars, newlines) per block: the first pair grows the last span, the others are new spans"""
+        base = 0
+        span_start = 0
+        for block in self.source.iter_raw(0, len(self.source)):
+            if self._cancelled.is_set():
+                return
+            chars = array('q')
+            newlines = array('q')
+            start = 0
+            while True:
+                end = block.find(b"\n", max(span_start + LINE_CHECKPOINT_SIZE - 1 - base, start)) + 1
+                if not end:
+                    break
+                chars.append(end - start)
+                newlines.append(block.count(b"\n", start, end))
+                start = end
+                span_start = base + end
+            chars.append(len(block) - start)
+            newlines.append(block.count(b"\n", start))
+            base += len(block)
+            self.dispatcher.post(self.on_batch, self, chars, newlines)
+        self.dispatcher.post(self.on_done, self)
@@ -0,0 +1,92 @@
+from modules.diff import diff_lines
+
+_COMPARE_STEP = 4096
+
+
+def changed_region(old, new):
+    """Return (start, old_end, new_end) bounding the part of old that new replaces"""
+    limit = min(len(old), len(new))
+    start = 0
+    # Skip equal blocks, then find the first differing character inside the block
+    while start < limit and old[start:start + _COMPARE_STEP] == new[start:start + _COMPARE_STEP]:
+        start += _COMPARE_STEP
+    start = min(start, limit)
+    while start < limit and old[start] == new[start]:
+        start += 1
+    tail = 0
+    room = limit - start
+    while tail < room:
+        step = min(_COMPARE_STEP, room - tail)
+        if old[len(old) - tail - step:len(old) - tail] != new[len(new) - tail - step:len(new) - tail]:
+            break
+        tail += step
+    while tail < room and old[len(old) - tail - 1] == new[len(new) - tail - 1]:
+        tail += 1
+    return start, len(old) - tail, len(new) - tail
+
+
+def _matching_blocks(a, b):
+    """(a start, b start, length) of the unchanged runs, ending with (len(a), len(b), 0)"""
+    blocks = [(i1, j1, i2 - i1) for tag, i1, i2, j1, j2 in diff_lines(a, b) if tag == "equal"]
+    blocks.append((len(a), len(b), 0))
+    return blocks
+
+
+def _sync_regions(base, ours, theirs):
+    """Yield (base start, base end, ours start, theirs start) of runs no side changed"""
+    matches_ours = _matching_blocks(base, ours)
+    matches_theirs = _matching_blocks(base, theirs)
+    i = j = 0
+    while i < len(matches_ours) and j < len(matches_theirs):
+        base_o, ours_start, length_o = matches_ours[i]
+        base_t, theirs_start, length_t = matches_theirs[j]
+        start = max(base_o, base_t)
+        end = min(base_o + length_o, base_t + length_t)
+        if start < end:
+            yield start, end, ours_start + start - base_o, theirs_start + start - base_t
+        if base_o + length_o < base_t + length_t:
+            i += 1
+        else:
+            j += 1
+    yield len(base), len(base), len(ours), len(theirs)
+
+
+def merge3(base, ours, theirs, ours_label="yours", theirs_label="disk"):
+    """Merge the changes base->ours and base->theirs line by line; return (text, conflict count).
+
+    Where both sides changed the same lines differently, both versions are kept
+    between <<<<<<< / ======= / >>>>>>> markers.
+    """
+    base_lines = base.splitlines(keepends=True)
+    ours_lines = ours.splitlines(keepends=True)
+    theirs_lines = theirs.splitlines(keepends=True)
+    merged = []
+    conflicts = 0
+    base_pos = ours_pos = theirs_pos = 0
+    for base_start, base_end, ours_start, theirs_start in _sync_regions(base_lines, ours_lines, theirs_lines):
+        base_part = base_lines[base_pos:base_start]
+        ours_part = ours_lines[ours_pos:ours_start]
+        theirs_part = theirs_lines[theirs_pos:theirs_start]
+        if ours_part == theirs_part or theirs_part == base_part:
+            merged.extend(ours_part)
+        elif ours_part == base_part:
+            merged.extend(theirs_part)
+        else:
+            conflicts += 1
+            merged.append(f"<<<<<<< {ours_label}\n")
+            merged.extend(_terminated(ours_part))
+            merged.append("=======\n")
+            merged.extend(_terminated(theirs_part))
+            merged.append(f">>>>>>> {theirs_label}\n")
+        merged.extend(base_lines[base_start:base_end])
+        base_pos = base_end
+        ours_pos = ours_start + base_end - base_start
+        theirs_pos = theirs_start + base_end - base_start
+    return "".join(merged), conflicts
+
+
+def _terminated(lines):
+    """Lines with a newline added to the last one so a marker can follow"""
+    if lines and not lines[-1].endswith("\n"):
+        return lines[:-1] + [lines[-1] + "\n"]
+    return lines
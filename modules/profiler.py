@@ -0,0 +1,123 @@
+import cProfile
+import json
+import time
+from collections import deque
+
+from modules.ProjectConstraint import PROFILE_WINDOW
+
+NAVIGATION_KEYS = {"up", "down", "left", "right", "home", "end", "page up", "page down",
+                   "ctrl up", "ctrl down", "ctrl left", "ctrl right", "ctrl home", "ctrl end",
+                   "shift up", "shift down", "shift left", "shift right", "shift home", "shift end",
+                   "shift page up", "shift page down"}
+
+
+def key_class(key):
+    """Sort a key into printable, navigation (mouse included) or control without keeping the key"""
+    if not isinstance(key, str) or key in NAVIGATION_KEYS:
+        return "navigation"
+    # urwid names special keys in ASCII words, so anything else printable is typed text
+    if key == "enter" or (key.isprintable() and (len(key) == 1 or not key.isascii())):
+        return "printable"
+    return "control"
+
+
+class Profiler:
+    """Times editor handlers per input event, keeps a rolling readout and writes a JSONL trace"""
+
+    def __init__(self, trace_path, cprofile_path=None, window=PROFILE_WINDOW, raw_keys=False):
+        self.trace = open(trace_path, "w", encoding="utf-8")
+        self.cprofile_path = cprofile_path
+        self.cprofile = cProfile.Profile() if cprofile_path else None
+        self.totals = deque(maxlen=window)
+        # Typed text can be a password, so the trace only says what kind of keys came unless asked
+        self.raw_keys = raw_keys
+        self.event = None
+
+    def wrap(self, obj, names, prefix=""):
+        """Replace methods of obj with timed versions, before anything keeps a reference to them"""
+        for name in names:
+            setattr(obj, name, self._timed(getattr(obj, name), prefix + name))
+
+    def _timed(self, method, name):
+        """Wrap one method to add its time to the current event"""
+        def timed(*args, **kwargs):
+            if self.event is None:
+                self._begin("callback", None)
+            # A redraw inside the call closes the event, the time still belongs to it
+            event = self.event
+            start = time.perf_counter()
+            try:
+                return method(*args, **kwargs)
+            finally:
+                calls = event["calls"].setdefault(name, [0, 0.0])
+                calls[0] += 1
+                calls[1] += time.perf_counter() - start
+        return timed
+
+    def attach(self, loop):
+        """Time each input batch from the first key to the end of the redraw it caused"""
+        process_input = loop.process_input
+        draw_screen = loop.draw_screen
+
+        def timed_input(keys):
+            self._begin("input", keys)
+            return process_input(keys)
+
+        def timed_draw():
+            start = time.perf_counter()
+            try:
+                return draw_screen()
+            finally:
+                if self.event is not None:
+                    self.event["draw"] = time.perf_counter() - start
+                    self._end()
+
+        loop.process_input = timed_input
+        loop.draw_screen = timed_draw
+        if self.cprofile is not None:
+            self.cprofile.enable()
+
+    def _begin(self, kind, keys):
+        """Open an event, closing one that never reached a redraw"""
+        if self.event is not None:
+            self._end()
+        self.event = {"kind": kind, "keys": keys, "start": time.perf_counter(), "draw": 0.0, "calls": {}}
+
+    def _end(self):
+        """Record the open event in the rolling window and the trace"""
+        event = self.event
+        self.event = None
+        total = time.perf_counter() - event["start"]
+        self.totals.append(total)
+        keys = event["keys"] or ()
+        classes = {}
+        for key in keys:
+            name = key_class(key)
+            classes[name] = classes.get(name, 0) + 1
+        record = {"time": round(time.time(), 3),
+                  "kind": event["kind"],
+                  "keys": len(keys),
+                  "key_classes": classes,
+                  "total_ms": round(total * 1000, 3),
+                  "draw_ms": round(event["draw"] * 1000, 3),
+                  "calls": {name: [count, round(seconds * 1000, 3)]
+                            for name, (count, seconds) in event["calls"].items()}}
+        if self.raw_keys:
+            record["raw_keys"] = [str(key) for key in keys]
+        self.trace.write(json.dumps(record) + "\n")
+
+    def readout(self):
+        """Short p50/p99 latency summary of the recent events"""
+        if not self.totals:
+            return ""
+        totals = sorted(self.totals)
+        p50 = totals[len(totals) // 2] * 1000
+        p99 = totals[min(len(totals) - 1, len(totals) * 99 // 100)] * 1000
+        return f"p50 {p50:.1f}ms p99 {p99:.1f}ms"
+
+    def close(self):
+        """Flush the trace and write the cProfile dump"""
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            self.cprofile.dump_stats(self.cprofile_path)
+        self.trace.close()
@@ -0,0 +1,295 @@
+import codecs
+import errno
+import os
+import sys
+from array import array
+from itertools import accumulate
+
+from modules.ProjectConstraint import OFFSET_INDEX_SAMPLES, OFFSET_INDEX_STRIDE, READ_CHUNK_SIZE
+
+# Bytes read before each sampled line start when checking a cached index
+_SAMPLE_SIZE = 64
+# Cache files are never opened through a symbolic link
+_NOFOLLOW = getattr(os, "O_NOFOLLOW", 0)
+
+
+def parse_range(value):
+    """Parse 'A:B' into (A, B), either side may be empty (None)"""
+    start, sep, end = value.partition(":")
+    if not sep:
+        raise ValueError(f"Expected a range like A:B, got '{value}'")
+    return (int(start) if start else None), (int(end) if end else None)
+
+
+def option_value(argv, name, default=None):
+    """Return the argument after an option, default if it is missing or another option"""
+    index = argv.index(name)
+    if index + 1 < len(argv) and not argv[index + 1].startswith("--"):
+        return argv[index + 1]
+    return default
+
+
+def skip_lines(f, offset, count):
+    """Return the offset just after count more newlines from offset, or the end of file"""
+    if count <= 0:
+        return offset
+    f.seek(offset)
+    while count > 0:
+        block = f.read(READ_CHUNK_SIZE)
+        if not block:
+            break
+        found = block.count(b"\n")
+        if found < count:
+            count -= found
+            offset += len(block)
+            continue
+        pos = -1
+        for _ in range(count):
+            pos = block.index(b"\n", pos + 1)
+        return offset + pos + 1
+    return f.seek(0, os.SEEK_END)
+
+
+def tail_offset(f, count):
+    """Return the offset where the last count lines start, reading backwards from the end"""
+    end = f.seek(0, os.SEEK_END)
+    if count <= 0:
+        return end
+    pos = end
+    # A trailing newline ends the last line rather than starting an empty one
+    f.seek(max(end - 1, 0))
+    if f.read(1) == b"\n":
+        pos -= 1
+    while pos > 0:
+        start = max(pos - READ_CHUNK_SIZE, 0)
+        f.seek(start)
+        block = f.read(pos - start)
+        found = block.count(b"\n")
+        if found >= count:
+            for _ in range(count):
+                pos = start + block.rindex(b"\n", 0, pos - start)
+            return pos + 1
+        count -= found
+        pos = start
+    return 0
+
+
+def _cache_directory():
+    """This user's directory for offset indexes, None if it cannot be made private"""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    directory = os.path.join(base, "parvum", "index")
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        stat = os.lstat(directory)
+    except OSError:
+        return None
+    if not os.path.isdir(directory) or os.path.islink(directory):
+        return None
+    if hasattr(os, "getuid") and (stat.st_uid != os.getuid() or stat.st_mode & 0o077):
+        return None
+    return directory
+
+
+class OffsetIndex:
+    """Byte offset of every OFFSET_INDEX_STRIDE-th line of a file's start, cached on disk per file.
+
+    Only as much of the file is indexed as has been asked for. The cache keeps a
+    digest of the bytes before a sample of the indexed line starts; it is only
+    reused, and extended over later data, if they still match.
+    """
+
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.offsets = array('q', [0])
+        # Newlines in, and length of, the indexed start of the file
+        self.lines = 0
+        self.size = 0
+        self.changed = False
+
+    @property
+    def cache_path(self):
+        """File the index is kept in between runs, None if there is no private place for it"""
+        import hashlib
+
+        directory = _cache_directory()
+        if directory is None:
+            return None
+        key = hashlib.sha1(self.path.encode("utf-8", "surrogateescape")).hexdigest()
+        return os.path.join(directory, key + ".idx")
+
+    def load(self, f):
+        """Read the cached index, or start a new one if it no longer fits the file, return self"""
+        size = os.fstat(f.fileno()).st_size
+        digest = b""
+        try:
+            with os.fdopen(os.open(self.cache_path, os.O_RDONLY | _NOFOLLOW), "rb") as cache:
+                header = array('q')
+                header.fromfile(cache, 2)
+                self.size, self.lines = header
+                digest = cache.read(20)
+                self.offsets = array('q')
+                self.offsets.frombytes(cache.read())
+        except (OSError, EOFError, ValueError, TypeError):
+            self.offsets = array('q')
+        if not (self.offsets and self.offsets[0] == 0 and self.size <= size and digest == self.digest(f)):
+            # Edited rather than appended to: the old offsets may point anywhere
+            self.size = self.lines = 0
+            self.offsets = array('q', [0])
+        return self
+
+    def feed(self, offset, block):
+        """Index the part of a block read at offset that lies past the indexed start"""
+        if not offset <= self.size < offset + len(block):
+            return
+        block = block[self.size - offset:]
+        # Offsets just after each newline, relative to the block
+        ends = list(accumulate(map((1).__add__, map(len, block.split(b"\n")[:-1]))))
+        first = OFFSET_INDEX_STRIDE - self.lines % OFFSET_INDEX_STRIDE - 1
+        self.offsets.extend(self.size + end for end in ends[first::OFFSET_INDEX_STRIDE])
+        self.lines += len(ends)
+        self.size += len(block)
+        self.changed = True
+
+    def extend(self, f, line):
+        """Index on until the start of a zero-based line, or the end of the file, is known"""
+        f.seek(self.size)
+        while self.lines < line:
+            block = f.read(READ_CHUNK_SIZE)
+            if not block:
+                break
+            self.feed(self.size, block)
+
+    def digest(self, f):
+        """Hash the bytes before OFFSET_INDEX_SAMPLES of the indexed line starts and before the indexed end"""
+        import hashlib
+
+        step = max(len(self.offsets) // OFFSET_INDEX_SAMPLES, 1)
+        positions = list(self.offsets[step::step]) + [self.size]
+        digest = hashlib.sha1(str(self.size).encode())
+        for pos in positions:
+            f.seek(max(pos - _SAMPLE_SIZE, 0))
+            digest.update(f.read(min(pos, _SAMPLE_SIZE)))
+        return digest.digest()
+
+    def save(self, f):
+        """Write the index to a new file and rename it over the cache if it grew, ignoring failures"""
+        path = self.cache_path
+        if path is None or not self.changed:
+            return
+        temp_name = f"{path}.{os.getpid()}.tmp"
+        try:
+            fd = os.open(temp_name, os.O_WRONLY | os.O_CREAT | os.O_EXCL | _NOFOLLOW, 0o600)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "wb") as cache:
+                array('q', [self.size, self.lines]).tofile(cache)
+                cache.write(self.digest(f))
+                self.offsets.tofile(cache)
+            os.replace(temp_name, path)
+        except OSError:
+            try:
+                os.unlink(temp_name)
+            except OSError:
+                pass
+
+    def line_offset(self, f, line):
+        """Return the offset of a zero-based line, indexing up to it first"""
+        self.extend(f, line)
+        block = min(line // OFFSET_INDEX_STRIDE, len(self.offsets) - 1)
+        return skip_lines(f, self.offsets[block], line - block * OFFSET_INDEX_STRIDE)
+
+
+def resolve_range(f, argv):
+    """Turn the --bytes, --head and --tail options into a byte range"""
+    size = f.seek(0, os.SEEK_END)
+    if "--bytes" in argv:
+        start, end = parse_range(option_value(argv, "--bytes", ""))
+        return max(start or 0, 0), min(size if end is None else end, size)
+    if "--head" in argv:
+        return 0, skip_lines(f, 0, int(option_value(argv, "--head", 10)))
+    if "--tail" in argv:
+        return tail_offset(f, int(option_value(argv, "--tail", 10))), size
+    return 0, size
+
+
+def stream_file(path, argv=()):
+    """Copy a file, or the range selected in argv, to stdout with constant memory"""
+    with open(path, "rb") as f:
+        sys.stdout.flush()
+        out = sys.stdout.buffer
+        encoding = codecs.lookup(sys.stdout.encoding or "utf-8").name
+        if encoding == "utf-8":
+            write = out.write
+        else:
+            # The console cannot take UTF-8 bytes, so decode and let stdout re-encode them
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="ignore")
+            write = lambda block: sys.stdout.write(decoder.decode(block))
+        if "--lines" in argv:
+            stream_lines(f, path, argv, write)
+            sys.stdout.flush()
+            return
+        start, end = resolve_range(f, argv)
+        if encoding == "utf-8" and hasattr(os, "sendfile") and not out.isatty():
+            _sendfile(f, out.fileno(), start, end)
+            return
+        f.seek(start)
+        while start < end:
+            block = f.read(min(READ_CHUNK_SIZE, end - start))
+            if not block:
+                break
+            write(block)
+            start += len(block)
+        sys.stdout.flush()
+
+
+def stream_lines(f, path, argv, write):
+    """Write lines A:B of --lines as they are read, indexing the file only up to line B"""
+    first, last = parse_range(option_value(argv, "--lines", ""))
+    first = max(first or 1, 1)
+    remaining = None if last is None else last - first + 1
+    index = OffsetIndex(path).load(f)
+    try:
+        offset = index.line_offset(f, first - 1)
+        f.seek(offset)
+        while remaining is None or remaining > 0:
+            block = f.read(READ_CHUNK_SIZE)
+            if not block:
+                break
+            if remaining is not None:
+                found = block.count(b"\n")
+                if found >= remaining:
+                    pos = -1
+                    for _ in range(remaining):
+                        pos = block.index(b"\n", pos + 1)
+                    block = block[:pos + 1]
+                    found = remaining
+                remaining -= found
+            index.feed(offset, block)
+            write(block)
+            offset += len(block)
+    finally:
+        # Even after `| head` closed the pipe, what was indexed is kept
+        index.save(f)
+
+
+def _sendfile(f, fd, start, end):
+    """Let the kernel copy a byte range, falling back to reads where sendfile is refused"""
+    first = start
+    try:
+        while start < end:
+            sent = os.sendfile(fd, f.fileno(), start, end - start)
+            if not sent:
+                return
+            start += sent
+    except OSError as e:
+        if start != first or e.errno not in (errno.EINVAL, errno.ENOSYS):
+            raise
+        f.seek(start)
+        while start < end:
+            block = f.read(min(READ_CHUNK_SIZE, end - start))
+            if not block:
+                break
+            sys.stdout.buffer.write(block)
+            start += len(block)
+        sys.stdout.flush()
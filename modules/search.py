@@ -0,0 +1,264 @@
+import bisect
+import functools
+import re
+import threading
+
+try:
+    from re import _constants as sre_constants, _parser as sre_parse
+except ImportError:
+    import sre_constants
+    import sre_parse
+
+from modules.ProjectConstraint import PATTERN_CACHE_SIZE, SEARCH_CHUNK_SIZE, SEARCH_OVERLAP
+
+# End-of-text anchors can appear or vanish far from an edit
+_END_ANCHOR = re.compile(r'\$|\\Z')
+# Character classes that include the newline
+_NEWLINE_CATEGORIES = {sre_constants.CATEGORY_SPACE, sre_constants.CATEGORY_NOT_DIGIT,
+                       sre_constants.CATEGORY_NOT_WORD, sre_constants.CATEGORY_LINEBREAK}
+
+
+@functools.lru_cache(maxsize=PATTERN_CACHE_SIZE)
+def compile_query(query, regex=False):
+    """Compile a case-insensitive search query, literal unless regex is set"""
+    return re.compile(query if regex else re.escape(query), re.IGNORECASE)
+
+
+def spans_lines(pattern):
+    """Check whether a regex could consume or look at a newline, so its matches are not confined to one line"""
+    parsed = sre_parse.parse(pattern.pattern, pattern.flags)
+    return _has_newline(parsed, bool(parsed.state.flags & re.DOTALL))
+
+
+def _has_newline(items, dotall):
+    """Walk a parsed pattern for an element that matches a newline"""
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            found = av == 10
+        elif op is sre_constants.NOT_LITERAL:
+            found = av != 10
+        elif op is sre_constants.ANY:
+            found = dotall
+        elif op is sre_constants.IN:
+            found = _set_has_newline(av)
+        elif op is sre_constants.SUBPATTERN:
+            _, add_flags, del_flags, sub = av
+            found = _has_newline(sub, (dotall or bool(add_flags & re.DOTALL)) and not del_flags & re.DOTALL)
+        else:
+            # Repeats, branches, groups and lookarounds: check every nested pattern
+            parts = av if isinstance(av, (tuple, list)) else (av,)
+            subs = [part for part in parts if isinstance(part, sre_parse.SubPattern)]
+            for part in parts:
+                if isinstance(part, list):
+                    subs.extend(sub for sub in part if isinstance(sub, sre_parse.SubPattern))
+            found = any(_has_newline(sub, dotall) for sub in subs)
+        if found:
+            return True
+    return False
+
+
+def _set_has_newline(items):
+    """Check whether a parsed [...] set takes a newline"""
+    negate = bool(items) and items[0][0] is sre_constants.NEGATE
+    found = False
+    for op, av in items:
+        if op is sre_constants.LITERAL:
+            found = found or av == 10
+        elif op is sre_constants.RANGE:
+            found = found or av[0] <= 10 <= av[1]
+        elif op is sre_constants.CATEGORY:
+            found = found or av in _NEWLINE_CATEGORIES
+    return found != negate
+
+
+def replace_all(text, pattern, replacement, regex=False, start=0, end=None):
+    """Replace every match in one pass like re.sub, return (start, end, new_text, count) or None.
+
+    Only the span from the first match to the end of the last one is returned,
+    so callers can apply it as a single edit. Empty matches (^, $, \\b, lookaheads)
+    insert the replacement. Matches are taken from text[start:end] only; the
+    text around it is context for anchors and lookarounds.
+    """
+    end = len(text) if end is None else end
+    parts = []
+    first = None
+    last = start
+    count = 0
+    for match in pattern.finditer(text, start):
+        # An empty match at the end of the window belongs to the text after it
+        if match.end() > end or (match.start() == end and end < len(text)):
+            break
+        if first is None:
+            first = match.start()
+        else:
+            parts.append(text[last:match.start()])
+        parts.append(match.expand(replacement) if regex else replacement)
+        last = match.end()
+        count += 1
+    if first is None:
+        return None
+    return first, last, "".join(parts), count
+
+
+class SearchIndex:
+    """Sorted match positions for one query, patched on every edit"""
+
+    def __init__(self, query, regex=False, byte_mode=False):
+        self.query = query
+        self.regex = regex
+        # Mapped buffers hold UTF-8 bytes one per character, so the query must too
+        if byte_mode:
+            query = query.encode("utf-8").decode("latin-1")
+        self.pattern = compile_query(query, regex)
+        # Matches that may reach across lines or to the end need a full rescan on every edit
+        self.local = not (regex and (_END_ANCHOR.search(query) or spans_lines(self.pattern)))
+        self.starts = []
+        self.ends = []
+        self.scanning = False
+
+    def __len__(self):
+        return len(self.starts)
+
+    def build(self, buffer):
+        """Scan the whole buffer"""
+        self.starts = []
+        self.ends = []
+        for match in self.pattern.finditer(buffer.get_text()):
+            if match.end() > match.start():
+                self.starts.append(match.start())
+                self.ends.append(match.end())
+
+    def add_matches(self, starts, ends):
+        """Insert a sorted batch of matches found by a background scan"""
+        if starts:
+            i = bisect.bisect_left(self.starts, starts[0])
+            self.starts[i:i] = starts
+            self.ends[i:i] = ends
+
+    def matches(self, query, regex):
+        """Check whether this index was built for query"""
+        return self.query == query and self.regex == regex
+
+    def next_match(self, pos):
+        """Return (start, end) of the first match after pos, wrapping around"""
+        if not self.starts:
+            return None
+        i = bisect.bisect_right(self.starts, pos)
+        if i == len(self.starts):
+            i = 0
+        return self.starts[i], self.ends[i]
+
+    def prev_match(self, pos):
+        """Return (start, end) of the last match before pos, wrapping around"""
+        if not self.starts:
+            return None
+        i = bisect.bisect_left(self.starts, pos) - 1
+        return self.starts[i], self.ends[i]
+
+    def match_at(self, pos):
+        """Return the end of the match starting at pos, or None"""
+        i = bisect.bisect_left(self.starts, pos)
+        if i < len(self.starts) and self.starts[i] == pos:
+            return self.ends[i]
+        return None
+
+    def apply_edit(self, buffer, offset, removed, inserted):
+        """Shift matches after the edit and rescan only around it"""
+        if not self.local:
+            self.build(buffer)
+            return
+        delta = len(inserted) - len(removed)
+        old_end = offset + len(removed)
+        if self.regex:
+            # Regex matches may be any length, so rescan the whole edited lines
+            low = buffer.line_range(buffer.lines.position(offset)[0])[0]
+            last_line = buffer.lines.position(offset + len(inserted))[0]
+            high = buffer.line_range(last_line)[1] + 1 - delta
+        else:
+            low = offset - len(self.query)
+            high = old_end + len(self.query)
+
+        # Matches overlapping [low, high) in the old text are dropped and rescanned
+        first = bisect.bisect_right(self.ends, max(low, 0))
+        last = bisect.bisect_left(self.starts, high)
+        if first < last:
+            low = min(low, self.starts[first])
+            high = max(high, self.ends[last - 1])
+        low = max(low, 0)
+        high = min(high + delta, len(buffer))
+
+        # One character of context on each side keeps ^ and \b honest
+        context = max(low - 1, 0)
+        window = buffer.get_slice(context, high + 1)
+        found_starts = []
+        found_ends = []
+        for match in self.pattern.finditer(window, low - context):
+            if match.start() >= high - context:
+                break
+            if match.end() > match.start() and match.end() <= high - context:
+                found_starts.append(context + match.start())
+                found_ends.append(context + match.end())
+
+        tail_starts = self.starts[last:]
+        tail_ends = self.ends[last:]
+        if delta:
+            tail_starts = [start + delta for start in tail_starts]
+            tail_ends = [end + delta for end in tail_ends]
+        self.starts[first:] = found_starts + tail_starts
+        self.ends[first:] = found_ends + tail_ends
+
+
+class SearchWorker(threading.Thread):
+    """Scans a buffer snapshot in chunks, posting each batch of matches to the main loop"""
+
+    def __init__(self, pattern, snapshot, start, dispatcher, on_batch, on_done):
+        super().__init__(daemon=True)
+        self.pattern = pattern
+        self.snapshot = snapshot
+        self.start_pos = start
+        self.dispatcher = dispatcher
+        self.on_batch = on_batch
+        self.on_done = on_done
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        """Stop scanning at the next chunk boundary; nothing more is posted"""
+        self._cancelled.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    def run(self):
+        """Scan from the start position to the end, then wrap around to it"""
+        length = len(self.snapshot)
+        for low, high in ((self.start_pos, length), (0, self.start_pos)):
+            if not self._scan(low, high):
+                return
+        self.dispatcher.post(self.on_done, self)
+
+    def _scan(self, low, high):
+        """Post the matches starting in [low, high), return False if cancelled"""
+        length = len(self.snapshot)
+        pos = low
+        last_end = low
+        while pos < high:
+            if self.cancelled:
+                return False
+            end = min(pos + SEARCH_CHUNK_SIZE, high)
+            # Read past the chunk so matches crossing its end are seen whole
+            context = max(pos - 1, 0)
+            window = self.snapshot.get_slice(context, min(end + SEARCH_OVERLAP, length))
+            starts = []
+            ends = []
+            for match in self.pattern.finditer(window, max(pos, last_end) - context):
+                if context + match.start() >= end:
+                    break
+                if match.end() > match.start():
+                    starts.append(context + match.start())
+                    ends.append(context + match.end())
+            if starts:
+                last_end = ends[-1]
+                self.dispatcher.post(self.on_batch, self, starts, ends)
+            pos = end
+        return True
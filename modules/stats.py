@@ -0,0 +1,62 @@
+import re
+
+_WORD = re.compile(r'\S+')
+_SPACE = re.compile(r'\s')
+_LAST_SPACE = re.compile(r'\s\S*\Z')
+_SCAN_CHUNK = 256
+
+
+class DocumentStats:
+    """Line, word and character counts kept up to date from each edit"""
+
+    def __init__(self, buffer):
+        self.buffer = buffer
+        self.reset()
+
+    def reset(self):
+        """Count words in the whole buffer, or leave them uncounted (None) for a mapped file"""
+        if self.buffer.mapped:
+            self.words = None
+        else:
+            self.words = len(_WORD.findall(self.buffer.get_text()))
+
+    @property
+    def chars(self):
+        """Number of characters"""
+        return len(self.buffer)
+
+    @property
+    def lines(self):
+        """Number of lines, zero for an empty document"""
+        return self.buffer.line_count if len(self.buffer) else 0
+
+    def apply_edit(self, offset, removed, inserted):
+        """Adjust the word count after removed was replaced by inserted at offset"""
+        if self.words is None:
+            return
+        end = offset + len(inserted)
+        before = self.buffer.get_slice(self._word_start(offset), offset)
+        after = self.buffer.get_slice(end, self._word_end(end))
+        self.words += (len(_WORD.findall(before + inserted + after)) -
+                       len(_WORD.findall(before + removed + after)))
+
+    def _word_start(self, pos):
+        """Offset just after the last whitespace before pos"""
+        while pos > 0:
+            start = max(pos - _SCAN_CHUNK, 0)
+            match = _LAST_SPACE.search(self.buffer.get_slice(start, pos))
+            if match:
+                return start + match.start() + 1
+            pos = start
+        return 0
+
+    def _word_end(self, pos):
+        """Offset of the first whitespace at or after pos"""
+        length = len(self.buffer)
+        while pos < length:
+            end = min(pos + _SCAN_CHUNK, length)
+            match = _SPACE.search(self.buffer.get_slice(pos, end))
+            if match:
+                return pos + match.start()
+            pos = end
+        return length
@@ -1,9 +1,16 @@
-import mimetypes
-import hashlib
+import codecs
+import json
 import time
 import os
 import re
 
+from modules.ProjectConstraint import ENCODING_SNIFF_SIZE, INFO_CHUNK_SIZE, PARTIAL_SAVE_MIN_SIZE, PARTIAL_SAVE_TAIL
+
+# Linux ioctl that makes a file share the blocks of another (Btrfs, XFS)
+_FICLONE = 0x40049409
+# First word of a .parvum_undo file, followed by the size the file had
+_UNDO_MAGIC = b"parvum-undo-1"
+
 
 def is_safe_path(path):
     """Check path safety"""
@@ -26,57 +33,350 @@ def is_safe_path(path):
         return False
 
 
-def print_file_info(filepath):
-    print(f"\n--- File information: {filepath} ---")
-    abs_path = os.path.abspath(filepath)
-    print(f"\033[1;1m\033[1;3mAbsolute path\033[0m: {abs_path}")
-    print(f"\033[1;1m\033[1;3mIs file\033[0m: {os.path.isfile(filepath)}")
-    print(f"\033[1;1m\033[1;3mIs directory\033[0m: {os.path.isdir(filepath)}")
-    if not os.path.isfile(filepath):
-        return
+def write_file_atomic(filename, chunks, binary=False):
+    """Write chunks to a temp file, back up the old file, then swap the temp file in"""
+    write_temp(filename, chunks, binary)
+    commit_temp(filename)
 
-    size = os.path.getsize(filepath)
-    print(f"\033[1;1m\033[1;3mFile size\033[0m: {size} bytes")
-    stat = os.stat(filepath)
-    print("\033[1;1m\033[1;3mCreation time\033[0m:", time.ctime(stat.st_ctime))
-    print("\033[1;1m\033[1;3mLast modified\033[0m:", time.ctime(stat.st_mtime))
-    print("\033[1;1m\033[1;3mLast accessed\033[0m: ", time.ctime(stat.st_atime))
-    print(f"\033[1;1m\033[1;3mPermissions\033[0m: {oct(stat.st_mode)[-3:]}")
 
-    mime_type, encoding = mimetypes.guess_type(filepath)
-    print(f"\033[1;1m\033[1;3mMIME type\033[0m: {mime_type}")
-    print(f"\033[1;1m\033[1;3mMIME encoding\033[0m: {encoding}")
+def write_temp(filename, chunks, binary=False):
+    """Write chunks to the temp file next to filename and return its name"""
+    temp_name = filename + ".parvum_tmp"
+    if binary:
+        f = open(temp_name, "wb")
+    else:
+        f = open(temp_name, "w", encoding="utf-8", errors="replace")
+    with f:
+        for chunk in chunks:
+            f.write(chunk)
+    return temp_name
+
+
+def commit_temp(filename):
+    """Back up filename and replace it with its temp file"""
+    if os.path.exists(filename):
+        backup_file(filename)
+
+    os.replace(filename + ".parvum_tmp", filename)
 
+
+def backup_file(filename, link=True):
+    """Keep filename as filename.parvum_bak: hard-linked, reflinked or, failing both, copied.
+
+    A hard link shares the file itself, so it is only right when filename is
+    about to be replaced rather than written in place.
+    """
+    backup_name = filename + ".parvum_bak"
+    _remove(backup_name)
+    # An undo file from an earlier partial save no longer matches what is on disk
+    _remove(filename + ".parvum_undo")
+    if link:
+        try:
+            os.link(filename, backup_name)
+            return
+        except OSError:
+            pass
+    if not _reflink(filename, backup_name):
+        import shutil
+        shutil.copy2(filename, backup_name)
+
+
+def _reflink(source, target):
+    """Clone source to target sharing its blocks copy-on-write; False where the filesystem cannot"""
     try:
-        import chardet
-        with open(filepath, "rb") as f:
-            raw = f.read(100000)
-            detected = chardet.detect(raw)
-        print(f"Detected encoding (chardet): {detected['encoding']} (confidence: {detected['confidence']:.2f})")
+        import fcntl
     except ImportError:
-        print("Please install the `chardet` package for automatic encoding detection.")
+        return False
+    with open(source, "rb") as src, open(target, "wb") as dst:
+        try:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        except OSError:
+            return False
+    import shutil
+    shutil.copystat(source, target)
+    return True
 
-    # Content statistics (for text files)
+
+def _remove(path):
+    """Delete path if it exists"""
     try:
-        with open(filepath, "r", encoding="utf-8", errors="replace") as f:
-            content = f.read()
-        lines = content.count('\n') + 1 if content else 0
-        words = len(content.split()) if content else 0
-        chars = len(content)
-        print(f"\033[1;1m\033[1;3mLines\033[0m: {lines}")
-        print(f"\033[1;1m\033[1;3mWords\033[0m: {words}")
-        print(f"\033[1;1m\033[1;3mCharacters\033[0m: {chars}")
-    except Exception as e:
-        print(f"Error reading file content: {e}")
-
-    # MD5 hash
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def backup_ranges(filename, f, parts, size):
+    """Keep the old size of f and the bytes that parts and a cut to size replace in filename.parvum_undo.
+
+    That is all restore_save needs to put the file back, so an in-place save
+    copies no more than it writes. The undo file is synced before f is touched.
+    """
+    _remove(filename + ".parvum_bak")
+    old_size = os.fstat(f.fileno()).st_size
+    spans = [(offset, len(data)) for offset, data in parts]
+    if size < old_size:
+        spans.append((size, old_size - size))
+    with open(filename + ".parvum_undo", "wb") as undo:
+        undo.write(b"%s %d\n" % (_UNDO_MAGIC, old_size))
+        for offset, length in spans:
+            f.seek(offset)
+            old = f.read(length)
+            undo.write(b"%d %d\n" % (offset, len(old)))
+            undo.write(old)
+        undo.write(b"end\n")
+        undo.flush()
+        os.fsync(undo.fileno())
+
+
+def restore_save(filename):
+    """Undo the last partial save of filename from filename.parvum_undo; False if there is none to undo"""
+    undo_name = filename + ".parvum_undo"
+    try:
+        undo = open(undo_name, "rb")
+    except FileNotFoundError:
+        return False
+    with undo:
+        magic, _, size = undo.readline().rstrip(b"\n").rpartition(b" ")
+        if magic != _UNDO_MAGIC:
+            raise ValueError(f"{undo_name} is not an undo file")
+        parts = []
+        for line in undo:
+            if line == b"end\n":
+                break
+            offset, length = map(int, line.split())
+            data = undo.read(length)
+            if len(data) != length:
+                break
+            parts.append((offset, data))
+        else:
+            # Cut short by a crash before the file itself was written
+            raise ValueError(f"{undo_name} is incomplete, {filename} was not changed by that save")
+    with open(filename, "r+b") as f:
+        for offset, data in parts:
+            f.seek(offset)
+            f.write(data)
+        f.truncate(int(size))
+    os.unlink(undo_name)
+    return True
+
+
+def write_buffer(filename, buffer):
+    """Save a buffer or snapshot, as raw bytes when it is memory-mapped"""
+    if buffer.mapped:
+        write_file_atomic(filename, buffer.iter_bytes(), binary=True)
+    else:
+        write_file_atomic(filename, buffer.iter_chunks())
+
+
+def save_changes(filename, buffer, saved_size):
+    """Write only the changed ranges of buffer into filename; False if it should be rewritten whole.
+
+    filename must still be the saved_size bytes the buffer was read from or saved
+    as, one byte per character. Changes that keep their length are written in
+    place; otherwise the file is rewritten from the first change on, if that is
+    within the last PARTIAL_SAVE_TAIL of it. The old file is kept as a reflink
+    where the filesystem can share blocks, else only the overwritten bytes are
+    kept for restore_save.
+    """
+    changes = buffer.changes
+    length = len(buffer)
+    if saved_size < PARTIAL_SAVE_MIN_SIZE or changes.saved_length(length) != saved_size:
+        return False
+    ranges = changes.ranges()
+    if not ranges:
+        return True
+    encoding = "latin-1" if buffer.mapped else "utf-8"
+    if all(delta == 0 for _, _, delta in ranges):
+        parts = []
+        for start, end, _ in ranges:
+            data = buffer.get_slice(start, end).encode(encoding, errors="replace")
+            if len(data) != end - start:
+                return False
+            parts.append((start, data))
+        size = saved_size
+    else:
+        start = ranges[0][0]
+        if length - start > length * PARTIAL_SAVE_TAIL:
+            return False
+        # A mapped buffer reads its unchanged text from this very file: only append after it
+        if buffer.mapped and (len(ranges) > 1 or ranges[0][1] < length or length < saved_size):
+            return False
+        data = buffer.get_slice(start, length).encode(encoding, errors="replace")
+        parts = [(start, data)]
+        size = start + len(data)
+
+    backup_name = filename + ".parvum_bak"
+    _remove(backup_name)
+    _remove(filename + ".parvum_undo")
+    reflinked = _reflink(filename, backup_name)
+    with open(filename, "r+b") as f:
+        if not reflinked:
+            _remove(backup_name)
+            backup_ranges(filename, f, parts, size)
+        for offset, data in parts:
+            f.seek(offset)
+            f.write(data)
+        f.truncate(size)
+    return True
+
+
+def read_appended(filename, offset, known_tail):
+    """Return (text, end offset) of what was appended to a file after offset, None if it was not an append.
+
+    The bytes just before offset must still be known_tail. New bytes that end
+    in the middle of a character are only read up to their last full line.
+    """
+    start = offset - len(known_tail)
+    if start < 0:
+        return None
+    with open(filename, "rb") as f:
+        f.seek(start)
+        data = f.read()
+    if not data.startswith(known_tail):
+        return None
+    data = data[len(known_tail):]
+    # Carriage returns are translated when a file is read as text, so let a full reload handle them
+    if b"\r" in data:
+        return None
+    try:
+        text = data.decode("utf-8")
+    except UnicodeDecodeError:
+        data = data[:data.rfind(b"\n") + 1]
+        try:
+            text = data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+    return text, offset + len(data)
+
+
+def file_info(filepath):
+    """Collect size, times, type, encoding, counts and MD5 of a file in one read"""
+    import hashlib
+    import mimetypes
+
+    info = {"path": filepath,
+            "absolute_path": os.path.abspath(filepath),
+            "is_file": os.path.isfile(filepath),
+            "is_dir": os.path.isdir(filepath)}
+    if not info["is_file"]:
+        return info
+
+    stat = os.stat(filepath)
+    mime_type, mime_encoding = mimetypes.guess_type(filepath)
+    info.update(size=stat.st_size, created=stat.st_ctime, modified=stat.st_mtime, accessed=stat.st_atime,
+                permissions=oct(stat.st_mode)[-3:], mime_type=mime_type, mime_encoding=mime_encoding)
+
+    md5 = hashlib.md5()
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    head = b""
+    lines = words = chars = 0
+    in_word = False
+    ascii_only = valid_utf8 = True
     try:
         with open(filepath, "rb") as f:
-            h = hashlib.md5()
-            for chunk in iter(lambda: f.read(4096), b""):
-                h.update(chunk)
-        print(f"\033[1;1m\033[1;3mMD5 hash\033[0m: {h.hexdigest()}")
-    except Exception as e:
-        print(f"Error computing MD5: {e}")
+            while True:
+                block = f.read(INFO_CHUNK_SIZE)
+                final = not block
+                text = decoder.decode(block, final)
+                if text:
+                    chars += len(text)
+                    lines += text.count("\n")
+                    words += len(text.split())
+                    # A word cut by the block boundary was counted twice
+                    if in_word and not text[0].isspace():
+                        words -= 1
+                    in_word = not text[-1].isspace()
+                    valid_utf8 = valid_utf8 and "\ufffd" not in text
+                if final:
+                    break
+                md5.update(block)
+                ascii_only = ascii_only and block.isascii()
+                if len(head) < ENCODING_SNIFF_SIZE:
+                    head += block[:ENCODING_SNIFF_SIZE - len(head)]
+    except OSError as e:
+        info["error"] = str(e)
+        return info
+
+    info.update(lines=lines + 1 if chars else 0, words=words, chars=chars, md5=md5.hexdigest())
+    info.update(_sniff_encoding(head, ascii_only, valid_utf8))
+    return info
+
+
+def _sniff_encoding(head, ascii_only, valid_utf8):
+    """Name the encoding, asking chardet only when the file is not ASCII or UTF-8"""
+    if ascii_only:
+        return {"encoding": "ascii", "confidence": 1.0}
+    if valid_utf8:
+        return {"encoding": "utf-8", "confidence": 1.0}
+    try:
+        import chardet
+    except ImportError:
+        return {"encoding": None, "confidence": None}
+    detected = chardet.detect(head)
+    return {"encoding": detected["encoding"], "confidence": detected["confidence"]}
+
+
+def expand_paths(patterns):
+    """Expand globs (the Windows shell does not), keeping plain paths as given"""
+    import glob
+
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else []
+        paths.extend(matches or [pattern])
+    return paths
+
+
+def report_file_info(patterns, as_json=False):
+    """Print info for every file matched by patterns, spreading the work over processes"""
+    paths = expand_paths(patterns)
+    if len(paths) > 1:
+        from concurrent.futures import ProcessPoolExecutor
+        pool = ProcessPoolExecutor()
+        infos = pool.map(file_info, paths, chunksize=max(1, min(64, len(paths) // (4 * (os.cpu_count() or 1)))))
+    else:
+        pool = None
+        infos = map(file_info, paths)
+    try:
+        for info in infos:
+            if as_json:
+                print(json.dumps(info, ensure_ascii=False))
+            else:
+                print_file_info(info)
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+
+def print_file_info(info):
+    """Print file info in a readable form"""
+    filepath = info["path"]
+    print(f"\n--- File information: {filepath} ---")
+    print(f"\033[1;1m\033[1;3mAbsolute path\033[0m: {info['absolute_path']}")
+    print(f"\033[1;1m\033[1;3mIs file\033[0m: {info['is_file']}")
+    print(f"\033[1;1m\033[1;3mIs directory\033[0m: {info['is_dir']}")
+    if not info["is_file"]:
+        return
+
+    print(f"\033[1;1m\033[1;3mFile size\033[0m: {info['size']} bytes")
+    print("\033[1;1m\033[1;3mCreation time\033[0m:", time.ctime(info["created"]))
+    print("\033[1;1m\033[1;3mLast modified\033[0m:", time.ctime(info["modified"]))
+    print("\033[1;1m\033[1;3mLast accessed\033[0m: ", time.ctime(info["accessed"]))
+    print(f"\033[1;1m\033[1;3mPermissions\033[0m: {info['permissions']}")
+    print(f"\033[1;1m\033[1;3mMIME type\033[0m: {info['mime_type']}")
+    print(f"\033[1;1m\033[1;3mMIME encoding\033[0m: {info['mime_encoding']}")
+    if "error" in info:
+        print(f"Error reading file content: {info['error']}")
+        print("\n")
+        return
+
+    if info["encoding"] is None:
+        print("Please install the `chardet` package for automatic encoding detection.")
+    else:
+        print(f"Detected encoding: {info['encoding']} (confidence: {info['confidence']:.2f})")
+    print(f"\033[1;1m\033[1;3mLines\033[0m: {info['lines']}")
+    print(f"\033[1;1m\033[1;3mWords\033[0m: {info['words']}")
+    print(f"\033[1;1m\033[1;3mCharacters\033[0m: {info['chars']}")
+    print(f"\033[1;1m\033[1;3mMD5 hash\033[0m: {info['md5']}")
 
     print("\n")
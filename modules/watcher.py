@@ -0,0 +1,114 @@
+import ctypes
+import ctypes.util
+import os
+import struct
+import sys
+
+from modules.ProjectConstraint import WATCH_DELAY, WATCH_POLL_INTERVAL
+
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_Q_OVERFLOW = 0x4000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_EVENT = struct.Struct("iIII")
+# Saves usually write a temporary file and rename it, so the directory is watched, not the inode
+_DIRECTORY_EVENTS = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE
+
+
+def _inotify():
+    """Return libc with inotify and a non-blocking inotify descriptor, or (None, None)"""
+    if not sys.platform.startswith("linux"):
+        return None, None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+    except (OSError, AttributeError):
+        return None, None
+    if fd < 0:
+        return None, None
+    return libc, fd
+
+
+class FileWatcher:
+    """Calls on_change(path) when the watched file may have changed: inotify on Linux, else polling.
+
+    Only one file is watched at a time. Events are debounced by WATCH_DELAY;
+    on_change should compare the file with what it last read, since a call
+    does not guarantee the contents differ.
+    """
+
+    def __init__(self, loop, on_change):
+        self.loop = loop
+        self.on_change = on_change
+        self.path = None
+        self._alarm = None
+        self._wd = -1
+        self._libc, self._fd = _inotify()
+        if self._fd is not None:
+            loop.watch_file(self._fd, self._read_events)
+
+    @property
+    def polling(self):
+        """Whether changes are found by polling rather than inotify"""
+        return self._wd < 0
+
+    def watch(self, path):
+        """Watch path instead of the previous file"""
+        self.path = os.path.abspath(path)
+        if self._fd is not None:
+            if self._wd >= 0:
+                self._libc.inotify_rm_watch(self._fd, self._wd)
+            directory = os.fsencode(os.path.dirname(self.path))
+            self._wd = self._libc.inotify_add_watch(self._fd, directory, _DIRECTORY_EVENTS)
+        # Without inotify, or if the directory cannot be watched, fall back to polling
+        if self.polling and self._alarm is None:
+            self._alarm = self.loop.set_alarm_in(WATCH_POLL_INTERVAL, self._poll)
+
+    def close(self):
+        """Stop watching"""
+        if self._alarm is not None:
+            self.loop.remove_alarm(self._alarm)
+            self._alarm = None
+        if self._fd is not None:
+            self.loop.remove_watch_file(self._fd)
+            os.close(self._fd)
+            self._fd = None
+        self.path = None
+
+    def _poll(self, loop=None, user_data=None):
+        """Check the file and re-arm the poll"""
+        self._alarm = None
+        if self.path is None or not self.polling:
+            return
+        self._alarm = self.loop.set_alarm_in(WATCH_POLL_INTERVAL, self._poll)
+        self.on_change(self.path)
+
+    def _read_events(self):
+        """Drain the inotify events and schedule a check if one names the watched file"""
+        name = os.fsencode(os.path.basename(self.path)) if self.path else None
+        hit = False
+        while True:
+            try:
+                data = os.read(self._fd, 65536)
+            except BlockingIOError:
+                break
+            pos = 0
+            while pos + _EVENT.size <= len(data):
+                wd, mask, _, length = _EVENT.unpack_from(data, pos)
+                event_name = data[pos + _EVENT.size:pos + _EVENT.size + length].rstrip(b"\0")
+                pos += _EVENT.size + length
+                if mask & _IN_Q_OVERFLOW or (wd == self._wd and event_name == name):
+                    hit = True
+        if hit and self._alarm is None and self.path is not None:
+            self._alarm = self.loop.set_alarm_in(WATCH_DELAY, self._fire)
+
+    def _fire(self, loop=None, user_data=None):
+        """Report the debounced change"""
+        self._alarm = None
+        if self.path is not None:
+            self.on_change(self.path)
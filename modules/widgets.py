@@ -0,0 +1,386 @@
+import bisect
+from collections import OrderedDict
+
+import urwid
+from urwid import is_wide_char, move_next_char, move_prev_char, text_layout
+from urwid.canvas import apply_text_layout
+from urwid.command_map import Command
+
+from modules.ProjectConstraint import LAYOUT_CACHE_SIZE
+from modules.mapped import decode_line
+
+
+def is_text_key(key):
+    """Check whether a key types text, Enter included"""
+    if not isinstance(key, str):
+        return False
+    return key == 'enter' or is_wide_char(key, 0) or (len(key) == 1 and ord(key) >= 32)
+
+
+class TextLines(urwid.ListWalker):
+    """Read-only (attr, text) lines for a ListBox, building widgets only for the rows shown"""
+
+    def __init__(self, lines):
+        self.lines = lines
+        self.focus = 0
+
+    def set_lines(self, lines):
+        """Replace the lines and scroll back to the top"""
+        self.lines = lines
+        self.focus = 0
+        self._modified()
+
+    def _widget(self, pos):
+        attr, text = self.lines[pos]
+        return urwid.AttrMap(urwid.Text(text, wrap='clip'), attr)
+
+    def get_focus(self):
+        if not self.lines:
+            return None, None
+        return self._widget(self.focus), self.focus
+
+    def set_focus(self, position):
+        self.focus = position
+        self._modified()
+
+    def get_next(self, position):
+        if position + 1 >= len(self.lines):
+            return None, None
+        return self._widget(position + 1), position + 1
+
+    def get_prev(self, position):
+        if position <= 0:
+            return None, None
+        return self._widget(position - 1), position - 1
+
+
+class EditorView(urwid.Widget):
+    """Edit area that lays out and draws only the lines on screen"""
+
+    _sizing = frozenset([urwid.Sizing.BOX])
+    _selectable = True
+    signals = ["edit"]
+
+    def __init__(self, buffer, wrap='space'):
+        super().__init__()
+        self.buffer = buffer
+        self.wrap = wrap
+        self.edit_pos = 0
+        self.top_line = 0
+        self.top_row = 0
+        self.pref_col = None
+        self.read_only = False
+        self.highlighter = None
+        self.visible_lines = []
+        self._layouts = OrderedDict()
+
+    def set_edit_pos(self, pos):
+        """Move the cursor to an offset within the indexed lines"""
+        self.edit_pos = max(0, min(pos, self.buffer.lines.length))
+        self.pref_col = None
+        self._invalidate()
+
+    def replace_range(self, offset, length, text):
+        """Emit the 'edit' signal for replacing length characters at offset with text"""
+        removed = self.buffer.get_slice(offset, offset + length)
+        line = self.buffer.lines.position(offset)[0]
+        self._emit("edit", offset, removed, text)
+        if self.highlighter is not None:
+            self.highlighter.apply_edit(line, removed.count("\n"), text.count("\n"))
+        self.edit_pos = min(self.edit_pos, len(self.buffer))
+        self.pref_col = None
+        self._invalidate()
+
+    def insert_text(self, text):
+        """Insert text at the cursor position"""
+        pos = self.edit_pos
+        self.replace_range(pos, 0, text)
+        self.set_edit_pos(pos + len(text))
+
+    def _layout(self, text, maxcol):
+        """Return the cached wrapped layout of one line"""
+        key = (text, maxcol)
+        layout = self._layouts.get(key)
+        if layout is None:
+            layout = text_layout.default_layout.layout(text, maxcol, 'left', self.wrap) or [[]]
+            self._layouts[key] = layout
+            if len(self._layouts) > LAYOUT_CACHE_SIZE:
+                self._layouts.popitem(last=False)
+        else:
+            self._layouts.move_to_end(key)
+        return layout
+
+    def _display_line(self, line):
+        """Return a line as drawn and the byte columns of its characters (None when they are the offsets)"""
+        text = self.buffer.get_line(line)
+        if self.buffer.mapped:
+            return decode_line(text)
+        return text, None
+
+    def _cursor_row(self, maxcol):
+        """Return the cursor line, its text, columns and layout, and the cursor (x, row) in that line"""
+        line, col = self.buffer.lines.position(self.edit_pos)
+        text, starts = self._display_line(line)
+        layout = self._layout(text, maxcol)
+        x, row = text_layout.calc_coords(text, layout, _char_col(starts, col))
+        return line, text, starts, layout, x, row
+
+    def _scroll_to_cursor(self, maxcol, maxrow):
+        """Move the top of the view so the cursor row is on screen"""
+        line, _, _, _, _, row = self._cursor_row(maxcol)
+        if (line, row) < (self.top_line, self.top_row):
+            self.top_line, self.top_row = line, row
+            return
+
+        rows = -self.top_row
+        current = self.top_line
+        while current < line and rows < maxrow:
+            rows += len(self._layout(self._display_line(current)[0], maxcol))
+            current += 1
+        if current == line and rows + row < maxrow:
+            return
+
+        # Put the cursor on the bottom row
+        self.top_line, self.top_row = line, row
+        remaining = maxrow - 1
+        while remaining > 0:
+            if self.top_row > 0:
+                step = min(self.top_row, remaining)
+                self.top_row -= step
+                remaining -= step
+            elif self.top_line > 0:
+                self.top_line -= 1
+                self.top_row = len(self._layout(self._display_line(self.top_line)[0], maxcol)) - 1
+                remaining -= 1
+            else:
+                break
+
+    def render(self, size, focus=False):
+        """Lay out the visible lines and draw them"""
+        maxcol, maxrow = size
+        self._scroll_to_cursor(maxcol, maxrow)
+        cursor_line, cursor_col = self.buffer.lines.position(self.edit_pos)
+
+        texts = []
+        attrs = []
+        rows = []
+        numbers = []
+        cursor = None
+        base = 0
+        line = self.top_line
+        skip = self.top_row
+        line_count = self.buffer.line_count
+        while len(rows) < maxrow and line < line_count:
+            text, starts = self._display_line(line)
+            layout = self._layout(text, maxcol)
+            if line == cursor_line:
+                x, row = text_layout.calc_coords(text, layout, _char_col(starts, cursor_col))
+                cursor = (x, len(rows) + row - skip)
+            for i, layout_row in enumerate(layout[skip:skip + maxrow - len(rows)], skip):
+                rows.append(_shift_row(layout_row, base))
+                numbers.append(line + 1 if i == 0 else None)
+            texts.append(text)
+            if self.highlighter is not None:
+                attrs.extend(self.highlighter.spans(self.buffer, line))
+                attrs.append((None, 1))
+            base += len(text) + 1
+            line += 1
+            skip = 0
+        self.visible_lines = numbers
+        rows.extend([[]] * (maxrow - len(rows)))
+
+        canvas = urwid.CompositeCanvas(apply_text_layout("\n".join(texts), attrs, rows, maxcol))
+        if focus and cursor is not None and 0 <= cursor[1] < maxrow:
+            canvas.cursor = (min(cursor[0], maxcol - 1), cursor[1])
+        return canvas
+
+    def _move_rows(self, maxcol, count):
+        """Move the cursor count wrapped rows up (negative) or down, keeping the column"""
+        line, text, starts, layout, x, row = self._cursor_row(maxcol)
+        if self.pref_col is None:
+            self.pref_col = x
+        last_line = self.buffer.line_count - 1
+        row += count
+        while row < 0 and line > 0:
+            line -= 1
+            text, starts = self._display_line(line)
+            layout = self._layout(text, maxcol)
+            row += len(layout)
+        while row >= len(layout) and line < last_line:
+            row -= len(layout)
+            line += 1
+            text, starts = self._display_line(line)
+            layout = self._layout(text, maxcol)
+        row = max(0, min(row, len(layout) - 1))
+        col = _byte_col(starts, text_layout.calc_pos(text, layout, self.pref_col, row))
+        pos = self.buffer.line_range(line)[0] + col
+        if pos == self.edit_pos:
+            return False
+        self.edit_pos = pos
+        self._invalidate()
+        return True
+
+    def keypress(self, size, key):
+        """Handle editing and cursor keys, return the rest"""
+        maxcol, maxrow = size
+        pos = self.edit_pos
+        command = self._command_map[key]
+
+        if self.read_only and (is_text_key(key) or key in ('backspace', 'delete')):
+            return key
+
+        if key == 'enter':
+            self.insert_text("\n")
+        elif is_text_key(key):
+            self.insert_text(self.buffer.encode_input(key))
+        elif key == 'backspace':
+            if pos == 0:
+                return key
+            start = self._prev_char(pos)
+            self.replace_range(start, pos - start, "")
+            self.set_edit_pos(start)
+        elif key == 'delete':
+            if pos >= len(self.buffer):
+                return key
+            self.replace_range(pos, self._next_char(pos) - pos, "")
+        elif command == Command.LEFT:
+            if pos == 0:
+                return key
+            self.set_edit_pos(self._prev_char(pos))
+        elif command == Command.RIGHT:
+            if pos >= len(self.buffer):
+                return key
+            self.set_edit_pos(self._next_char(pos))
+        elif command in (Command.UP, Command.DOWN):
+            if not self._move_rows(maxcol, -1 if command == Command.UP else 1):
+                return key
+        elif command in (Command.PAGE_UP, Command.PAGE_DOWN):
+            step = max(maxrow - 1, 1)
+            if not self._move_rows(maxcol, -step if command == Command.PAGE_UP else step):
+                return key
+        elif command in (Command.MAX_LEFT, Command.MAX_RIGHT):
+            line, text, starts, layout, _, row = self._cursor_row(maxcol)
+            align = 'left' if command == Command.MAX_LEFT else 'right'
+            col = _byte_col(starts, text_layout.calc_pos(text, layout, align, row))
+            self.set_edit_pos(self.buffer.line_range(line)[0] + col)
+        else:
+            return key
+        return None
+
+    def _prev_char(self, pos):
+        """Offset of the character before pos"""
+        line, col = self.buffer.lines.position(pos)
+        if col == 0:
+            return pos - 1
+        text, starts = self._display_line(line)
+        return pos - col + _byte_col(starts, move_prev_char(text, 0, _char_col(starts, col - 1) + 1))
+
+    def _next_char(self, pos):
+        """Offset of the character after pos"""
+        line, col = self.buffer.lines.position(pos)
+        text, starts = self._display_line(line)
+        end = _byte_col(starts, len(text))
+        if col >= end:
+            return pos + 1
+        return pos - col + _byte_col(starts, move_next_char(text, _char_col(starts, col), len(text)))
+
+
+def _char_col(starts, col):
+    """Character index in a displayed line of a byte column; a column inside a character gives that character"""
+    return col if starts is None else bisect.bisect_right(starts, col) - 1
+
+
+def _byte_col(starts, index):
+    """Byte column of a character index in a displayed line"""
+    return index if starts is None else starts[index]
+
+
+def _shift_row(row, base):
+    """Shift the text offsets of one layout row by base"""
+    shifted = []
+    for segment in row:
+        if len(segment) == 3:
+            width, start, end = segment
+            shifted.append((width, start + base, end + base if isinstance(end, int) else end))
+        else:
+            width, offset = segment
+            shifted.append((width, None if offset is None else offset + base))
+    return shifted
+
+
+class LineNumberGutter(urwid.Widget):
+    """Line numbers for the rows an edit view currently shows, then a column marking changed lines"""
+
+    _sizing = frozenset([urwid.Sizing.BOX])
+
+    def __init__(self, view):
+        super().__init__()
+        self.view = view
+
+    def width(self):
+        """Columns needed for the largest line number and the change mark"""
+        return max(6, len(str(self.view.buffer.line_count))) + 1
+
+    def render(self, size, focus=False):
+        """Render one label and mark per visible row, blank for wrapped rows"""
+        maxcol, maxrow = size
+        width = maxcol - 1
+        rows = []
+        for number in self.view.visible_lines[:maxrow]:
+            label = str(number).rjust(width) if number else " " * width
+            rows.append((label + (self._mark(number - 1) if number else " ")).encode())
+        rows.extend([b" " * maxcol] * (maxrow - len(rows)))
+        attr = [[('line_numbers', width), ('line_changed', 1)]] * maxrow
+        return urwid.TextCanvas(rows, attr=attr, maxcol=maxcol)
+
+    def _mark(self, line):
+        """'~' for a line changed since the last save, '_' where lines were deleted, else a blank"""
+        buffer = self.view.buffer
+        if not len(buffer.changes):
+            return " "
+        start = buffer.lines.line_start(line)
+        end = start + buffer.lines.line_length(line)
+        if line == buffer.line_count - 1:
+            # Take in a deletion at the very end
+            end += 1
+        return buffer.changes.line_mark(start, end) or " "
+
+
+class EditorPane(urwid.Widget):
+    """Edit view with an optional line number gutter on its left"""
+
+    _sizing = frozenset([urwid.Sizing.BOX])
+    _selectable = True
+
+    def __init__(self, view, show_line_numbers=True):
+        super().__init__()
+        self.view = view
+        self.gutter = LineNumberGutter(view)
+        self.show_line_numbers = show_line_numbers
+
+    def set_show_line_numbers(self, show):
+        """Show or hide the gutter"""
+        self.show_line_numbers = show
+        self._invalidate()
+
+    def view_size(self, size):
+        """Size left for the edit view"""
+        maxcol, maxrow = size
+        if not self.show_line_numbers:
+            return size
+        return maxcol - self.gutter.width() - 1, maxrow
+
+    def render(self, size, focus=False):
+        """Render the view first so the gutter can follow its scroll offset"""
+        view_size = self.view_size(size)
+        canvas = self.view.render(view_size, focus)
+        if not self.show_line_numbers:
+            return canvas
+        gutter_width = size[0] - view_size[0]
+        gutter = self.gutter.render((gutter_width - 1, size[1]))
+        return urwid.CanvasJoin([(gutter, None, False, gutter_width),
+                                 (canvas, None, focus, view_size[0])])
+
+    def keypress(self, size, key):
+        """Pass keys to the edit view"""
+        return self.view.keypress(self.view_size(size), key)
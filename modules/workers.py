@@ -0,0 +1,39 @@
+import queue
+import socket
+
+
+class Dispatcher:
+    """Runs callbacks posted by worker threads inside the urwid main loop"""
+
+    def __init__(self, loop):
+        self._queue = queue.SimpleQueue()
+        # A socket pair rather than a pipe so select() can watch it on Windows too
+        self._reader, self._writer = socket.socketpair()
+        self._reader.setblocking(False)
+        self._writer.setblocking(False)
+        loop.watch_file(self._reader.fileno(), self._wake)
+
+    def post(self, callback, *args):
+        """Queue callback(*args) to run on the main loop thread"""
+        self._queue.put((callback, args))
+        try:
+            self._writer.send(b".")
+        except OSError:
+            pass
+
+    def run_pending(self):
+        """Run every queued callback"""
+        while True:
+            try:
+                callback, args = self._queue.get_nowait()
+            except queue.Empty:
+                return
+            callback(*args)
+
+    def _wake(self):
+        """Drain the wake-up bytes and run the queue"""
+        try:
+            self._reader.recv(65536)
+        except OSError:
+            pass
+        self.run_pending()
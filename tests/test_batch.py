@@ -0,0 +1,76 @@
+import io
+import random
+
+import pytest
+
+from modules import batch
+from modules.batch import edit_file, line_blocks, parse_script
+
+
+def test_parse_script():
+    commands = parse_script("# comment\ns/a\\/b/c/\ns|x+|y|r\n\n")
+    assert [(pattern.pattern, replacement, regex) for pattern, replacement, regex in commands] == [
+        ("a/b", "c", False), ("x+", "y", True)]
+    with pytest.raises(ValueError, match="Line 1"):
+        parse_script("s/a/b/q")
+    with pytest.raises(ValueError, match="Line 2"):
+        parse_script("s/a/b/\nd/a/")
+
+
+@pytest.mark.parametrize("script", [
+    "s/^/# /r",
+    "s/(?m)^/# /r",
+    "s/(?m)$/;/r",
+    "s/\\bab/X/r",
+    "s/b+/<\\g<0>>/r\ns/a/A/",
+    "s/ab\\n/-/r",
+])
+def test_blocks_match_whole_text(script, tmp_path, monkeypatch):
+    # Tiny blocks so every file is edited in many of them
+    monkeypatch.setattr(batch, "MAX_FILE_SIZE", 8)
+    monkeypatch.setattr(batch, "BATCH_CHUNK_SIZE", 4)
+    commands = parse_script(script)
+    rng = random.Random(script)
+    path = tmp_path / "file.txt"
+    for _ in range(30):
+        lines = ["".join(rng.choice("ab ") for _ in range(rng.randint(0, 3))) for _ in range(rng.randint(0, 12))]
+        text = "\n".join(lines) + rng.choice(["", "\n"])
+        expected = text
+        total = 0
+        for pattern, replacement, regex in commands:
+            expected, count = pattern.subn(replacement if regex else replacement.replace("\\", "\\\\"), expected)
+            total += count
+        path.write_text(text, encoding="utf-8")
+        assert edit_file(str(path), commands) == (str(path), total, None)
+        assert path.read_text(encoding="utf-8") == expected
+
+
+def test_unchanged_file_is_left_alone(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("nothing here\n", encoding="utf-8")
+    assert edit_file(str(path), parse_script("s/absent/x/")) == (str(path), 0, None)
+    assert list(tmp_path.iterdir()) == [path]
+
+
+def test_line_endings_are_kept(tmp_path, monkeypatch):
+    # Blocks split the file, each line still fits in one
+    monkeypatch.setattr(batch, "MAX_FILE_SIZE", 8)
+    monkeypatch.setattr(batch, "BATCH_CHUNK_SIZE", 8)
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"foo\r\nbar\r\nfoo\rfoo\n")
+    assert edit_file(str(path), parse_script("s/foo/baz/")) == (str(path), 3, None)
+    assert path.read_bytes() == b"baz\r\nbar\r\nbaz\rbaz\n"
+
+
+def test_bytes_that_are_not_utf8_are_kept(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_bytes(b"caf\xe9 foo\r\nbar \xc3\xa9\r\n")
+    assert edit_file(str(path), parse_script("s/foo/baz/")) == (str(path), 1, None)
+    assert path.read_bytes() == b"caf\xe9 baz\r\nbar \xc3\xa9\r\n"
+
+
+def test_line_blocks_end_at_line_ends():
+    text = "ab\ncd\nlong line\n\nx"
+    blocks = list(line_blocks(io.StringIO(text), 4))
+    assert "".join(blocks) == text
+    assert blocks == ["ab\n", "cd\n", "long l", "ine\n", "\n", "x"]
@@ -0,0 +1,70 @@
+import random
+
+import pytest
+
+from modules import buffer as buffer_module
+from modules.buffer import PieceTable
+
+
+def random_text(rng, alphabet="ab\n", limit=8):
+    return "".join(rng.choice(alphabet) for _ in range(rng.randint(0, limit)))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_random_edits_match_string(seed):
+    rng = random.Random(seed)
+    model = random_text(rng, limit=40)
+    buf = PieceTable(model)
+    for _ in range(200):
+        offset = rng.randint(0, len(model))
+        length = rng.randint(0, min(6, len(model) - offset))
+        text = random_text(rng)
+        removed = buf.replace(offset, length, text)
+        assert removed == model[offset:offset + length]
+        model = model[:offset] + text + model[offset + length:]
+        assert len(buf) == len(model)
+        start = rng.randint(0, len(model))
+        end = rng.randint(start, len(model))
+        assert buf.get_slice(start, end) == model[start:end]
+    assert buf.get_text() == model
+    assert "".join(buf.iter_chunks()) == model
+
+
+def test_lines_follow_edits():
+    buf = PieceTable("one\ntwo\nthree")
+    buf.insert(4, "new\n")
+    buf.delete(0, 4)
+    assert buf.line_count == 3
+    assert [buf.get_line(i) for i in range(buf.line_count)] == ["new", "two", "three"]
+    assert buf.position(len(buf)) == (3, 6)
+
+
+def test_snapshot_ignores_later_edits():
+    buf = PieceTable("hello world")
+    buf.insert(5, ",")
+    snapshot = buf.snapshot()
+    buf.replace(0, 5, "goodbye")
+    buf.insert(len(buf), "!")
+    assert "".join(snapshot.iter_chunks()) == "hello, world"
+    assert snapshot.get_slice(3, 8) == "lo, w"
+    assert buf.get_text() == "goodbye, world!"
+
+
+def test_flatten_keeps_text(monkeypatch):
+    monkeypatch.setattr(buffer_module, "MAX_PIECES", 8)
+    rng = random.Random(7)
+    model = "x" * 50
+    buf = PieceTable(model)
+    for _ in range(100):
+        offset = rng.randint(0, len(model))
+        buf.insert(offset, "ab")
+        model = model[:offset] + "ab" + model[offset:]
+        assert len(buf._pieces) <= 8
+    assert buf.get_text() == model
+
+
+def test_out_of_range_edit_is_rejected():
+    buf = PieceTable("abc")
+    with pytest.raises(IndexError):
+        buf.replace(2, 5, "")
+    assert buf.get_text() == "abc"
@@ -0,0 +1,85 @@
+import random
+
+import pytest
+
+from modules import utils
+from modules.buffer import PieceTable
+from modules.changes import ChangedRanges
+from modules.utils import restore_save, save_changes
+
+
+def random_edits(rng, buf, count, low=0.0):
+    for _ in range(count):
+        offset = rng.randint(int(len(buf) * low), len(buf))
+        length = rng.randint(0, min(4, len(buf) - offset))
+        buf.replace(offset, length, "".join(rng.choice("xy\n") for _ in range(rng.randint(0, 4))))
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_ranges_cover_every_change(seed):
+    rng = random.Random(seed)
+    saved = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 40)))
+    buf = PieceTable(saved)
+    random_edits(rng, buf, rng.randint(1, 10))
+    text = buf.get_text()
+    changes = buf.changes
+    assert changes.saved_length(len(text)) == len(saved)
+    # Outside the ranges the text is the saved text, shifted by the deltas before it
+    pos = old = 0
+    for start, end, delta in changes.ranges():
+        assert pos <= start <= end
+        assert text[pos:start] == saved[old:old + start - pos]
+        old += start - pos + end - start - delta
+        pos = end
+    assert text[pos:] == saved[old:]
+    ends = [end for _, end, _ in changes.ranges()]
+    starts = [start for start, _, _ in changes.ranges()]
+    assert all(end < start for end, start in zip(ends, starts[1:]))
+
+
+def test_line_marks():
+    changes = ChangedRanges()
+    changes.apply_edit(2, 2, 0)
+    changes.apply_edit(6, 1, 1)
+    assert changes.line_mark(0, 2) is None
+    assert changes.line_mark(2, 4) == "_"
+    assert changes.line_mark(4, 7) == "~"
+    changes.clear()
+    assert len(changes) == 0
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_partial_save_and_restore(seed, tmp_path, monkeypatch):
+    monkeypatch.setattr(utils, "PARTIAL_SAVE_MIN_SIZE", 0)
+    # Keep the undo file even where the filesystem could reflink
+    monkeypatch.setattr(utils, "_reflink", lambda source, target: False)
+    rng = random.Random(seed)
+    saved = "".join(rng.choice("ab\n") for _ in range(rng.randint(1, 200)))
+    path = tmp_path / "file.txt"
+    path.write_text(saved)
+    buf = PieceTable(saved)
+    if seed % 2:
+        # Same-length edits anywhere are written in place
+        for _ in range(rng.randint(1, 5)):
+            offset = rng.randrange(len(buf))
+            buf.replace(offset, 1, rng.choice("xy"))
+    else:
+        # Other edits only within the tail of the file
+        random_edits(rng, buf, rng.randint(1, 5), low=0.9)
+    partial = save_changes(str(path), buf, len(saved))
+    assert partial or buf.changes.ranges()[0][0] < len(buf) * 0.75
+    if partial:
+        assert path.read_text() == buf.get_text()
+        restore_save(str(path))
+    assert path.read_text() == saved
+    assert not restore_save(str(path))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["file.txt"]
+
+
+def test_incomplete_undo_file_is_refused(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("abc")
+    (tmp_path / "file.txt.parvum_undo").write_bytes(b"parvum-undo-1 3\n0 1\na")
+    with pytest.raises(ValueError, match="incomplete"):
+        restore_save(str(path))
+    assert path.read_text() == "abc"
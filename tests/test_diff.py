@@ -0,0 +1,114 @@
+import random
+import re
+
+import pytest
+
+from modules.diff import diff_lines, read_lines, run_diff, split_lines, unified_diff
+
+HUNK = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+def lcs_length(a, b):
+    row = [0] * (len(b) + 1)
+    for x in a:
+        previous = 0
+        for j, y in enumerate(b):
+            previous, row[j + 1] = row[j + 1], previous + 1 if x == y else max(row[j + 1], row[j])
+    return row[-1]
+
+
+def patch(a_lines, diff):
+    """Apply unified diff lines to a_lines the way patch does"""
+    result = []
+    pos = 0
+    lines = iter(diff[2:])
+    pending = None
+    for text in lines:
+        match = HUNK.match(text)
+        if match:
+            start = int(match.group(1)) - (match.group(2) != "0")
+            result += a_lines[pos:start]
+            pos = start
+            continue
+        if text == "\\ No newline at end of file":
+            if pending is not None:
+                result[pending] = result[pending][:-1]
+            continue
+        mark, line = text[0], text[1:] + "\n"
+        pending = None
+        if mark in " -":
+            assert a_lines[pos].rstrip("\n") == line[:-1]
+            pos += 1
+        if mark in " +":
+            result.append(line)
+            pending = len(result) - 1
+    return result + a_lines[pos:]
+
+
+def random_lines(rng, count):
+    return [rng.choice("abcd") + "\n" for _ in range(count)]
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_opcodes_turn_a_into_b_keeping_the_most_lines(seed):
+    rng = random.Random(seed)
+    a = random_lines(rng, rng.randint(0, 30))
+    b = random_lines(rng, rng.randint(0, 30))
+    opcodes = diff_lines(a, b)
+    rebuilt = []
+    i = j = 0
+    for tag, i1, i2, j1, j2 in opcodes:
+        assert (i1, j1) == (i, j)
+        if tag == "equal":
+            assert a[i1:i2] == b[j1:j2]
+        rebuilt += b[j1:j2]
+        i, j = i2, j2
+    assert (i, j) == (len(a), len(b))
+    assert rebuilt == b
+    assert sum(i2 - i1 for tag, i1, i2, _, _ in opcodes if tag == "equal") == lcs_length(a, b)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_unified_diff_patches_a_into_b(seed):
+    rng = random.Random(seed)
+    a = random_lines(rng, rng.randint(0, 40))
+    b = list(a)
+    for _ in range(rng.randint(0, 6)):
+        pos = rng.randint(0, len(b))
+        b[pos:pos + rng.randint(0, 3)] = random_lines(rng, rng.randint(0, 3))
+    if rng.random() < 0.3 and b:
+        b[-1] = b[-1][:-1]
+    diff = [text for _, text in unified_diff(a, b, "a", "b")]
+    if a == b:
+        assert diff == []
+    else:
+        assert diff[:2] == ["--- a", "+++ b"]
+        assert patch(a, diff) == b
+
+
+def test_read_lines_keeps_endings(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_bytes(b"one\r\ntwo\n\nthree")
+    with open(path, "rb") as f:
+        numbers, lines = read_lines(f, {})
+        assert len(numbers) == len(lines) == 4
+        assert lines[0:4] == ["one\r\n", "two\n", "\n", "three"]
+        assert lines[1:3] == ["two\n", "\n"]
+    # The same text with and without a final newline are different lines
+    other = tmp_path / "b.txt"
+    other.write_bytes(b"three\n")
+    ids = {}
+    with open(path, "rb") as f, open(other, "rb") as g:
+        assert read_lines(f, ids)[0][-1] != read_lines(g, ids)[0][0]
+
+
+def test_run_diff(tmp_path, capsys):
+    a = tmp_path / "a.txt"
+    b = tmp_path / "b.txt"
+    a.write_text("".join(f"line {i}\n" for i in range(20)))
+    b.write_text("".join(f"line {i}\n" for i in range(20) if i != 10) + "end")
+    assert run_diff(str(a), str(a)) == 0
+    assert capsys.readouterr().out == ""
+    assert run_diff(str(a), str(b)) == 1
+    out = capsys.readouterr().out.split("\n")[:-1]
+    assert patch(split_lines(a.read_text()), out) == split_lines(b.read_text())
@@ -0,0 +1,98 @@
+import random
+from types import SimpleNamespace
+
+import pytest
+
+from modules import history as history_module
+from modules.history import EditHistory
+
+
+def apply(text, operations):
+    for offset, length, inserted in operations:
+        text = text[:offset] + inserted + text[offset + length:]
+    return text
+
+
+def edit(history, text, offset, length, inserted):
+    history.record(offset, text[offset:offset + length], inserted)
+    return text[:offset] + inserted + text[offset + length:]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_undo_and_redo_restore_every_state(seed, monkeypatch):
+    rng = random.Random(seed)
+    clock = [0.0]
+    monkeypatch.setattr(history_module, "time", SimpleNamespace(monotonic=lambda: clock[0]))
+    history = EditHistory()
+    text = ""
+    states = [text]
+    for _ in range(40):
+        # Sometimes type on within the coalescing time, so steps merge
+        clock[0] += rng.choice([0.1, 5.0])
+        offset = rng.randint(0, len(text))
+        length = rng.randint(0, min(3, len(text) - offset))
+        inserted = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 3)))
+        if not length and not inserted:
+            continue
+        text = edit(history, text, offset, length, inserted)
+        if history.index == len(states):
+            states.append(text)
+        else:
+            states[history.index] = text
+    assert len(states) == history.index + 1
+    for state in reversed(states[:-1]):
+        text = apply(text, history.undo())
+        assert text == state
+    assert history.undo() is None
+    for state in states[1:]:
+        text = apply(text, history.redo())
+        assert text == state
+    assert history.redo() is None
+
+
+def test_typing_coalesces_and_newline_breaks_the_step():
+    history = EditHistory()
+    text = ""
+    for char in "abc":
+        text = edit(history, text, len(text), 0, char)
+    text = edit(history, text, len(text), 0, "\n")
+    text = edit(history, text, len(text), 0, "d")
+    assert len(history.steps) == 2
+    assert apply(text, history.undo()) == "abc\n"
+    assert apply("abc\n", history.undo()) == ""
+
+
+def test_group_is_one_step():
+    history = EditHistory()
+    history.begin_group()
+    text = edit(history, "one two", 0, 3, "1")
+    text = edit(history, text, 2, 3, "2")
+    history.end_group()
+    assert text == "1 2"
+    assert apply(text, history.undo()) == "one two"
+
+
+def test_new_edit_drops_redo_and_saved_state():
+    history = EditHistory()
+    text = edit(history, "", 0, 0, "a\n")
+    history.mark_saved()
+    text = apply(text, history.undo())
+    assert history.is_modified()
+    edit(history, text, 0, 0, "b\n")
+    assert history.redo() is None
+    assert history.is_modified()
+
+
+def test_budget_evicts_oldest_steps():
+    history = EditHistory(budget=10 * (history_module.HISTORY_OP_OVERHEAD + 2))
+    text = ""
+    for _ in range(50):
+        text = edit(history, text, len(text), 0, "x\n")
+    assert history.size <= history.budget
+    assert len(history.steps) < 50
+    undone = 0
+    while (operations := history.undo()) is not None:
+        text = apply(text, operations)
+        undone += 1
+    assert undone == len(history.steps)
+    assert text == "x\n" * (50 - undone)
@@ -0,0 +1,94 @@
+import json
+import random
+
+import pytest
+
+from modules.buffer import PieceTable
+from modules.journal import Journal, file_stamp
+
+
+def replay(text, ops):
+    for offset, length, inserted in ops:
+        text = text[:offset] + inserted + text[offset + length:]
+    return text
+
+
+@pytest.fixture
+def saved(tmp_path):
+    path = tmp_path / "file.txt"
+    path.write_text("one\ntwo\nthree\n")
+    return path
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_replay_gives_the_buffer_back(seed, saved):
+    rng = random.Random(seed)
+    buf = PieceTable(saved.read_text())
+    journal = Journal(str(saved))
+    for _ in range(rng.randint(1, 40)):
+        offset = rng.randint(0, len(buf))
+        removed = buf.get_slice(offset, offset + rng.randint(0, 4))
+        inserted = "".join(rng.choice("xy\n\"\\é") for _ in range(rng.randint(0, 4)))
+        buf.replace(offset, len(removed), inserted)
+        journal.record(offset, removed, inserted)
+    journal.close()
+    ops = Journal(str(saved)).recover()
+    assert replay(saved.read_text(), ops) == buf.get_text()
+
+
+def test_torn_line_is_cut_off(saved):
+    journal = Journal(str(saved))
+    journal.record(0, "one", "1")
+    journal.record(1, "", "2")
+    journal.close()
+    size = len(open(journal.path, "rb").read())
+    with open(journal.path, "ab") as f:
+        f.write(b'[4, 0, "x')
+    recovered = Journal(str(saved))
+    assert recovered.recover() == [(0, 3, "1"), (1, 0, "2")]
+    assert len(open(journal.path, "rb").read()) == size
+    # New edits go on from the last complete one
+    recovered.record(0, "", "0")
+    recovered.close()
+    assert Journal(str(saved)).recover() == [(0, 3, "1"), (1, 0, "2"), (0, 0, "0")]
+
+
+def test_journal_of_another_version_is_moved_aside(saved):
+    journal = Journal(str(saved))
+    journal.record(0, "one", "1")
+    journal.close()
+    saved.write_text("changed elsewhere\n")
+    assert Journal(str(saved)).recover() is None
+    assert not (saved.parent / "file.txt.parvum_journal").exists()
+    assert (saved.parent / "file.txt.parvum_journal.old").exists()
+
+
+def test_discard_starts_over_from_the_saved_file(saved):
+    journal = Journal(str(saved))
+    journal.record(0, "one", "1")
+    saved.write_text("1\ntwo\nthree\n")
+    journal.discard()
+    assert not (saved.parent / "file.txt.parvum_journal").exists()
+    journal.record(0, "1", "uno")
+    journal.close()
+    with open(journal.path, encoding="ascii") as f:
+        assert json.loads(f.readline()) == {"base": file_stamp(str(saved))}
+    assert Journal(str(saved)).recover() == [(0, 1, "uno")]
+
+
+def test_editor_recovers_on_open(saved):
+    pytest.importorskip("urwid")
+    from modules.editor import NanoEditor
+    journal = Journal(str(saved))
+    journal.record(4, "two", "2")
+    journal.record(0, "", "0")
+    journal.close()
+    editor = NanoEditor(str(saved))
+    editor.build_loop()
+    editor.show_document(editor.documents[0])
+    assert editor.buffer.get_text() == "0one\n2\nthree\n"
+    assert editor.modified
+    # Undo takes the whole recovery back at once
+    editor.apply_history_ops(editor.history.undo())
+    assert editor.buffer.get_text() == "one\ntwo\nthree\n"
+    editor.close_journals()
@@ -0,0 +1,120 @@
+import random
+
+import pytest
+
+from modules import line_index, mapped
+from modules.buffer import PieceTable
+from modules.line_index import CheckpointIndex, Fenwick, LineIndex
+
+
+def naive_lines(text):
+    """Line starts and lengths (newline included) of text"""
+    starts = [0] + [i + 1 for i, char in enumerate(text) if char == "\n"]
+    ends = starts[1:] + [len(text)]
+    return starts, [end - start for start, end in zip(starts, ends)]
+
+
+def naive_position(text, offset):
+    line = text.count("\n", 0, offset)
+    return line, offset - (text.rfind("\n", 0, offset) + 1)
+
+
+def check_index(index, text):
+    starts, lengths = naive_lines(text)
+    assert index.length == len(text)
+    assert index.line_count == len(starts)
+    for line, (start, length) in enumerate(zip(starts, lengths)):
+        assert index.line_start(line) == start
+        assert index.line_length(line) == length
+    for offset in range(len(text) + 1):
+        assert index.position(offset) == naive_position(text, offset)
+
+
+def test_fenwick_prefix_and_find():
+    values = [3, 0, 5, 2, 0, 7]
+    tree = Fenwick(values)
+    tree.append(4)
+    tree.add(1, 2)
+    values += [4]
+    values[1] += 2
+    for i in range(len(values) + 1):
+        assert tree.prefix(i) == sum(values[:i])
+    for target in range(sum(values)):
+        index, rest = tree.find(target)
+        assert sum(values[:index]) + rest == target
+        assert rest < values[index]
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_random_edits_match_text(seed, monkeypatch):
+    # Small blocks so edits split and merge them
+    monkeypatch.setattr(line_index, "LINE_INDEX_BLOCK", 3)
+    rng = random.Random(seed)
+    text = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 30)))
+    index = LineIndex(text)
+    check_index(index, text)
+    for _ in range(60):
+        offset = rng.randint(0, len(text))
+        removed = text[offset:offset + rng.randint(0, 8)]
+        inserted = "".join(rng.choice("xy\n\n") for _ in range(rng.randint(0, 12)))
+        index.apply_edit(offset, removed, inserted)
+        text = text[:offset] + inserted + text[offset + len(removed):]
+        check_index(index, text)
+
+
+def test_empty_text_has_one_line():
+    index = LineIndex("")
+    assert index.line_count == 1
+    assert index.line_length(0) == 0
+    assert index.position(0) == (0, 0)
+
+
+class FakeSource:
+    """Bytes handed to the indexer in random blocks"""
+
+    def __init__(self, data, rng):
+        self.data = data
+        self.rng = rng
+
+    def __len__(self):
+        return len(self.data)
+
+    def iter_raw(self, start, end):
+        while start < end:
+            step = self.rng.randint(1, 10)
+            yield self.data[start:min(start + step, end)]
+            start += step
+
+
+class InlineDispatcher:
+    def post(self, callback, *args):
+        callback(*args)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_checkpoints_match_text(seed, monkeypatch):
+    # Checkpoints every few characters, so edits join and split spans
+    monkeypatch.setattr(line_index, "LINE_CHECKPOINT_SIZE", 3)
+    monkeypatch.setattr(mapped, "LINE_CHECKPOINT_SIZE", 3)
+    rng = random.Random(seed)
+    text = "".join(rng.choice("ab\n") for _ in range(rng.randint(0, 40)))
+    buf = PieceTable(text)
+    index = CheckpointIndex(buf.get_slice)
+    indexer = mapped.LineIndexer(FakeSource(text.encode("latin-1"), rng), InlineDispatcher(),
+                                 lambda _, chars, newlines: index.append(chars, newlines), lambda _: None)
+    indexer.run()
+    check_index(index, text)
+    buf.lines = index
+    for _ in range(60):
+        offset = rng.randint(0, len(text))
+        length = rng.randint(0, min(8, len(text) - offset))
+        buf.replace(offset, length, "".join(rng.choice("xy\n\n") for _ in range(rng.randint(0, 12))))
+        text = buf.get_text()
+        check_index(index, text)
+
+
+def test_decode_line_maps_columns():
+    text, starts = mapped.decode_line(b"a\xc3\xa9\xe2\x98\x83\xffz".decode("latin-1"))
+    assert text == "a\u00e9\u2603\ufffdz"
+    assert list(starts) == [0, 1, 3, 6, 7, 8]
+    assert mapped.decode_line("plain") == ("plain", None)
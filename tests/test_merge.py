@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+from modules import merge
+from modules.merge import changed_region, merge3
+
+
+def random_text(rng, count):
+    lines = [rng.choice("abc") + "\n" for _ in range(count)]
+    if lines and rng.random() < 0.3:
+        lines[-1] = lines[-1][:-1]
+    return "".join(lines)
+
+
+def edit_lines(rng, lines):
+    """lines with a few runs replaced by new ones no other text contains"""
+    lines = list(lines)
+    for _ in range(rng.randint(1, 3)):
+        pos = rng.randint(0, len(lines))
+        lines[pos:pos + rng.randint(0, 2)] = [f"new {rng.random()}\n" for _ in range(rng.randint(0, 2))]
+    return lines
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_edits_apart_merge_without_conflicts(seed):
+    rng = random.Random(seed)
+    base = [f"line {i}\n" for i in range(rng.randint(1, 20))]
+    # One untouched line keeps the two sides' edits apart
+    keep = rng.randrange(len(base))
+    ours = edit_lines(rng, base[:keep])
+    theirs = edit_lines(rng, base[keep + 1:])
+    text, conflicts = merge3("".join(base), "".join(ours + base[keep:]), "".join(base[:keep + 1] + theirs))
+    assert conflicts == 0
+    assert text == "".join(ours + [base[keep]] + theirs)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_unchanged_side_gives_the_other(seed):
+    rng = random.Random(seed)
+    base = random_text(rng, rng.randint(0, 15))
+    other = random_text(rng, rng.randint(0, 15))
+    assert merge3(base, other, base) == (other, 0)
+    assert merge3(base, base, other) == (other, 0)
+    assert merge3(base, other, other) == (other, 0)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_changed_region_rebuilds_new(seed, monkeypatch):
+    # A small step so the block comparisons stop part way
+    monkeypatch.setattr(merge, "_COMPARE_STEP", 3)
+    rng = random.Random(seed)
+    old = "".join(rng.choice("ab") for _ in range(rng.randint(0, 30)))
+    new = list(old)
+    for _ in range(rng.randint(0, 3)):
+        pos = rng.randint(0, len(new))
+        new[pos:pos + rng.randint(0, 3)] = rng.choice(["", "x", "ab", "yb"])
+    new = "".join(new)
+    start, old_end, new_end = changed_region(old, new)
+    assert start <= old_end and start <= new_end
+    assert old[:start] + new[start:new_end] + old[old_end:] == new
+    # Nothing equal is left at either end of the region
+    if start < old_end and start < new_end:
+        assert old[start] != new[start]
+        assert old[old_end - 1] != new[new_end - 1]
+
+
+def test_conflict_markers():
+    base = "a\nb\nc\nd"
+    text, conflicts = merge3(base, "a\nours\nc\nmine", "a\ntheirs\nc\nthat")
+    assert conflicts == 2
+    # The last lines have no newline, so one is added before each marker
+    assert text == ("a\n"
+                    "<<<<<<< yours\nours\n=======\ntheirs\n>>>>>>> disk\n"
+                    "c\n"
+                    "<<<<<<< yours\nmine\n=======\nthat\n>>>>>>> disk\n")
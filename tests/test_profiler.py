@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+urwid = pytest.importorskip("urwid")
+
+from modules.editor import NanoEditor
+from modules.profiler import Profiler, key_class
+
+
+class HeadlessScreen(urwid.display.BaseScreen):
+    """Screen that renders canvases without a terminal"""
+
+    def get_cols_rows(self):
+        return 60, 10
+
+    def draw_screen(self, size, canvas):
+        for _ in canvas.content():
+            pass
+
+
+@pytest.fixture
+def profiled(tmp_path):
+    """Editor on a headless loop with every handler timed"""
+    path = tmp_path / "file.txt"
+    path.write_text("one\ntwo\n")
+    profiler = Profiler(str(tmp_path / "trace.jsonl"))
+    editor = NanoEditor(str(path), profiler)
+    editor.build_loop(HeadlessScreen())
+    editor.show_document(editor.documents[0])
+    yield editor
+    editor.close_journals()
+    profiler.close()
+
+
+def trace(editor):
+    editor.profiler.trace.flush()
+    with open(editor.profiler.trace.name, encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def test_f6_is_timed(profiled):
+    loop = profiled.loop
+    loop.process_input(["f6"])
+    loop.draw_screen()
+    assert not profiled.show_line_numbers
+    record = trace(profiled)[-1]
+    assert record["kind"] == "input"
+    assert record["keys"] == 1
+    assert record["key_classes"] == {"control": 1}
+    assert record["calls"]["handle_keys"][0] == 1
+    assert "raw_keys" not in record
+
+
+def test_redraw_inside_a_handler_is_not_an_error(profiled):
+    # The redraw closes the event while the handler is still running
+    profiled.redraw = profiled.loop.draw_screen
+    profiled.profiler.wrap(profiled, ["redraw"])
+    profiled.loop.process_input(["f6"])
+    profiled.redraw()
+    assert profiled.profiler.event is None
+    assert trace(profiled)[-1]["kind"] == "input"
+
+
+def test_key_classes():
+    assert key_class("a") == "printable"
+    assert key_class("é") == "printable"
+    assert key_class("enter") == "printable"
+    assert key_class("page down") == "navigation"
+    assert key_class(("mouse press", 1, 0, 0)) == "navigation"
+    assert key_class("ctrl o") == "control"
+    assert key_class("f6") == "control"
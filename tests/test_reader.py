@@ -0,0 +1,66 @@
+import os
+import random
+import stat
+
+import pytest
+
+from modules import reader
+from modules.reader import OffsetIndex, stream_lines
+
+
+@pytest.fixture
+def small_index(tmp_path, monkeypatch):
+    """Index every third line in seven-byte reads, with the cache under tmp_path"""
+    monkeypatch.setattr(reader, "OFFSET_INDEX_STRIDE", 3)
+    monkeypatch.setattr(reader, "READ_CHUNK_SIZE", 7)
+    monkeypatch.setenv("XDG_CACHE_HOME", str(tmp_path / "cache"))
+
+
+def read_lines(path, first, last):
+    out = []
+    with open(path, "rb") as f:
+        stream_lines(f, str(path), ["--lines", f"{first}:{last}"], out.append)
+    return b"".join(out)
+
+
+def expected(data, first, last):
+    return b"".join(data.splitlines(keepends=True)[first - 1:last])
+
+
+def test_random_ranges_match_slices(tmp_path, small_index):
+    rng = random.Random(1)
+    path = tmp_path / "log.txt"
+    data = b"".join(b"line %d%s\n" % (i, b"x" * rng.randint(0, 9)) for i in range(200))
+    path.write_bytes(data)
+    for _ in range(60):
+        first = rng.randint(1, 210)
+        last = rng.randint(first, 220)
+        assert read_lines(path, first, last) == expected(data, first, last)
+
+
+def test_edited_file_is_reindexed(tmp_path, small_index):
+    path = tmp_path / "log.txt"
+    data = b"".join(b"log line %d\n" % i for i in range(100))
+    path.write_bytes(data)
+    assert read_lines(path, 90, 90) == b"log line 89\n"
+    # Lines inserted at the top move every cached offset
+    data = b"".join(b"new %d\n" % i for i in range(7)) + data
+    path.write_bytes(data)
+    assert read_lines(path, 90, 91) == expected(data, 90, 91)
+    # Appending keeps the index and goes on from its end
+    data += b"".join(b"more %d\n" % i for i in range(20))
+    path.write_bytes(data)
+    assert read_lines(path, 120, 125) == expected(data, 120, 125)
+
+
+def test_cache_is_private(tmp_path, small_index):
+    path = tmp_path / "log.txt"
+    path.write_bytes(b"a\n" * 20)
+    read_lines(path, 10, 12)
+    cache_path = OffsetIndex(str(path)).cache_path
+    assert stat.S_IMODE(os.stat(os.path.dirname(cache_path)).st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(cache_path).st_mode) == 0o600
+    os.chmod(os.path.dirname(cache_path), 0o755)
+    assert OffsetIndex(str(path)).cache_path is None
+    # Without a private directory the lines are still printed, just not cached
+    assert read_lines(path, 3, 4) == b"a\na\n"
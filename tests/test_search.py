@@ -0,0 +1,103 @@
+import random
+import re
+
+import pytest
+
+from modules.buffer import PieceTable
+from modules.search import SearchIndex, compile_query, replace_all, spans_lines
+
+PATTERNS = [
+    ("ab", False),
+    ("a\nb", False),
+    ("b+", True),
+    (r"^a", True),
+    (r"\bab", True),
+    (r"a$", True),
+    (r"a\s+b", True),
+    (r"a[^x]b", True),
+    (r"(?s)a.b", True),
+    (r"b(?=\n)", True),
+]
+
+
+def full_scan(pattern, text):
+    return [(m.start(), m.end()) for m in pattern.finditer(text) if m.end() > m.start()]
+
+
+@pytest.mark.parametrize("query, regex", PATTERNS)
+def test_edits_match_a_full_rescan(query, regex):
+    rng = random.Random(query)
+    buf = PieceTable("".join(rng.choice("ab \n") for _ in range(80)))
+    index = SearchIndex(query, regex)
+    index.build(buf)
+    for _ in range(150):
+        offset = rng.randint(0, len(buf))
+        length = rng.randint(0, min(4, len(buf) - offset))
+        inserted = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 4)))
+        removed = buf.replace(offset, length, inserted)
+        index.apply_edit(buf, offset, removed, inserted)
+        assert list(zip(index.starts, index.ends)) == full_scan(index.pattern, buf.get_text())
+
+
+@pytest.mark.parametrize("query, spans", [
+    ("ab", False),
+    (r"a\nb", True),
+    (r"a\sb", True),
+    (r"a\Wb", True),
+    (r"a[^x]b", True),
+    (r"a[\s]b", True),
+    (r"a.b", False),
+    (r"(?s)a.b", True),
+    (r"a\S+b", False),
+    (r"(a|b\n)", True),
+])
+def test_spans_lines(query, spans):
+    assert spans_lines(compile_query(query, True)) == spans
+
+
+def test_navigation_wraps_around():
+    buf = PieceTable("ab ab ab")
+    index = SearchIndex("AB")
+    index.build(buf)
+    assert index.next_match(0) == (3, 5)
+    assert index.next_match(6) == (0, 2)
+    assert index.prev_match(0) == (6, 8)
+    assert index.match_at(3) == 5
+    assert index.match_at(4) is None
+
+
+@pytest.mark.parametrize("query, replacement, regex", [
+    ("ab", "X", False),
+    ("a", r"x\1", False),
+    (r"b+", "<\\g<0>>", True),
+    (r"^", "# ", True),
+    (r"(?m)^", "# ", True),
+    (r"(?m)$", ";", True),
+    (r"\b", "|", True),
+    (r"(?=b)", "-", True),
+    (r"a*", "X", True),
+    (r"(a)(b)", r"\2\1", True),
+])
+def test_replace_all_matches_re_sub(query, replacement, regex):
+    rng = random.Random(query)
+    pattern = compile_query(query, regex)
+    for _ in range(50):
+        text = "".join(rng.choice("ab \n") for _ in range(rng.randint(0, 20)))
+        expected, count = pattern.subn(replacement if regex else replacement.replace("\\", "\\\\"), text)
+        result = replace_all(text, pattern, replacement, regex)
+        if result is None:
+            assert count == 0
+            continue
+        first, last, new_text, replaced = result
+        assert text[:first] + new_text + text[last:] == expected
+        assert replaced == count
+
+
+def test_replace_all_window_uses_context():
+    pattern = compile_query(r"\bab", True)
+    text = "ab xab ab"
+    # Only matches inside [3, 6) count, the characters around it are context
+    assert replace_all(text, pattern, "Z", True, 3, 6) is None
+    assert replace_all(text, pattern, "Z", True, 6, 9) == (7, 9, "Z", 1)
+    # An empty match at the window end belongs to the next window
+    assert replace_all("ab", re.compile("(?m)^"), "#", True, 0, 0) is None
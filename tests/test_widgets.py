@@ -0,0 +1,48 @@
+import pytest
+
+urwid = pytest.importorskip("urwid")
+
+from modules.buffer import PieceTable
+from modules.widgets import EditorView
+
+
+def rows(view, size=(10, 4)):
+    return [row.decode() for row in view.render(size, focus=True).text]
+
+
+def keys(view, *pressed, size=(10, 4)):
+    for key in pressed:
+        view.keypress(size, key)
+
+
+def test_renders_only_the_lines_on_screen():
+    view = EditorView(PieceTable("".join(f"line {i}\n" for i in range(1000))))
+    assert rows(view) == ["line 0    ", "line 1    ", "line 2    ", "line 3    "]
+    view.set_edit_pos(view.buffer.line_range(500)[0])
+    assert rows(view)[-1] == "line 500  "
+    assert view.visible_lines == [498, 499, 500, 501]
+
+
+def test_wrapped_rows_and_cursor_movement():
+    view = EditorView(PieceTable("short\n" + "word " * 5 + "\nend"))
+    assert rows(view)[1:] == ["word word ", "word word ", "word      "]
+    keys(view, "down", "down")
+    assert view.buffer.position(view.edit_pos) == (2, 11)
+    keys(view, "down", "down", "end")
+    assert view.buffer.position(view.edit_pos) == (3, 4)
+    keys(view, "home", "left")
+    assert view.buffer.position(view.edit_pos) == (2, 26)
+
+
+def test_typing_edits_the_buffer():
+    view = EditorView(PieceTable("ab"))
+    edits = []
+
+    def on_edit(_, offset, removed, inserted):
+        edits.append((offset, removed, inserted))
+        view.buffer.replace(offset, len(removed), inserted)
+
+    urwid.connect_signal(view, "edit", on_edit)
+    keys(view, "right", "x", "enter", "backspace", "delete")
+    assert view.buffer.get_text() == "ax"
+    assert edits == [(1, "", "x"), (2, "", "\n"), (2, "\n", ""), (2, "b", "")]